@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module with the accounting of the time the test cases spend on waiting for
+the app, WebDriver, sleeping, REST calls and Python itself.
+"""
+
+import collections
+
+# The buckets are exclusive, so when spans are nested the time goes to the
+# most specific of them, i.e. the one with the highest priority.
+PRIORITIES = {
+    'sleep': 4,
+    'rest': 3,
+    'webdriver': 2,
+    'wait': 1,
+}
+
+# With the implicit wait on, these commands block until the elements appear.
+IMPLICIT_WAIT_COMMANDS = ('findElement', 'findElements', 'findChildElement',
+                          'findChildElements')
+
+PYTHON = 'python'
+
+
+def get_bucket(kind, name):
+    """Returns the bucket the span of the specified kind and name belongs
+    to.
+    """
+
+    if kind == 'webdriver':
+        if name in IMPLICIT_WAIT_COMMANDS:
+            return 'implicit wait'
+
+        return 'webdriver:{}'.format(name)
+
+    return kind
+
+
+def account(spans, start, end):
+    """Splits the time between start and end into the buckets according to the
+    specified (kind, name, start, end) spans. Returns the mapping of the
+    buckets to the number of seconds.
+    """
+
+    boundaries = []
+    for kind, name, span_start, span_end in spans:
+        if kind not in PRIORITIES:
+            continue
+
+        span_start, span_end = max(span_start, start), min(span_end, end)
+        if span_start >= span_end:
+            continue
+
+        bucket = (PRIORITIES[kind], get_bucket(kind, name))
+        boundaries.append((span_start, 1, bucket))
+        boundaries.append((span_end, -1, bucket))
+
+    boundaries.sort(key=lambda boundary: boundary[0])
+
+    buckets = collections.Counter()
+    active = collections.Counter()
+    previous = start
+    for moment, delta, bucket in boundaries:
+        if moment > previous:
+            current = max(active) if active else (0, PYTHON)
+            buckets[current[1]] += moment - previous
+            previous = moment
+
+        active[bucket] += delta
+        if not active[bucket]:
+            del active[bucket]
+
+    if end > previous:
+        buckets[PYTHON] += end - previous
+
+    return dict(buckets)
+
+
+def merge(accounts):
+    """Sums the specified mappings of the buckets to the number of seconds. """
+
+    total = collections.Counter()
+    for buckets in accounts:
+        total.update(buckets)
+
+    return dict(total)
+
+
+def format_summary(buckets, limit=10):
+    """Returns the lines describing the share of the biggest buckets. """
+
+    total = sum(buckets.values())
+    if not total:
+        return []
+
+    ordered = sorted(buckets.items(), key=lambda item: item[1], reverse=True)
+    lines = ['{:>6.1%} {:>9.3f}s {}'.format(seconds / total, seconds, bucket)
+             for bucket, seconds in ordered[:limit]]
+    rest = sum(seconds for _, seconds in ordered[limit:])
+    if rest:
+        lines.append('{:>6.1%} {:>9.3f}s {}'.format(rest / total, rest,
+                                                   '(other)'))
+
+    return lines
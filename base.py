@@ -16,12 +16,22 @@
 
 """Module with basic building blocks for tests. """
 
+import atexit
 import collections
+import contextlib
+import functools
+import hashlib
+import json
 import os.path
 import re
+import signal
 import sys
+import tempfile
+import threading
 import time
 import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from curses import tparm, tigetstr, setupterm
 
 import requests
@@ -30,12 +40,405 @@ from splinter import Browser
 from splinter.driver.webdriver.chrome import Options
 from selenium.common.exceptions import (
     NoSuchWindowException,
-    StaleElementReferenceException,
+    TimeoutException,
     WebDriverException
 )
+from selenium.webdriver.common.desired_capabilities import DesiredCapabilities
 from selenium.webdriver.support.wait import WebDriverWait
 from xvfbwrapper import Xvfb
 
+from accounting import account, format_summary, merge
+from benchmark import summarize
+from executor import Worker, WorkQueueExecutor, group_by_dependencies
+from history import HistoryStore, Result, flake_score, read_quarantine
+from matchers import Latest, as_matcher, describe
+from media_stub import DEFAULT_MEDIA_HOSTS, MediaStubServer
+from network import NetworkRecorder, enable_performance_log
+from timeline import TRACE_CATEGORIES, Timeline
+from perf import ClientPerfRecorder, ui_action
+from profiling import PROFILERS, TestProfiler
+from rest import RestConversation, create_user, make_client, open_direct
+
+
+def get_run_id():
+    """Returns the identifier of the current run. The identifier is taken from
+    the RUN_ID environment variable, so all the suites started within the same
+    run share it. If the variable is not set, a new identifier is generated and
+    exported to the child processes.
+    """
+
+    run_id = re.sub('[^0-9a-z]', '', os.environ.get('RUN_ID', '').lower())
+    if not run_id:
+        run_id = uuid.uuid4().hex[:8]
+
+    os.environ['RUN_ID'] = run_id
+
+    return run_id
+
+
+# The CSS selectors which depend on the Rocket.Chat version. The keys are the
+# minimal versions the selector sets are intended for.
+SELECTORS = {
+    '0.70': {
+        'admin_page': '.main-content .page-container',
+        'message_body': 'div.body.color-primary-font-color ',
+        'room_header': '.rc-header__name',
+        'send_button': 'svg.rc-icon.rc-input__icon-svg.rc-input__icon-svg--send',
+        'sidebar_item': 'div.sidebar-item__ellipsis',
+        'toolbar_button': '.sidebar__toolbar-button.rc-tooltip.rc-tooltip--down'
+                          '.js-button',
+        'version_row': '.admin-table-row',
+    },
+}
+
+
+def parse_version(version):
+    """Turns the specified version string into a tuple of integers, ignoring
+    everything but the major and minor numbers.
+    """
+
+    return tuple(int(i) for i in re.findall(r'\d+', version)[:2])
+
+
+def pick_for_version(mapping, version):
+    """Picks the value from the specified mapping which is keyed by the highest
+    version not greater than the specified one. Falls back to the value keyed
+    by the lowest version.
+    """
+
+    versions = sorted(mapping, key=parse_version)
+    suitable = [i for i in versions
+                if parse_version(i) <= parse_version(version)]
+
+    return mapping[suitable[-1] if suitable else versions[0]]
+
+
+def get_server_version(addr, timeout=30):
+    """Returns the major and minor version of the Rocket.Chat server running at
+    the specified address. The version is requested via the REST API once per
+    server and cached on disk, so the other suites of the run reuse it.
+    """
+
+    key = hashlib.sha1(addr.encode('utf8')).hexdigest()[:12]
+    cache_path = os.path.join(tempfile.gettempdir(), 'rocketchat-tests-{}-{}.json'
+                              .format(get_run_id(), key))
+    try:
+        with open(cache_path) as infile:
+            return json.load(infile)['version']
+    except (OSError, ValueError, KeyError):
+        pass
+
+    response = requests.get('{}/api/info'.format(addr.rstrip('/')),
+                            timeout=timeout)
+    response.raise_for_status()
+
+    body = response.json()
+    full_version = body.get('version') or body.get('info', {}).get('version')
+    version = '.'.join(full_version.split('.')[:2])
+
+    tmp_path = '{}.{}'.format(cache_path, os.getpid())
+    with open(tmp_path, 'w') as outfile:
+        json.dump({'addr': addr, 'version': version}, outfile)
+    os.replace(tmp_path, cache_path)
+
+    return version
+
+
+# Maps the room types to the client routes.
+ROOM_ROUTES = {
+    'c': 'channel',
+    'd': 'direct',
+    'p': 'group',
+}
+
+# Returns the names of the rooms of the specified type (or of all types) the
+# current user is subscribed to.
+ROOM_NAMES_JS = """
+var query = arguments[0] ? {t: arguments[0]} : {};
+return ChatSubscription.find(query, {fields: {name: 1}}).fetch().map(
+    function (sub) { return sub.name; });
+"""
+
+# Resolves the client route of the room the current user is subscribed to.
+ROOM_TYPE_JS = """
+var sub = ChatSubscription.findOne({name: arguments[0]}, {fields: {t: 1}});
+return sub ? sub.t : null;
+"""
+
+# Checks if the client is at the specified route and, optionally, if the
+# specified element (containing the specified text) is rendered.
+ROUTE_READY_JS = """
+var path = arguments[0], selector = arguments[1], text = arguments[2];
+var current = FlowRouter.current();
+if (!current || decodeURIComponent(current.path) !== path) {
+    return false;
+}
+if (!selector) {
+    return true;
+}
+var elem = document.querySelector(selector);
+return !!elem && (!text || elem.textContent.trim() === text);
+"""
+
+
+# Reports the state of the client: 'loading' until Meteor is connected,
+# 'logged-out' when the login form is usable, and 'ready' when the user and
+# their rooms and subscriptions are loaded.
+APP_STATE_JS = """
+if (typeof Meteor === 'undefined' || !Meteor.status().connected) {
+    return 'loading';
+}
+if (Meteor.loggingIn()) {
+    return 'loading';
+}
+if (!Meteor.userId()) {
+    return 'logged-out';
+}
+if (!Meteor.user()) {
+    return 'loading';
+}
+if (typeof RocketChat === 'undefined' || !RocketChat.CachedChatRoom) {
+    return 'loading';
+}
+var cached = [RocketChat.CachedChatRoom, RocketChat.CachedChatSubscription];
+for (var i = 0; i < cached.length; i++) {
+    if (cached[i] && (!cached[i].ready || !cached[i].ready.get())) {
+        return 'loading';
+    }
+}
+return 'ready';
+"""
+
+# Checks if the message with the specified ID is rendered in the current room
+# or, should the client not expose the IDs, if the number of the rendered
+# messages exceeds the specified one.
+MESSAGE_RENDERED_JS = """
+return document.getElementById(arguments[0]) !== null ||
+    document.querySelectorAll(arguments[1]).length > arguments[2];
+"""
+
+# Returns the texts of the messages rendered in the current room starting
+# from the specified position.
+MESSAGES_SINCE_JS = """
+var nodes = document.querySelectorAll(arguments[0]);
+return Array.prototype.slice.call(nodes, arguments[1]).map(function (node) {
+    return node.innerText.trim();
+});
+"""
+
+INPUT_MODES = ('type', 'inject')
+
+MESSAGE_TRANSPORTS = ('ui', 'rest')
+
+# Puts the specified text into the composer in one go and dispatches the same
+# events the composer gets when the text is typed, so its state (the send
+# button, the typing indicator, etc.) is updated as usual.
+INJECT_MESSAGE_JS = """
+var textarea = document.querySelector('textarea[name="msg"]');
+if (!textarea) {
+    return false;
+}
+textarea.focus();
+textarea.value = arguments[0];
+textarea.dispatchEvent(new Event('input', {bubbles: true}));
+textarea.dispatchEvent(new KeyboardEvent('keyup', {bubbles: true}));
+return true;
+"""
+
+PAGE_LOAD_STRATEGIES = ('normal', 'eager', 'none')
+
+
+def add_harness_arguments(parser):
+    """Adds the options which are common for all the suites to the specified
+    argument parser.
+    """
+
+    parser.add_argument('--page-load-strategy', dest='page_load_strategy',
+                        choices=PAGE_LOAD_STRATEGIES, default='normal',
+                        help='allows specifying how long to wait for a page '
+                             'to load (the app readiness is probed anyway)')
+    parser.add_argument('--message-transport', dest='message_transport',
+                        choices=MESSAGE_TRANSPORTS,
+                        help='allows specifying how the messages are sent: '
+                             'by typing them in the composer or via the REST '
+                             'API (the default depends on the suite)')
+    parser.add_argument('--input-mode', dest='input_mode', choices=INPUT_MODES,
+                        help='allows specifying how the messages are put into '
+                             'the composer: by simulating keystrokes (the '
+                             'default) or by injecting the whole text at once')
+    parser.add_argument('--test-timeout', dest='test_timeout', type=float,
+                        default=300,
+                        help='allows specifying the deadline of every test '
+                             'case (secs)')
+    parser.add_argument('--suite-budget', dest='suite_budget', type=float,
+                        help='allows specifying the time after which the '
+                             'remaining test cases are skipped (secs)')
+    parser.add_argument('--perf-capture', dest='perf_capture', type=str,
+                        help='allows specifying the JSON file the client-side '
+                             'performance of the UI actions is merged into')
+    parser.add_argument('--network-log', dest='network_log', type=str,
+                        help='allows specifying the directory the XHRs and '
+                             'websocket frames of every test case are written '
+                             'to')
+    parser.add_argument('--trace', dest='trace', type=str,
+                        help='allows specifying the file the timeline of the '
+                             'run is written to in the Chrome trace-event '
+                             'format')
+    parser.add_argument('--media-stub', dest='media_stub', action='store_true',
+                        help='makes the browser fetch the media (such as '
+                             'pugs and GIFs) from the local stub server '
+                             'instead of the internet')
+    parser.add_argument('--media-hosts', dest='media_hosts', type=str,
+                        default=','.join(DEFAULT_MEDIA_HOSTS),
+                        help='allows specifying the comma-separated host '
+                             'patterns resolved to the media stub server')
+    parser.add_argument('--media-stub-cert', dest='media_stub_cert', type=str,
+                        help='allows specifying the PEM file with the '
+                             'certificate and the key, so that the media stub '
+                             'server speaks HTTPS')
+    parser.add_argument('--tests', dest='tests', type=str,
+                        help='allows specifying the comma-separated test '
+                             'cases to run in the specified order (all of '
+                             'them by default)')
+    parser.add_argument('--workers', dest='workers', type=int, default=0,
+                        help='allows specifying the number of the workers '
+                             'running the independent test cases over the '
+                             'REST API before the rest of the suite (0 runs '
+                             'everything in the browser one by one)')
+    parser.add_argument('--repeat', dest='repeat', type=int, default=1,
+                        help='allows specifying the number of times every '
+                             'independent test case is run, so that its pass '
+                             'rate and the distribution of its duration are '
+                             'reported (the rest are run once)')
+    parser.add_argument('--quarantine', dest='quarantine', type=str,
+                        help='allows specifying the file listing the test '
+                             'cases the failures of which are reported but '
+                             'do not fail the run')
+    parser.add_argument('--history', dest='history', type=str,
+                        help='allows specifying the SQLite file the outcomes '
+                             'and the timings of the run are appended to')
+    parser.add_argument('--profile', dest='profile', type=str,
+                        help='allows specifying the directory the profile of '
+                             'every test case and the merged profile are '
+                             'written to')
+    parser.add_argument('--profile-filter', dest='profile_filter', type=str,
+                        help='allows specifying the regular expression the '
+                             'names of the profiled test cases must match')
+    parser.add_argument('--profiler', dest='profiler', choices=PROFILERS,
+                        default='sampling',
+                        help='allows specifying the profiler: the sampling '
+                             'one writes the collapsed stacks for flame '
+                             'graphs, cProfile writes the pstats files')
+
+
+def get_harness_kwargs(options):
+    """Turns the common options into the keyword arguments of the test cases. """
+
+    return {
+        'history': options.history,
+        'input_mode': options.input_mode,
+        'media_hosts': (options.media_hosts.split(',')
+                        if options.media_stub else None),
+        'media_stub_cert': options.media_stub_cert,
+        'message_transport': options.message_transport,
+        'network_log': options.network_log,
+        'page_load_strategy': options.page_load_strategy,
+        'perf_capture': options.perf_capture,
+        'profile': options.profile,
+        'profile_filter': options.profile_filter,
+        'profiler': options.profiler,
+        'quarantine': options.quarantine,
+        'repeat': options.repeat,
+        'suite_budget': options.suite_budget,
+        'test_timeout': options.test_timeout,
+        'tests': options.tests.split(',') if options.tests else None,
+        'trace': options.trace,
+        'workers': options.workers,
+    }
+
+
+class TestTimeoutError(Exception):
+    """Raised when a test case exceeds its deadline. """
+
+
+def deadline(seconds):
+    """Decorator overriding the deadline (in seconds) of a test case. """
+
+    def decorator(func):
+        func.deadline = seconds
+        return func
+
+    return decorator
+
+
+def independent(func):
+    """Decorator marking a test case which may be run by a worker of the
+    in-suite executor (see the --workers option), i.e. the one which only
+    talks to the bot and keeps no state shared with other test cases except
+    the ones declared with depends_on.
+    """
+
+    func.independent = True
+    return func
+
+
+def depends_on(*test_cases):
+    """Decorator declaring the test cases which have to be run before a test
+    case of a shardable suite (see SplinterTestCase.shardable) or by the
+    same worker of the in-suite executor.
+    """
+
+    def decorator(func):
+        func.dependencies = test_cases
+        return func
+
+    return decorator
+
+
+def spanned(kind):
+    """Decorator recording the calls of the method of a test case as the
+    spans of the specified kind.
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            with self.span(kind, func.__name__):
+                return func(self, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+class Watchdog:
+    """Context manager which aborts the code running in the main thread by
+    raising TestTimeoutError when the specified number of seconds is exceeded.
+    The watchdog is based on SIGALRM, so it interrupts sleeps and WebDriver
+    calls as well.
+    """
+
+    def __init__(self, seconds):
+        self._seconds = seconds
+        self._prev_handler = None
+
+    def _handle_alarm(self, _signum, _frame):
+        raise TestTimeoutError('exceeded the deadline of {:.0f}s'.format(
+            self._seconds))
+
+    def __enter__(self):
+        if self._seconds:
+            self._prev_handler = signal.signal(signal.SIGALRM,
+                                               self._handle_alarm)
+            signal.setitimer(signal.ITIMER_REAL, self._seconds)
+
+        return self
+
+    def __exit__(self, _exc_type, _exc_value, _traceback):
+        if self._seconds:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, self._prev_handler)
+
 
 class OrderedClassMembers(type):
     """Metaclass for producing the classes which remember the order of the
@@ -54,11 +457,174 @@ class OrderedClassMembers(type):
         return type.__new__(cls, name, bases, classdict)
 
 
+class ResourceRegistry:
+    """Keeps track of the users, rooms and files created on the Rocket.Chat
+    server during a run and deletes them over REST when the run is over.
+
+    The teardown is also triggered at exit and on SIGTERM/SIGHUP, so the
+    resources don't leak even if the run crashes or gets killed.
+    """
+
+    # Files are deleted first since they disappear along with their rooms.
+    _PHASES = (('file', ), ('channel', 'group', 'user'))
+
+    def __init__(self, rocket, max_workers=8, attempts_number=3):
+        self._rocket = rocket
+        self._max_workers = max_workers
+        self._attempts_number = attempts_number
+        self._lock = threading.Lock()
+        self._resources = collections.OrderedDict(
+            (kind, collections.OrderedDict())
+            for phase in self._PHASES for kind in phase
+        )
+
+        atexit.register(self.teardown)
+        if threading.current_thread() is threading.main_thread():
+            for signum in (signal.SIGTERM, signal.SIGHUP):
+                signal.signal(signum, self._handle_signal)
+
+    @staticmethod
+    def _handle_signal(signum, _frame):
+        # Raising SystemExit lets the finally clauses and the atexit handlers
+        # do their job.
+        sys.exit(128 + signum)
+
+    def _add(self, kind, key):
+        with self._lock:
+            self._resources[kind][key] = None
+
+    def _discard(self, kind, key):
+        with self._lock:
+            self._resources[kind].pop(key, None)
+
+    def add_user(self, username):
+        """Registers the specified user. """
+
+        self._add('user', username)
+
+    def add_channel(self, name):
+        """Registers the specified public channel. """
+
+        self._add('channel', name)
+
+    def add_group(self, name):
+        """Registers the specified private channel. """
+
+        self._add('group', name)
+
+    def add_file(self, room_id, msg_id):
+        """Registers the message the specified file was uploaded with. """
+
+        self._add('file', (room_id, msg_id))
+
+    @staticmethod
+    def _is_done(response, not_found_errors):
+        if response is None:
+            return True
+
+        try:
+            body = response.json()
+        except ValueError:
+            return False
+
+        if body.get('success'):
+            return True
+
+        # Something which doesn't exist anymore is as good as deleted.
+        return body.get('errorType') in not_found_errors
+
+    def _delete_once(self, kind, key):
+        if kind == 'channel':
+            response = self._rocket.channels_delete(channel=key)
+            return self._is_done(response, ('error-room-not-found', ))
+
+        if kind == 'group':
+            response = self._rocket.groups_delete(group=key)
+            return self._is_done(response, ('error-room-not-found', ))
+
+        if kind == 'user':
+            user = self._rocket.users_info(username=key).json().get('user')
+            if not user:
+                return True
+
+            response = self._rocket.users_delete(user['_id'])
+            return self._is_done(response, ('error-invalid-user', ))
+
+        room_id, msg_id = key
+        response = self._rocket.chat_delete(room_id, msg_id)
+        return self._is_done(response, ('error-room-not-found', ))
+
+    def _delete(self, kind, key):
+        for attempt in range(self._attempts_number):
+            try:
+                if self._delete_once(kind, key):
+                    self._discard(kind, key)
+                    return True
+            except (requests.RequestException, ValueError):
+                pass
+
+            time.sleep(0.5 * 2 ** attempt)
+
+        return False
+
+    def delete(self, kind, key):
+        """Deletes the specified resource right away instead of waiting for the
+        teardown. Returns True if the resource doesn't exist anymore.
+        """
+
+        self._add(kind, key)
+        return self._delete(kind, key)
+
+    def teardown(self):
+        """Deletes all the registered resources concurrently. Returns the list
+        of (kind, key) pairs which could not be deleted.
+        """
+
+        failed = []
+        for phase in self._PHASES:
+            with self._lock:
+                items = [(kind, key) for kind in phase
+                         for key in self._resources[kind]]
+
+            if not items:
+                continue
+
+            try:
+                with ThreadPoolExecutor(self._max_workers) as executor:
+                    results = list(executor.map(
+                        lambda item: self._delete(*item), items))
+            except RuntimeError:
+                # New threads can't be started at interpreter shutdown.
+                results = [self._delete(*item) for item in items]
+
+            failed += [item for item, done in zip(items, results) if not done]
+
+        for kind, key in failed:
+            sys.stderr.write('Could not delete {} {}\n'.format(kind, key))
+
+        return failed
+
+
 class SplinterTestCase(metaclass=OrderedClassMembers):  # pylint: disable=too-many-instance-attributes
     """Base class for all the tests based on Splinter. """
 
+    # Whether the test cases of the suite may be run apart, for example in
+    # different shards, provided the ones declared with depends_on are run
+    # before them. Otherwise the suite is run as a whole. The suites, the test
+    # cases of which check the latest messages of a room shared by all the
+    # processes (such as #general), must not be shardable, since the
+    # processes run against the same host would match each other's replies.
+    # RocketChatTestCase.choose_own_channel provides a room which is not
+    # shared.
+    shardable = False
+
     def __init__(self, addr, browser_window_size=(1920, 1080),
-                 page_load_timeout=30, sticky_timeout=30):
+                 page_load_timeout=30, sticky_timeout=30,
+                 page_load_strategy='normal', test_timeout=300,
+                 suite_budget=None, media_hosts=None, media_stub_cert=None,
+                 network_log=None, trace=None, profile=None,
+                 profile_filter=None, profiler='sampling', history=None,
+                 tests=None, repeat=1, quarantine=None):
         setupterm()
 
         if os.path.isfile('/.docker'):
@@ -74,15 +640,79 @@ class SplinterTestCase(metaclass=OrderedClassMembers):  # pylint: disable=too-ma
 
         options = Options()
         options.add_argument('--no-sandbox')
+        # The media hosts may be resolved to the local stub server, so that the
+        # pages don't depend on the internet.
+        self.media_stub = None
+        if media_hosts:
+            self.media_stub = MediaStubServer(certfile=media_stub_cert)
+            self.media_stub.start()
+            options.add_argument('--host-resolver-rules={}'.format(
+                self.media_stub.get_host_resolver_rules(media_hosts)))
+            if media_stub_cert:
+                options.add_argument('--ignore-certificate-errors')
+
+        # With the 'eager' and 'none' strategies visit() doesn't wait for all
+        # the assets, so the readiness of the app has to be probed separately.
+        capabilities = DesiredCapabilities.CHROME.copy()
+        capabilities['pageLoadStrategy'] = page_load_strategy
+        self._performance_log = bool(network_log or trace)
+        if self._performance_log:
+            enable_performance_log(
+                options, capabilities, network=bool(network_log),
+                trace_categories=TRACE_CATEGORIES if trace else None)
+
         self.browser = Browser('chrome', headless=False, options=options, wait_time=30,
-                               executable_path='./drivers/chromedriver')
+                               executable_path='./drivers/chromedriver',
+                               desired_capabilities=capabilities)
         self.browser.driver.implicitly_wait(sticky_timeout)
         self.browser.driver.set_page_load_timeout(page_load_timeout)
         self.browser.driver.set_window_size(*browser_window_size)
         self.browser.visit(addr)
 
+        self.network = None
+        if network_log:
+            self.network = NetworkRecorder(network_log,
+                                           self.__class__.__name__)
+
+        self._trace = trace
+        self.timeline = Timeline() if trace else None
+
+        self.profiler = None
+        if profile:
+            self.profiler = TestProfiler(profile, self.__class__.__name__,
+                                         profiler, profile_filter)
+        self._profiling = contextlib.ExitStack()
+
+        # The (kind, name, start, end) tuples of what the run spent its time
+        # on, such as the test cases, the UI actions and the WebDriver
+        # commands.
+        self.spans = []
+        self._instrument_driver()
+
+        # The threads running the test cases concurrently keep their spans
+        # apart (see _get_spans).
+        self._local = threading.local()
+        self._concurrent_test_cases = []
+
+        # How the time of every test case (all its attempts together) is split
+        # into the buckets (see the accounting module).
+        self.time_buckets = collections.OrderedDict()
+
+        # The Result tuples of every attempt of every test case.
+        self.test_results = []
+        self.server_version = None
+        self._history = history
+
+        self._repeat = repeat
+        self._quarantine = read_quarantine(quarantine) if quarantine else set()
+        self._quarantined_number = 0
+
         self._failed_number = 0
         self._succeeded_number = 0
+        self._skipped_number = 0
+
+        self._test_timeout = test_timeout
+        self._suite_budget = suite_budget
 
         self._red = tparm(tigetstr('setaf'), 1).decode('utf8')
         self._green = tparm(tigetstr('setaf'), 2).decode('utf8')
@@ -95,6 +725,14 @@ class SplinterTestCase(metaclass=OrderedClassMembers):  # pylint: disable=too-ma
             if method.startswith('test_'):
                 self._test_cases.append(method)
 
+        if tests:
+            unknown = set(tests) - set(self._test_cases)
+            if unknown:
+                raise ValueError('Unknown test case(s): {}'.format(
+                    ', '.join(sorted(unknown))))
+
+            self._test_cases = list(tests)
+
     def _color(self, escape_sec, text):
         sys.stdout.write('{}{}{}\n'.format(escape_sec, text, self._reset))
 
@@ -104,6 +742,178 @@ class SplinterTestCase(metaclass=OrderedClassMembers):  # pylint: disable=too-ma
     def _color_in_green(self, text):
         self._color(self._green, text)
 
+    @contextlib.contextmanager
+    def span(self, kind, name):
+        """Context manager recording the time spent inside it as a span of
+        the specified kind.
+        """
+
+        start_time = time.time()
+        try:
+            yield
+        finally:
+            self._get_spans().append((kind, name, start_time, time.time()))
+
+    def sleep(self, seconds):
+        """Sleeps for the specified number of seconds, accounting the time as
+        sleeping.
+        """
+
+        with self.span('sleep', 'sleep'):
+            time.sleep(seconds)
+
+    def wait_until(self, condition, timeout=10, poll_frequency=0.5):
+        """Waits until the specified condition, which takes the driver, is
+        met. Returns its result.
+        """
+
+        with self.span('wait', 'wait_until'):
+            return WebDriverWait(self.browser.driver, timeout,
+                                 poll_frequency=poll_frequency).until(condition)
+
+    def run_concurrent_test_cases(self, stop_at=None):  # pylint: disable=unused-argument,no-self-use
+        """Runs the test cases which may be run concurrently before the rest
+        of the suite, starting no test case after the specified time. Returns
+        True if all of them succeeded. Implemented by the subclasses
+        supporting the concurrent execution.
+        """
+
+        return True
+
+    def mark(self, kind, name):
+        """Records the moment something happened as a zero-length span. """
+
+        now = time.time()
+        self.add_span(kind, name, now, now)
+
+    def add_span(self, kind, name, start, end):
+        """Records the span which has been measured without the span context
+        manager, for example the one which is known only after it is over.
+        """
+
+        self._get_spans().append((kind, name, start, end))
+
+    def before_test_case(self, test_case):
+        """Called before every test case. """
+
+        # The events logged between the test cases don't belong to any of
+        # them.
+        self._drain_performance_log()
+
+        if self.profiler:
+            self._profiling.enter_context(self.profiler.profile(test_case))
+
+    def after_test_case(self, test_case, start_time):
+        """Called after every test case regardless of the outcome. """
+
+        self._profiling.close()
+
+        self._add_time_buckets(test_case,
+                               account(self.spans, start_time, time.time()))
+
+        entries = self._drain_performance_log()
+        if self.network:
+            actions = [(name, start, end)
+                       for kind, name, start, end in self.spans
+                       if kind == 'action' and start >= start_time]
+            self.network.finish(test_case, actions, entries)
+
+    def is_quarantined(self, test_case):
+        """Checks if the failures of the specified test case don't fail the
+        run.
+        """
+
+        return test_case in self._quarantine or \
+            '{}.{}'.format(self.__class__.__name__, test_case) in self._quarantine
+
+    def _fail(self, test_case, outcome):
+        """Reports the failure of the specified test case. Returns the exit
+        code the failure implies.
+        """
+
+        if self.is_quarantined(test_case):
+            self._color_in_red('{} (quarantined)'.format(outcome))
+            self._quarantined_number += 1
+            return 0
+
+        self._color_in_red(outcome)
+        self._failed_number += 1
+        return 1
+
+    def _get_repeated_test_cases(self):
+        # The test cases which keep state, such as the names of the users and
+        # the channels they create, would fail on the second attempt for
+        # reasons of their own, so only the independent ones are repeated.
+        repeated = [i for i in self._test_cases
+                    if getattr(getattr(self, i), 'independent', False)]
+
+        return self._test_cases + repeated * (self._repeat - 1)
+
+    def _print_repeat_summary(self):
+        attempts = collections.OrderedDict()
+        for result in self.test_results:
+            if result.outcome != 'skipped' and \
+                    result.test_case not in self._pre_test_cases and \
+                    result.test_case not in self._post_test_cases:
+                attempts.setdefault(result.test_case, []).append(result)
+
+        print('The attempts of the test cases:')
+        for test_case, results in attempts.items():
+            outcomes = [i.outcome for i in results]
+            passed = outcomes.count('success')
+            summary = summarize([i.end - i.start for i in results])
+            print('  {}: passed {} of {} ({:.0%}), flake score {:.2f}, '
+                  'median {:.1f}s, p95 {:.1f}s, max {:.1f}s'.format(
+                      test_case, passed, len(results), passed / len(results),
+                      flake_score(outcomes), summary['median'],
+                      summary['p95'], summary['max']))
+
+    def _add_time_buckets(self, test_case, buckets):
+        # The attempts of the repeated test cases are summed up.
+        if test_case in self.time_buckets:
+            buckets = merge([self.time_buckets[test_case], buckets])
+
+        self.time_buckets[test_case] = buckets
+
+    def _get_spans(self):
+        spans = getattr(self._local, 'spans', None)
+
+        return self.spans if spans is None else spans
+
+    def _record_history(self, start_time, exit_code):
+        store = HistoryStore(self._history)
+        try:
+            store.record(get_run_id(), self.__class__.__name__, start_time,
+                         exit_code, self.test_results, self.spans,
+                         self.server_version)
+        finally:
+            store.close()
+
+    def _drain_performance_log(self):
+        if not self._performance_log:
+            return []
+
+        entries = self.browser.driver.get_log('performance')
+        if self.timeline:
+            self.timeline.add_performance_log(entries)
+
+        return entries
+
+    def _instrument_driver(self):
+        """Records every WebDriver command as a span. """
+
+        execute = self.browser.driver.execute
+
+        def instrumented_execute(driver_command, params=None):
+            start_time = time.time()
+            try:
+                return execute(driver_command, params)
+            finally:
+                self.spans.append(('webdriver', driver_command, start_time,
+                                   time.time()))
+
+        self.browser.driver.execute = instrumented_execute
+
     def find_by_css(self, css_selector):
         """A shortcut for self.browser.find_by_css. """
 
@@ -138,53 +948,107 @@ class SplinterTestCase(metaclass=OrderedClassMembers):  # pylint: disable=too-ma
     def _run(self):
         exit_code = 0
 
-        if not self._test_cases:
+        if not self._test_cases and not self._concurrent_test_cases:
             print('There is nothing to run since the number of test cases is '
                   '0.')
             return exit_code
 
         start_time = time.time()
-        for test_case in self._pre_test_cases + \
-                         self._test_cases + \
-                         self._post_test_cases:
+        if self._concurrent_test_cases:
+            stop_at = None
+            if self._suite_budget is not None:
+                stop_at = start_time + self._suite_budget
+
+            if not self.run_concurrent_test_cases(stop_at):
+                exit_code = 1
+
+        all_test_cases = self._pre_test_cases + \
+            self._get_repeated_test_cases() + \
+            self._post_test_cases
+        for i, test_case in enumerate(all_test_cases):
             method = getattr(self, test_case)
+            timeout = getattr(method, 'deadline', self._test_timeout)
+            if self._suite_budget is not None:
+                remaining = self._suite_budget - (time.time() - start_time)
+                if remaining <= 0:
+                    exit_code = 1
+                    skipped_number = len(all_test_cases) - i
+                    self._skipped_number += skipped_number
+                    for skipped in all_test_cases[i:]:
+                        self.test_results.append(
+                            Result(skipped, 'skipped', None, None, None))
+                    self._color_in_red('The suite budget is exhausted, '
+                                       'skipping {} test case(s).'.format(
+                                           skipped_number))
+                    break
+
+                timeout = min(timeout, remaining) if timeout else remaining
+
             print('Running {}...'.format(test_case), end=' ', flush=True)
 
+            test_start_time = time.time()
+            self.before_test_case(test_case)
+            # Anything but the assertions and the timeouts interrupts the run.
+            outcome = 'error'
             try:
-                method()
+                with Watchdog(timeout), self.span('test', test_case):
+                    method()
+                outcome = 'success'
                 self._color_in_green('success')
                 self._succeeded_number += 1
+            except TestTimeoutError as exc:
+                outcome = 'timed out'
+                exit_code = self._fail(test_case, outcome) or exit_code
+                print('The test case {}.'.format(exc))
             except AssertionError:
-                exit_code = 1
-                self._color_in_red('failed')
+                outcome = 'failed'
+                exit_code = self._fail(test_case, outcome) or exit_code
                 _, _, tbe = sys.exc_info()
                 tb_info = traceback.extract_tb(tbe)
                 _, line, _, text = tb_info[-1]
 
                 print('Assertion error occurred on line {} in statement {}'.
                       format(line, text))
+            finally:
+                self.test_results.append(Result(
+                    test_case, outcome, test_start_time, time.time(), None))
+                self.after_test_case(test_case, test_start_time)
 
-                self._failed_number += 1
-
-        tests_number = len(self._test_cases)
+        tests_number = len(self._get_repeated_test_cases()) + \
+            len(self._concurrent_test_cases) * self._repeat
         print('Ran {} test{} in {:.6f}s.'.format(
             tests_number,
             's' if tests_number > 1 else '',
             time.time() - start_time), end=' ')
 
-        if self._failed_number > 0:
+        if self._failed_number > 0 or self._skipped_number > 0:
             self._color_in_red('Failed')
-            return exit_code
+        else:
+            self._color_in_green('Succeeded')
+
+        if self._quarantined_number:
+            print('{} failure(s) of the quarantined test cases were '
+                  'ignored.'.format(self._quarantined_number))
 
-        self._color_in_green('Succeeded')
+        if self._repeat > 1:
+            self._print_repeat_summary()
+
+        print('The time of the test cases was spent on:')
+        for line in format_summary(merge(self.time_buckets.values())):
+            print('  {}'.format(line))
 
         return exit_code
 
+    def clean_up(self):
+        """Cleans up after the test cases. Called at the very end of the run
+        regardless of the outcome.
+        """
 
     def run(self):
         """Runs all the available test cases. """
 
         exit_code = 0
+        start_time = time.time()
 
         name = re.findall('[A-Z][^A-Z]*', self.__class__.__name__)
         verbose_script_name = ' '.join(name).lower()
@@ -213,74 +1077,335 @@ class SplinterTestCase(metaclass=OrderedClassMembers):  # pylint: disable=too-ma
             for post_test_case in self._post_test_cases:
                 method = getattr(self, post_test_case)
                 print('Running clean up {}...'.format(post_test_case))
-                method()
+                try:
+                    with Watchdog(self._test_timeout):
+                        method()
+                except TestTimeoutError as exc:
+                    print('The clean up {}.'.format(exc))
+
+            self.clean_up()
+
+            if self.timeline:
+                self._drain_performance_log()
+                self.timeline.export(self._trace, self.spans)
+                print('Wrote the timeline of the run to {}.'.format(
+                    self._trace))
+
+            if self.profiler:
+                path = self.profiler.finish()
+                if path:
+                    print('Wrote the merged profile to {}.'.format(path))
+
+            if self._history:
+                self._record_history(start_time, exit_code)
 
             if os.path.isfile('/.docker'):
                 self.xvfb.stop()
 
+            if self.media_stub:
+                self.media_stub.stop()
+
         return exit_code
 
 
 class RocketChatTestCase(SplinterTestCase):  # pylint: disable=too-many-instance-attributes
     """Test cases related to Rocket.Chat. """
 
-    def __init__(self, addr, username, password, create_test_user=True,
-                 **kwargs):
+    # The suites which don't test the composer itself override it with 'rest'.
+    default_message_transport = 'ui'
+
+    # The suites which don't test typing itself override it with 'inject'.
+    default_input_mode = 'type'
+
+    # The bot the workers of the in-suite executor talk to in their direct
+    # messages.
+    bot_name = 'meeseeks'
+
+    def __init__(self, addr, username, password, create_test_user=True,  # pylint: disable=too-many-arguments
+                 check_version=False, message_transport=None, input_mode=None,
+                 perf_capture=None, workers=0, **kwargs):
         SplinterTestCase.__init__(self, addr, **kwargs)
 
+        self.addr = addr
+        self.wait_until_app_is_ready(logged_in=None)
+
         self.rocket = RocketChat(username, password, server_url=addr)
+        self._instrument_rest_client(self.rocket)
+        self.registry = ResourceRegistry(self.rocket)
+
+        self._rc_version = get_server_version(addr)
+        self.server_version = self._rc_version
+        self.selectors = self.pick_for_version(SELECTORS)
+
+        self._perf_capture = perf_capture
+        self.perf = ClientPerfRecorder(self.browser.driver, self._rc_version,
+                                       self.__class__.__name__,
+                                       enabled=bool(perf_capture))
 
         self.schedule_pre_test_case('login')
-        self.schedule_pre_test_case('test_check_version')
+
+        if check_version:
+            self.schedule_pre_test_case('test_check_version')
 
         if create_test_user:
             self.schedule_pre_test_case('create_user')
 
         self.username = username
         self.password = password
-        self._rc_version = '0.70'
 
-        self.test_username = 'noname'
+        self._message_transport = \
+            message_transport or self.default_message_transport
+        assert self._message_transport in MESSAGE_TRANSPORTS
+
+        self._input_mode = input_mode or self.default_input_mode
+        assert self._input_mode in INPUT_MODES
+
+        self._current_user = (username, password)
+        self._rest_clients = {username: self.rocket}
+
+        self.last_match_result = None
+
+        # The channel the process has to itself (see choose_own_channel).
+        self._own_channel = None
+
+        # Every test case instance gets its own namespace within the run, so
+        # several runs (and several suites of the same run) can share one
+        # Rocket.Chat server without colliding.
+        self.namespace = '{}{}'.format(get_run_id(), uuid.uuid4().hex[:4])
+
+        self.test_username = self.get_unique_name('noname')
         self.test_full_name = 'No Name'
-        self.test_email = 'noname@nodomain.com'
+        self.test_email = '{}@nodomain.com'.format(self.test_username)
         self.test_password = 'pass'
 
+        # The independent test cases are taken out of the suite and run by the
+        # workers before the rest of it.
+        self._workers_number = workers
+        if workers:
+            self._concurrent_test_cases = [
+                i for i in self._test_cases
+                if getattr(getattr(self, i), 'independent', False)
+            ]
+            self._test_cases = [i for i in self._test_cases
+                                if i not in self._concurrent_test_cases]
+
         if create_test_user:
             self.schedule_test_case('remove_user')
 
     def __del__(self):
         self.browser.quit()
 
+    def clean_up(self):
+        """Deletes all the resources created during the run. """
+
+        start_time = time.time()
+        failed = self.registry.teardown()
+        print('Deleted the test resources in {:.6f}s ({} failed).'.format(
+            time.time() - start_time, len(failed)))
+
+        if self._perf_capture:
+            self.perf.export(self._perf_capture)
+            print('Recorded the performance of {} UI actions to {}.'.format(
+                len(self.perf.records), self._perf_capture))
+
+    @contextlib.contextmanager
+    def action(self, name):
+        """Context manager marking the code inside it as the UI action with
+        the specified name, so that its client-side performance and network
+        traffic are accounted to it.
+        """
+
+        if self.worker:
+            # The workers have no browser to measure.
+            with self.span('action', name):
+                yield
+        else:
+            with self.span('action', name), self.perf.action(name):
+                yield
+
+    @property
+    def worker(self):
+        """The worker of the in-suite executor the current thread runs the
+        test cases by or None.
+        """
+
+        return getattr(self._local, 'worker', None)
+
+    def prepare_worker(self):
+        """Called on behalf of every worker of the in-suite executor before
+        it runs any test case. The suites override it to introduce the users
+        of the workers to the bot.
+        """
+
+    def run_concurrent_test_cases(self, stop_at=None):
+        """Runs the independent test cases by the workers, each of which talks
+        to the bot on behalf of its own user in their direct messages, so the
+        state the scripts keep per user doesn't interfere.
+        """
+
+        workers = []
+        for i in range(min(self._workers_number,
+                           len(self._concurrent_test_cases))):
+            workers.append(self._create_worker(i))
+
+        dependencies = collections.OrderedDict(
+            (i, getattr(getattr(self, i), 'dependencies', ()))
+            for i in self._concurrent_test_cases
+        )
+        groups = self._sort_by_duration(group_by_dependencies(dependencies))
+        groups = groups * self._repeat
+
+        print('Running {} independent test case(s) by {} worker(s)...'.format(
+            len(self._concurrent_test_cases), len(workers)))
+        executor = WorkQueueExecutor(workers, stop_at)
+        results = executor.run(groups, self._run_by_worker,
+                               on_finish=self._finish_concurrent_test_case)
+
+        for worker in workers:
+            self.spans.extend(worker.spans)
+
+        return all(outcome == 'success' or self.is_quarantined(test_case)
+                   for test_case, outcome, _, _ in results)
+
+    def pick_for_version(self, mapping):
+        """Picks the value from the specified mapping (keyed by Rocket.Chat
+        versions) which suits the version of the server under test.
+        """
+
+        return pick_for_version(mapping, self._rc_version)
+
+    def get_rest_client(self, username, password):
+        """Returns the REST API client authenticated as the specified user. """
+
+        client = self._rest_clients.get(username)
+        if client is None:
+            client = make_client(self.addr, username, password)
+            self._instrument_rest_client(client)
+            self._rest_clients[username] = client
+
+        return client
+
+    def _create_worker(self, index):
+        username = self.get_unique_name('worker{}'.format(index))
+        create_user(self.rocket, username)
+        self.registry.add_user(username)
+
+        client = self.get_rest_client(username, username)
+        room_id = open_direct(client, self.bot_name)
+        worker = Worker(index, username, RestConversation(client, room_id))
+        with self._as_worker(worker):
+            self.prepare_worker()
+
+        return worker
+
+    @contextlib.contextmanager
+    def _as_worker(self, worker, spans=None):
+        self._local.worker = worker
+        self._local.spans = worker.spans if spans is None else spans
+        try:
+            yield
+        finally:
+            self._local.worker = None
+            self._local.spans = None
+
+    def _run_by_worker(self, worker, test_case):
+        spans = worker.test_spans = []
+        try:
+            with self._as_worker(worker, spans), self.span('test', test_case):
+                getattr(self, test_case)()
+        finally:
+            worker.spans.extend(spans)
+
+    def _finish_concurrent_test_case(self, worker, test_case, outcome, start,  # pylint: disable=too-many-arguments
+                                     end):
+        print('{} (worker {})...'.format(test_case, worker.index), end=' ')
+        if outcome == 'skipped':
+            self._color_in_red(outcome)
+            self._skipped_number += 1
+            self.test_results.append(
+                Result(test_case, outcome, None, None, None))
+            return
+
+        if outcome == 'success':
+            self._color_in_green(outcome)
+            self._succeeded_number += 1
+        else:
+            self._fail(test_case, outcome)
+
+        self.test_results.append(Result(test_case, outcome, start, end,
+                                        worker.test_spans))
+        self._add_time_buckets(test_case,
+                               account(worker.test_spans, start, end))
+
+    def _sort_by_duration(self, groups):
+        """Puts the longest groups first, as far as the history tells, so
+        that they don't become the tail.
+        """
+
+        if not self._history or not os.path.isfile(self._history):
+            return groups
+
+        store = HistoryStore(self._history)
+        try:
+            durations = store.get_test_durations()
+        finally:
+            store.close()
+
+        suite = self.__class__.__name__
+        return sorted(groups, reverse=True, key=lambda group: sum(
+            durations.get((suite, i), 0) for i in group))
+
+    def _instrument_rest_client(self, client):
+        """Records every REST API call made by the specified client as a
+        span.
+        """
+
+        for name in ('_RocketChat__call_api_get', '_RocketChat__call_api_post'):
+            call_api = getattr(client, name)
+
+            def instrumented_call_api(method, *args, call_api=call_api,
+                                      **kwargs):
+                with self.span('rest', method):
+                    return call_api(method, *args, **kwargs)
+
+            setattr(client, name, instrumented_call_api)
+
+    def get_current_room_id(self):
+        """Returns the ID of the room which is open in the browser. """
+
+        return self.browser.driver.execute_script(
+            "return Session.get('openedRoom');")
+
+    def get_unique_name(self, name):
+        """Turns the specified name into the one which is unique within the
+        namespace of the test case. Must be used for all the users, emails and
+        rooms created by the tests.
+        """
+
+        return '{}_{}'.format(name, self.namespace)
+
+    @spanned('wait')
     def check_latest_response_with_retries(self, expected_text,
                                            match=False, messages_number=1,
                                            attempts_number=30):
         """Checks the latest response from the bot with the specified number of
         retries if needed. """
 
+        matcher = Latest(as_matcher(expected_text, match), messages_number)
+        result = None
         for _ in range(attempts_number):
-            latest_msg = self.browser.driver.find_elements_by_css_selector(
-                'div.body.color-primary-font-color ')
-
-            if not latest_msg:
-                time.sleep(1)
-                continue
-
-            latest_msg = latest_msg[-messages_number:]
-            try:
-                if match:
-                    done = all([bool(re.match(expected_text, msg.text))
-                                for msg in latest_msg])
-                else:
-                    done = all([(expected_text == msg.text)
-                                for msg in latest_msg])
-            except StaleElementReferenceException:
-                continue
+            messages = self.get_messages_since(-messages_number)
+            result = matcher.match(messages)
+            if result.passed:
+                self.last_match_result = result
+                self.mark('message', 'received: {}'.format(
+                    messages[result.index][:80]))
+                return True
 
-            if not done:
-                time.sleep(1)
-                continue
+            self.sleep(1)
 
-            return True
+        self.last_match_result = result
+        sys.stderr.write('{!r}: {}\n'.format(matcher, describe(result)))
 
         return False
 
@@ -288,32 +1413,185 @@ class RocketChatTestCase(SplinterTestCase):  # pylint: disable=too-many-instance
         """Fetches the message by its number. """
 
         messages = self.browser.driver.find_elements_by_css_selector(
-            'div.body.color-primary-font-color ')
+            self.selectors['message_body'])
         assert len(messages) >= abs(number)
         return messages[number]
 
+    def get_message_cursor(self):
+        """Returns the position right after the latest message rendered in the
+        current room (or the time of the latest message in the direct messages
+        of the current worker). The messages which arrive later can be fetched
+        by get_messages_since.
+        """
+
+        if self.worker:
+            return self.worker.conversation.get_message_cursor()
+
+        return self.browser.driver.execute_script(
+            'return document.querySelectorAll(arguments[0]).length;',
+            self.selectors['message_body'])
+
+    def get_messages_since(self, cursor):
+        """Returns the texts of the messages rendered in the current room
+        starting from the specified position. Fetches all of them in one
+        WebDriver call.
+        """
+
+        if self.worker:
+            return self.worker.conversation.get_messages_since(cursor)
+
+        return self.browser.driver.execute_script(
+            MESSAGES_SINCE_JS, self.selectors['message_body'], cursor)
+
+    def get_app_state(self):
+        """Returns the state of the client: 'loading', 'logged-out' or
+        'ready'.
+        """
+
+        return self.browser.driver.execute_script(APP_STATE_JS)
+
+    @spanned('wait')
+    def wait_until_app_is_ready(self, logged_in=True, timeout=30):
+        """Waits until the client is usable, i.e. the Meteor connection is up
+        and, if logged_in is True, the user, their rooms and subscriptions are
+        loaded. If logged_in is False, waits for the login form. If logged_in
+        is None, any of the two states will do.
+        """
+
+        expected_states = {
+            True: ('ready', ),
+            False: ('logged-out', ),
+            None: ('ready', 'logged-out'),
+        }[logged_in]
+
+        WebDriverWait(self.browser.driver, timeout, poll_frequency=0.1).until(
+            lambda _: self.get_app_state() in expected_states)
+
+    def visit(self, url):
+        """Visits the specified URL (or the path on the Rocket.Chat server) and
+        waits until the client is usable.
+        """
+
+        if url.startswith('/'):
+            url = self.addr.rstrip('/') + url
+
+        self.browser.visit(url)
+        self.wait_until_app_is_ready(logged_in=None)
+
+    def go_to(self, path, ready_selector=None, ready_text=None, timeout=30):
+        """Navigates to the specified route of the client without reloading
+        the page and waits until the route is rendered.
+        """
+
+        self.wait_until_app_is_ready()
+        self.browser.driver.execute_script('FlowRouter.go(arguments[0]);',
+                                           path)
+        self.wait_for_route(path, ready_selector, ready_text, timeout)
+
+    @spanned('wait')
+    def wait_for_route(self, path, ready_selector=None, ready_text=None,
+                       timeout=30):
+        """Waits until the client is at the specified route and, optionally,
+        the specified element (containing the specified text) is rendered.
+        """
+
+        WebDriverWait(self.browser.driver, timeout, poll_frequency=0.1).until(
+            lambda driver: driver.execute_script(
+                ROUTE_READY_JS, path, ready_selector, ready_text))
+
+    @ui_action('open room')
+    def open_room(self, room_type, name):
+        """Opens the room of the specified type ('c', 'p' or 'd') by its
+        route.
+        """
+
+        self.go_to('/{}/{}'.format(ROOM_ROUTES[room_type], name),
+                   self.selectors['room_header'], name)
+
+    def open_channel(self, name):
+        """Opens the specified public channel. """
+
+        self.open_room('c', name)
+
+    def open_group(self, name):
+        """Opens the specified private channel. """
+
+        self.open_room('p', name)
+
+    def open_direct(self, username):
+        """Opens the direct messages with the specified user. """
+
+        self.open_room('d', username)
+
+    @ui_action('open admin')
+    def open_admin(self, page):
+        """Opens the specified page of Administration (for example, 'users',
+        'rooms' or 'info') along with the Administration sidebar.
+        """
+
+        self.browser.driver.execute_script(
+            "SideNav.setFlex('adminFlex'); SideNav.openFlex();")
+        self.go_to('/admin/{}'.format(page), self.selectors['admin_page'])
+
+    def close_admin(self):
+        """Closes the Administration sidebar if it's open. """
+
+        self.browser.driver.execute_script(
+            'var btn = document.querySelector(\'button[data-action="close"]\');'
+            'if (btn) { btn.click(); }')
+
+    def get_room_names(self, room_type=None):
+        """Returns the names of the rooms of the specified type ('c', 'p' or
+        'd') or of all types the current user is subscribed to.
+        """
+
+        return self.browser.driver.execute_script(ROOM_NAMES_JS, room_type)
+
+    @ui_action('switch channel')
     def switch_channel(self, channel_name):
         """Switches the current channel to the specified one. """
 
-        channels = self.browser.driver.find_elements_by_css_selector(
-            'div.sidebar-item__ellipsis'
-        )
-        assert channels
-
-        channel = list(
-            filter(lambda elem: elem.text == channel_name, channels))
-        assert len(channel) == 1
+        room_type = self.browser.driver.execute_script(ROOM_TYPE_JS,
+                                                       channel_name)
+        assert room_type in ROOM_ROUTES
 
-        self.browser.driver.execute_script('arguments[0].click();',
-                                           channel[0])
+        self.open_room(room_type, channel_name)
 
     def choose_general_channel(self):
-        """Switches the current channel to general. """
+        """Switches the current channel to general. The workers of the
+        in-suite executor stay in their direct messages with the bot.
+        """
+
+        if self.worker:
+            return
 
         self.switch_channel('general')
 
-    @staticmethod
-    def check_with_retries(func, *args, expected_res=True, attemps_num=30):
+    def choose_own_channel(self):
+        """Switches the current channel to the one the process has to itself,
+        creating it along with the bot on the first call. Unlike #general, the
+        channel is not shared with the other processes run against the same
+        host, such as the shards of a shardable suite, so they don't match
+        each other's replies. The workers of the in-suite executor stay in
+        their direct messages with the bot.
+        """
+
+        if self.worker:
+            return
+
+        if self._own_channel is None:
+            name = self.get_unique_name(self.__class__.__name__.lower())
+            response = self.rocket.channels_create(
+                name, members=[self.bot_name]).json()
+
+            assert response.get('success')
+
+            self.registry.add_channel(name)
+            self._own_channel = name
+
+        self.open_channel(self._own_channel)
+
+    def check_with_retries(self, func, *args, expected_res=True, attemps_num=30):
         """Runs the specified function and compares its return value with the
         specified one. The comparison is done with retries if needed.
         """
@@ -324,7 +1602,7 @@ class RocketChatTestCase(SplinterTestCase):  # pylint: disable=too-many-instance
             if res == expected_res:
                 break
             else:
-                time.sleep(1)
+                self.sleep(1)
                 continue
 
         return res
@@ -358,6 +1636,7 @@ class RocketChatTestCase(SplinterTestCase):  # pylint: disable=too-many-instance
 
         return result != []
 
+    @ui_action('create user')
     def create_user(self):  # pylint: disable=too-many-locals
         """Creates a test user. """
 
@@ -375,21 +1654,7 @@ class RocketChatTestCase(SplinterTestCase):  # pylint: disable=too-many-instance
         )
         assert not does_email_exist
 
-        options_btn = self.browser.find_by_css(
-            '.sidebar__toolbar-button.rc-tooltip.rc-tooltip--down.js-button'
-        )
-        options_btn.last.click()
-
-        administration_btn = self.browser.find_by_css('.rc-popover__item-text')
-        administration_btn.click()
-
-        users_btn = self.browser.driver.find_elements_by_css_selector(
-            'a.sidebar-item__link[aria-label="Users"]')
-
-        assert users_btn
-
-        self.browser.driver.execute_script("arguments[0].click();",
-                                           users_btn[0])
+        self.open_admin('users')
 
         add_user_btn = self.find_by_css('button[aria-label="Add User"]')
 
@@ -458,15 +1723,23 @@ class RocketChatTestCase(SplinterTestCase):  # pylint: disable=too-many-instance
 
         save_btn.first.click()
 
+        self.registry.add_user(self.test_username)
+
         does_username_exist = self.check_with_retries(
             self.does_username_exist,
             self.test_username
         )
         assert does_username_exist
 
+    @ui_action('login')
     def login(self, use_test_user=False):
         """Logs in into the Rocket.Chat server. """
 
+        if use_test_user:
+            self._current_user = (self.test_username, self.test_password)
+        else:
+            self._current_user = (self.username, self.password)
+
         self.browser.fill('emailOrUsername',
                           self.test_username
                           if use_test_user else self.username)
@@ -480,10 +1753,13 @@ class RocketChatTestCase(SplinterTestCase):  # pylint: disable=too-many-instance
 
         login_btn.click()
 
+        self.wait_until_app_is_ready()
+
         welcome_text = self.browser.find_by_text('Welcome to Rocket.Chat!')
 
         assert welcome_text
 
+    @ui_action('logout')
     def logout(self):
         """Logs out of the Rocket.Chat server. """
 
@@ -495,9 +1771,12 @@ class RocketChatTestCase(SplinterTestCase):  # pylint: disable=too-many-instance
         assert logout_btn
         logout_btn.last.click()
 
+        self.wait_until_app_is_ready(logged_in=False)
+
     def _get_rc_version_with_retries(self, attempts_number=60):
         for _ in range(attempts_number):
-            info_table = self.browser.find_by_css(".admin-table-row")
+            info_table = self.browser.find_by_css(
+                self.selectors['version_row'])
 
             assert info_table
 
@@ -506,32 +1785,20 @@ class RocketChatTestCase(SplinterTestCase):  # pylint: disable=too-many-instance
                 version = '.'.join(version_row.split()[1].split('.')[0:2])
                 return version
             except IndexError:
-                time.sleep(1)
+                self.sleep(1)
                 continue
         return ''
 
     def test_check_version(self):
-        """Checks if the Rocket.Chat version equals to the one the tests are
-        intended for.
+        """Checks if the Rocket.Chat version shown in Administration → Info
+        equals to the one reported via the REST API and if the tests are
+        intended for it.
         """
 
-        options_btn = self.browser.find_by_css(
-            '.sidebar__toolbar-button.rc-tooltip.rc-tooltip--down.js-button'
-        )
-        assert options_btn
-        options_btn.last.click()
-
-        administration_btn = self.browser.find_by_css('.rc-popover__item-text')
-        assert administration_btn
-        administration_btn.click()
+        assert parse_version(self._rc_version) >= \
+            min(parse_version(i) for i in SELECTORS)
 
-        info_btn = self.browser.driver.find_elements_by_css_selector(
-            'a.sidebar-item__link[aria-label="Info"]')
-
-        assert info_btn
-
-        self.browser.driver.execute_script("arguments[0].click();",
-                                           info_btn[0])
+        self.open_admin('info')
 
         version = self._get_rc_version_with_retries()
 
@@ -539,11 +1806,7 @@ class RocketChatTestCase(SplinterTestCase):  # pylint: disable=too-many-instance
 
         assert version == self._rc_version
 
-        close_btn = self.find_by_css('button[data-action="close"]')
-
-        assert close_btn
-
-        close_btn.click()
+        self.close_admin()
 
     def _check_modal_window_visibility(self):
         windows = self.browser.driver.find_elements_by_class_name(
@@ -559,76 +1822,7 @@ class RocketChatTestCase(SplinterTestCase):  # pylint: disable=too-many-instance
         )
         assert does_username_exist
 
-        options_btn = self.browser.driver.find_elements_by_css_selector(
-            '.sidebar__toolbar-button.rc-tooltip.rc-tooltip--down.js-button')
-
-        assert options_btn
-
-        self.browser.driver.execute_script('arguments[0].click();',
-                                           options_btn[-1])
-
-        administration_btn = self.browser.find_by_css('.rc-popover__item-text')
-        administration_btn.click()
-
-        users_btn = self.browser.driver.find_elements_by_css_selector(
-            'a.sidebar-item__link[aria-label="Users"]')
-
-        assert users_btn
-
-        self.browser.driver.execute_script("arguments[0].click();",
-                                           users_btn[0])
-
-        selected_user = self.browser.find_by_xpath(
-            '//td[@class="border-component-color"][text()="{0}"]'.
-            format(self.test_username))
-
-        assert selected_user
-
-        selected_user.first.click()
-
-        try:
-            delete_btn = self.find_by_xpath(
-                '//button[@class="js-action rc-user-info-action__item"]'
-                '[text()="Delete"]'
-            )
-
-            assert delete_btn
-
-        except AssertionError:
-            more_btn = self.find_by_css(
-                'button.rc-tooltip.rc-room-actions__button.js-more'
-                '[aria-label="More"]'
-            )
-
-            assert more_btn
-
-            more_btn.first.click()
-
-            delete_btn = self.find_by_xpath(
-                '//li[@class="rc-popover__item js-action"]'
-                '/span[text()="Delete"]'
-            )
-
-            assert delete_btn
-
-        delete_btn.first.click()
-
-        confirm_btn = self.find_by_css('input[value="Yes, delete it!"]')
-
-        assert confirm_btn
-
-        confirm_btn.first.click()
-
-        WebDriverWait(self.browser.driver, 10).until(
-            lambda _: self._check_modal_window_visibility())
-
-        close_btn = self.browser.driver.find_elements_by_css_selector(
-            'button[data-action="close"]')
-
-        assert close_btn
-
-        self.browser.driver.execute_script('arguments[0].click();',
-                                           close_btn[0])
+        assert self.registry.delete('user', self.test_username)
 
         does_username_exist = self.check_with_retries(
             self.does_username_exist,
@@ -637,13 +1831,53 @@ class RocketChatTestCase(SplinterTestCase):  # pylint: disable=too-many-instance
         )
         assert not does_username_exist
 
-    def send_message(self, message_text):
-        """Sends the specified message to the current channel. """
+    @ui_action('send message')
+    def send_message(self, message_text, transport=None, input_mode=None):
+        """Sends the specified message to the current channel. The message is
+        either put into the composer (the 'ui' transport) or posted via the
+        REST API on behalf of the logged-in user (the 'rest' transport). In the
+        former case the message is either typed (the 'type' input mode) or
+        injected at once (the 'inject' input mode).
+        """
+
+        transport = transport or self._message_transport
+        self.mark('message', 'sent: {}'.format(message_text[:80]))
+        if self.worker:
+            self.worker.conversation.send_message(message_text)
+            return
+
+        if transport == 'rest':
+            room_id = self.get_current_room_id()
+
+            assert room_id
 
-        self.browser.fill('msg', message_text)
+            cursor = self.get_message_cursor()
+            client = self.get_rest_client(*self._current_user)
+            response = client.chat_post_message(message_text,
+                                                room_id=room_id).json()
 
-        send_msg_btn = self.find_by_css('svg.rc-icon.rc-input__icon-svg.'
-                                        'rc-input__icon-svg--send')
+            assert response.get('success')
+
+            # Otherwise the checks of the reply could match the previous one,
+            # as long as the message is not rendered in the browser.
+            try:
+                self.wait_until(
+                    lambda driver: driver.execute_script(
+                        MESSAGE_RENDERED_JS, response['message']['_id'],
+                        self.selectors['message_body'], cursor),
+                    poll_frequency=0.1)
+            except TimeoutException:
+                assert False, 'The sent message has not been rendered'
+
+            return
+
+        if (input_mode or self._input_mode) == 'inject':
+            assert self.browser.driver.execute_script(INJECT_MESSAGE_JS,
+                                                      message_text)
+        else:
+            self.browser.fill('msg', message_text)
+
+        send_msg_btn = self.find_by_css(self.selectors['send_button'])
 
         assert send_msg_btn
 
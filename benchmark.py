@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module with the helpers shared by the benchmarks. """
+
+import json
+import math
+import os
+import re
+import statistics
+import sys
+import uuid
+
+
+def percentile(values, fraction):
+    """Returns the specified percentile (from 0 to 1) of the values using the
+    nearest-rank method.
+    """
+
+    ordered = sorted(values)
+    rank = max(int(math.ceil(fraction * len(ordered))), 1)
+
+    return ordered[rank - 1]
+
+
+def summarize(values):
+    """Returns the summary statistics of the values or None if there are no
+    values.
+    """
+
+    if not values:
+        return None
+
+    return {
+        'count': len(values),
+        'max': max(values),
+        'mean': statistics.mean(values),
+        'median': statistics.median(values),
+        'min': min(values),
+        'p95': percentile(values, 0.95),
+        'stdev': statistics.pstdev(values),
+    }
+
+
+def get_namespace(prefix):
+    """Returns the prefix for the names of the users and rooms created by the
+    benchmark, so that they don't collide with the ones created by the tests
+    or by other runs.
+    """
+
+    run_id = re.sub('[^0-9a-z]', '', os.environ.get('RUN_ID', '').lower())
+    if not run_id:
+        run_id = uuid.uuid4().hex[:8]
+
+    return '{}_{}'.format(prefix, run_id)
+
+
+def add_common_arguments(parser):
+    """Adds the options shared by all the benchmarks to the parser. """
+
+    parser.add_argument('-a', '--host', dest='host', type=str,
+                        default='http://127.0.0.1:8006',
+                        help='allows specifying domain or IP of the Rocket.Chat host')
+    parser.add_argument('-u', '--username', dest='username', type=str,
+                        help='allows specifying admin username')
+    parser.add_argument('-p', '--password', dest='password', type=str,
+                        help='allows specifying admin password')
+    parser.add_argument('-o', '--output', dest='output', type=str,
+                        help='allows specifying the file the JSON report is '
+                             'written to (defaults to stdout)')
+
+
+def check_common_arguments(parser, options):
+    """Reports an error if the mandatory common options are not specified. """
+
+    if not options.username:
+        parser.error('Username is not specified')
+
+    if not options.password:
+        parser.error('Password is not specified')
+
+
+def write_report(report, path=None):
+    """Writes the report as JSON to the specified file or stdout. """
+
+    if path:
+        with open(path, 'w') as outfile:
+            json.dump(report, outfile, indent=2, sort_keys=True)
+    else:
+        json.dump(report, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write('\n')
@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Benchmark measuring how the hubot-happy-birthder commands and the birthday
+channels creation behave as the number of users grows.
+"""
+
+import random
+import sys
+import time
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from benchmark import (add_common_arguments, check_common_arguments,
+                       get_namespace, summarize, write_report)
+from matchers import compile_pattern
+from rest import (create_user, iter_messages, make_client, open_direct,
+                  parse_ts, post_message)
+
+DATE_FORMAT = '%d.%m.%Y'
+
+
+class BirthdaySeeder:
+    """Provisions the users with the generated birth and first working day
+    dates. The users are created via the REST API, the dates are set via the
+    bot commands sent in bulk to the direct messages room with the bot.
+    """
+
+    def __init__(self, client, bot_name, namespace, seed=None, workers=8):
+        self._client = client
+        self._bot_name = bot_name
+        self._namespace = namespace
+        self._random = random.Random(seed)
+        self._workers = workers
+
+        self.room_id = open_direct(client, bot_name)
+        self.users = []
+        self.user_ids = {}
+
+    def seed(self, count, upcoming=0):
+        """Adds users until there are the specified number of them. The first
+        upcoming users are born 7 days from today, so the bot creates the
+        birthday channels for them.
+        """
+
+        names = ['{}_{}'.format(self._namespace, i)
+                 for i in range(len(self.users), count)]
+        with ThreadPoolExecutor(max_workers=self._workers) as executor:
+            for name, user_id in zip(names, executor.map(
+                    lambda name: create_user(self._client, name), names)):
+                self.user_ids[name] = user_id
+
+        commands = []
+        for name in names:
+            if len(self.users) < upcoming:
+                birthday = datetime.now() + timedelta(days=7)
+                # A multiple of 4 years, so that Feb 29 stays a valid date.
+                birthday = birthday.replace(year=birthday.year - 28)
+            else:
+                birthday = self._get_random_date(1960, 2000)
+
+            fwd = self._get_random_date(2010, datetime.now().year - 1)
+            commands.append('{} birthday set {} {}'.format(
+                self._bot_name, name, birthday.strftime(DATE_FORMAT)))
+            commands.append('{} fwd set {} {}'.format(
+                self._bot_name, name, fwd.strftime(DATE_FORMAT)))
+            self.users.append(name)
+
+        return self._send_in_bulk(commands, "Saving [^']+'s")
+
+    def clean_up(self):
+        """Deletes the dates and the users created by the seeder. """
+
+        self._send_in_bulk(['{} birthday delete {}'.format(self._bot_name, name)
+                            for name in self.users], "Removing [^']+'s")
+
+        with ThreadPoolExecutor(max_workers=self._workers) as executor:
+            list(executor.map(self._client.users_delete,
+                              self.user_ids.values()))
+
+        self.users = []
+        self.user_ids = {}
+
+    #
+    # Private methods
+    #
+
+    def _get_random_date(self, first_year, last_year):
+        start = datetime(first_year, 1, 1)
+        end = datetime(last_year, 12, 31)
+
+        return start + timedelta(days=self._random.randint(0, (end - start).days))
+
+    def _send_in_bulk(self, commands, ack_pattern, timeout=600):
+        """Sends the commands one after another without waiting for the
+        replies and then waits until all of them are acknowledged. Returns the
+        number of seconds it took.
+        """
+
+        if not commands:
+            return 0
+
+        ack_re = compile_pattern(ack_pattern)
+        start_time = time.time()
+        _, since = post_message(self._client, self.room_id, commands[0])
+        for command in commands[1:]:
+            post_message(self._client, self.room_id, command)
+
+        acks = 0
+        for message in iter_messages(self._client, self.room_id, 'd', since,
+                                     sender=self._bot_name, timeout=timeout,
+                                     count=500):
+            acks += len(ack_re.findall(message['msg']))
+            if acks >= len(commands):
+                break
+        else:
+            sys.stderr.write('Only {} of {} commands were acknowledged\n'
+                             .format(acks, len(commands)))
+
+        return time.time() - start_time
+
+
+class BirthdayBenchmark:
+    """Measures how long the bot takes to answer the commands listing the
+    seeded users and to create the birthday channels for them.
+    """
+
+    def __init__(self, client, seeder, bot_name, namespace, repeat=3,
+                 timeout=300):
+        self._client = client
+        self._seeder = seeder
+        self._bot_name = bot_name
+        self._entry_re = compile_pattern(
+            r'@{}_\d+\b'.format(namespace))
+        self._repeat = repeat
+        self._timeout = timeout
+
+        self.channels = set()
+
+    def measure_command(self, command, expected_entries):
+        """Sends the command and consumes the reply as it arrives, counting the
+        seeded users mentioned in it, so that a huge reply split into many
+        messages is handled chunk by chunk. Returns the measurements.
+        """
+
+        _, sent_at = post_message(self._client, self._seeder.room_id,
+                                  '{} {}'.format(self._bot_name, command))
+
+        first_chunk = last_chunk = None
+        entries = messages = chars = 0
+        for message in iter_messages(self._client, self._seeder.room_id, 'd',
+                                     sent_at, sender=self._bot_name,
+                                     timeout=self._timeout, quiet_period=5,
+                                     count=500):
+            last_chunk = message['ts']
+            first_chunk = first_chunk or last_chunk
+            messages += 1
+            chars += len(message['msg'])
+            entries += sum(1 for _ in self._entry_re.finditer(message['msg']))
+            if entries >= expected_entries:
+                break
+
+        return {
+            'chars': chars,
+            'complete': entries >= expected_entries,
+            'entries': entries,
+            'first_chunk': self._get_delay(first_chunk, sent_at),
+            'last_chunk': self._get_delay(last_chunk, sent_at),
+            'messages': messages,
+        }
+
+    def measure_channels(self, expected_channels, poll_interval=5):
+        """Waits until the bot creates the birthday channels for the users
+        having a birthday soon. Returns the number of seconds it took and the
+        number of created channels.
+        """
+
+        upcoming = self._seeder.users[:expected_channels]
+        patterns = [compile_pattern('{}-birthday-channel-'.format(name))
+                    for name in upcoming]
+        start_time = time.time()
+        channels = []
+        while time.time() - start_time < self._timeout:
+            groups = self._client.groups_list_all(count=0).json()['groups']
+            channels = [group['name'] for group in groups
+                        if any(pattern.match(group['name'])
+                               for pattern in patterns)]
+            if len(channels) >= expected_channels:
+                break
+
+            time.sleep(poll_interval)
+
+        self.channels.update(channels)
+
+        return {
+            'created': len(channels),
+            'elapsed': time.time() - start_time,
+        }
+
+    def run(self, sizes, upcoming=0):
+        """Seeds the users step by step and measures the commands for each
+        number of users. Returns the report.
+        """
+
+        report = []
+        for size in sizes:
+            sys.stderr.write('Seeding {} users\n'.format(size))
+            step = {'seeding': self._seeder.seed(size, upcoming=upcoming),
+                    'size': size}
+            commands = [('birthdays list', 'birthdays list', size),
+                        ('fwd list', 'fwd list', size)]
+            if upcoming:
+                commands.append(
+                    ('birthdays on', 'birthdays on ' +
+                     self._get_upcoming_day_month(), min(upcoming, size)))
+
+            for name, command, expected in commands:
+                runs = [self.measure_command(command, expected)
+                        for _ in range(self._repeat)]
+                step[name] = {
+                    'complete': all(run['complete'] for run in runs),
+                    'first_chunk': summarize([run['first_chunk'] for run in runs
+                                              if run['first_chunk'] is not None]),
+                    'last_chunk': summarize([run['last_chunk'] for run in runs
+                                             if run['last_chunk'] is not None]),
+                    'runs': runs,
+                }
+
+            if upcoming:
+                step['channels'] = self.measure_channels(min(upcoming, size))
+
+            report.append(step)
+
+        return report
+
+    def clean_up(self):
+        """Deletes the birthday channels created for the seeded users. """
+
+        for name in self.channels:
+            self._client.groups_delete(group=name)
+
+        self.channels = set()
+
+    #
+    # Private methods
+    #
+
+    @staticmethod
+    def _get_delay(ts, since):
+        return None if ts is None else parse_ts(ts) - since
+
+    @staticmethod
+    def _get_upcoming_day_month():
+        return (datetime.now() + timedelta(days=7)).strftime('%d.%m')
+
+
+def main():
+    """The main entry point. """
+
+    parser = ArgumentParser(description='usage: %prog [options] arguments')
+    add_common_arguments(parser)
+    parser.add_argument('--sizes', dest='sizes', type=str, default='100,1000',
+                        help='allows specifying the comma-separated numbers '
+                             'of users the commands are measured with')
+    parser.add_argument('--upcoming', dest='upcoming', type=int, default=0,
+                        help='allows specifying the number of users having a '
+                             'birthday in 7 days (birthday channels are '
+                             'measured only if it is not zero)')
+    parser.add_argument('--repeat', dest='repeat', type=int, default=3,
+                        help='allows specifying how many times each command '
+                             'is measured')
+    parser.add_argument('--bot-name', dest='bot_name', type=str,
+                        default='meeseeks',
+                        help='allows specifying the bot name')
+    parser.add_argument('--seed', dest='seed', type=int,
+                        help='allows specifying the seed the dates are '
+                             'generated with')
+    parser.add_argument('--keep', dest='keep', action='store_true',
+                        help='keeps the seeded users after the benchmark')
+    options = parser.parse_args()
+
+    check_common_arguments(parser, options)
+
+    try:
+        sizes = sorted(int(size) for size in options.sizes.split(','))
+    except ValueError:
+        parser.error('Sizes must be comma-separated numbers')
+
+    namespace = get_namespace('bday')
+    client = make_client(options.host, options.username, options.password)
+    seeder = BirthdaySeeder(client, options.bot_name, namespace,
+                            seed=options.seed)
+    benchmark = BirthdayBenchmark(client, seeder, options.bot_name, namespace,
+                                  repeat=options.repeat)
+    try:
+        report = benchmark.run(sizes, upcoming=options.upcoming)
+    finally:
+        if not options.keep:
+            benchmark.clean_up()
+            seeder.clean_up()
+
+    write_report(report, options.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module with the engine which drives multi-turn dialogs with bots. """
+
+import collections
+import contextlib
+import time
+
+from matchers import Latest, as_matcher
+
+# A step of a dialog: the utterance to be sent, the expected reply (a string
+# which must be equal to the reply, a compiled regular expression the reply
+# must match or a matcher) and the number of seconds to wait for the reply.
+Step = collections.namedtuple('Step', 'utterance expected timeout')
+Step.__new__.__defaults__ = (30, )
+
+# The outcome of a step: when the utterance was sent, how long it took the
+# reply to arrive and the latest message seen while waiting.
+StepRecord = collections.namedtuple(
+    'StepRecord', 'utterance sent_at latency passed reply')
+
+
+class DialogEngine:
+    """Plays dialogs, i.e. sequences of steps, in a conversation. The
+    conversation is an object providing send_message(text),
+    get_message_cursor() and get_messages_since(cursor), like
+    RocketChatTestCase does for the room open in the browser.
+    """
+
+    def __init__(self, conversation, poll_interval=0.2):
+        self._conversation = conversation
+        self._poll_interval = poll_interval
+        self.records = []
+
+    def _span(self, kind, name):
+        """Records the span if the conversation keeps them, like
+        RocketChatTestCase does.
+        """
+
+        span = getattr(self._conversation, 'span', None)
+        if span is None:
+            return contextlib.ExitStack()
+
+        return span(kind, name)
+
+    def _sleep(self, seconds):
+        """Sleeps by means of the conversation if it accounts the time of
+        sleeping, like RocketChatTestCase does.
+        """
+
+        getattr(self._conversation, 'sleep', time.sleep)(seconds)
+
+    def wait_reply(self, cursor, expected, timeout=30):
+        """Waits until the latest message which arrived after the specified
+        cursor meets the expectation. Returns whether it happened along with
+        the latest message seen.
+        """
+
+        matcher = Latest(as_matcher(expected))
+        deadline = time.time() + timeout
+        latest = None
+        with self._span('wait', 'reply'):
+            while True:
+                messages = self._conversation.get_messages_since(cursor)
+                if messages:
+                    latest = messages[-1]
+                    if matcher.match(messages).passed:
+                        return True, latest
+
+                if time.time() >= deadline:
+                    return False, latest
+
+                self._sleep(self._poll_interval)
+
+    def play_step(self, step):
+        """Sends the utterance of the specified step and waits for the
+        expected reply. Returns the record of the step.
+        """
+
+        with self._span('step', str(step.utterance)):
+            cursor = self._conversation.get_message_cursor()
+            sent_at = time.time()
+            if step.utterance is not None:
+                self._conversation.send_message(step.utterance)
+
+            passed, reply = self.wait_reply(cursor, step.expected,
+                                            step.timeout)
+        record = StepRecord(step.utterance, sent_at, time.time() - sent_at,
+                            passed, reply)
+        self.records.append(record)
+
+        return record
+
+    def play(self, steps, stop_on_failure=True):
+        """Plays the specified steps one by one. Stops at the first failed step
+        unless stop_on_failure is False. Returns the records of the played
+        steps.
+        """
+
+        records = []
+        for step in steps:
+            record = self.play_step(step)
+            records.append(record)
+            if not record.passed and stop_on_failure:
+                break
+
+        return records
+
+
+def is_passed(records):
+    """Checks if all the specified steps passed. """
+
+    return all(record.passed for record in records)
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module with the executor running the independent test cases of a suite by
+several workers at once.
+"""
+
+import collections
+import queue
+import sys
+import threading
+import time
+import traceback
+
+
+def group_by_dependencies(dependencies):
+    """Splits the test cases into the groups bound by their dependencies. The
+    dependencies are the lists of the test cases which have to be run before
+    the test cases they are keyed by. Returns the list of the groups, each
+    keeping the order of the test cases.
+    """
+
+    # The groups are found using the union-find algorithm.
+    parents = {i: i for i in dependencies}
+
+    def find(test_case):
+        while parents[test_case] != test_case:
+            parents[test_case] = parents[parents[test_case]]
+            test_case = parents[test_case]
+
+        return test_case
+
+    for test_case, test_case_dependencies in dependencies.items():
+        for dependency in test_case_dependencies:
+            if dependency not in parents:
+                raise ValueError('{} depends on the unknown test case {}'
+                                 .format(test_case, dependency))
+
+            parents[find(dependency)] = find(test_case)
+
+    groups = collections.OrderedDict()
+    for test_case in dependencies:
+        groups.setdefault(find(test_case), []).append(test_case)
+
+    return list(groups.values())
+
+
+class Worker:
+    """The user a worker talks to the bot on behalf of in their direct
+    messages, along with the spans recorded by the worker.
+    """
+
+    def __init__(self, index, username, conversation):
+        self.index = index
+        self.username = username
+        self.conversation = conversation
+        self.spans = []
+
+        # The spans of the test case the worker runs or ran last.
+        self.test_spans = None
+
+    def __repr__(self):
+        return 'Worker({}, {!r})'.format(self.index, self.username)
+
+
+class WorkQueueExecutor:
+    """Runs the groups of the test cases by the specified workers. Every
+    worker pulls the next group from the shared queue as soon as it is done
+    with the previous one, so the workers stay busy until the queue is empty
+    regardless of how long the groups take. The test cases of a group are run
+    one after another, and the rest of the group is skipped if one of them
+    fails.
+
+    The watchdog can't interrupt the threads, so the deadlines of the test
+    cases aren't enforced, but no new test case is started after the
+    specified time.
+    """
+
+    def __init__(self, workers, stop_at=None):
+        self._workers = workers
+        self._stop_at = stop_at
+        self._lock = threading.Lock()
+
+        # The (test case, outcome, start, end) tuples in the order the test
+        # cases finished in.
+        self.results = []
+
+    def run(self, groups, func, on_finish=None):
+        """Runs the test cases, calling the specified function with the
+        worker and the name of every test case. The test case passes unless
+        the function raises an exception. The on_finish callback, if any, is
+        called by the thread of the worker with the worker, the test case, its
+        outcome, start and end. Returns the results.
+        """
+
+        work = queue.Queue()
+        for group in groups:
+            work.put(group)
+
+        threads = [threading.Thread(target=self._work,
+                                    args=(worker, work, func, on_finish))
+                   for worker in self._workers]
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+
+        return self.results
+
+    #
+    # Private methods
+    #
+
+    def _work(self, worker, work, func, on_finish):
+        while True:
+            try:
+                group = work.get_nowait()
+            except queue.Empty:
+                return
+
+            skip = False
+            for test_case in group:
+                if self._stop_at is not None and time.time() >= self._stop_at:
+                    skip = True
+
+                start_time = time.time()
+                if skip:
+                    outcome = 'skipped'
+                else:
+                    outcome = self._run_test_case(worker, test_case, func)
+                    skip = outcome != 'success'
+
+                result = (test_case, outcome, None, None) \
+                    if outcome == 'skipped' else \
+                    (test_case, outcome, start_time, time.time())
+                with self._lock:
+                    self.results.append(result)
+                    if on_finish:
+                        on_finish(worker, *result)
+
+    @staticmethod
+    def _run_test_case(worker, test_case, func):
+        try:
+            func(worker, test_case)
+        except AssertionError:
+            return 'failed'
+        except Exception:  # pylint: disable=broad-except
+            sys.stderr.write('{} in {!r}:\n{}'.format(
+                test_case, worker, traceback.format_exc()))
+            return 'error'
+
+        return 'success'
@@ -25,14 +25,20 @@ import time
 from argparse import ArgumentParser
 from datetime import datetime, timedelta
 
-from selenium.webdriver.support.wait import WebDriverWait
-
-from base import RocketChatTestCase
+from base import (
+    RocketChatTestCase,
+    add_harness_arguments,
+    deadline,
+    get_harness_kwargs
+)
+from matchers import compile_pattern
 
 
 class HappyBirthderScriptTestCase(RocketChatTestCase):  # pylint: disable=too-many-public-methods
     """Tests for the hubot-happy-birthder script. """
 
+    default_message_transport = 'rest'
+
     def __init__(self, addr, username, password, reminder_interval_time, **kwargs):
         RocketChatTestCase.__init__(self, addr, username, password, **kwargs)
 
@@ -46,10 +52,19 @@ class HappyBirthderScriptTestCase(RocketChatTestCase):  # pylint: disable=too-ma
 
         self._bot_name = 'meeseeks'
 
-        self._test_user_for_blacklist = 'test_user_for_blacklist'
+        self._test_user_for_blacklist = self.get_unique_name(
+            'test_user_for_blacklist')
 
         self._fwd_date = datetime.now().replace(year=datetime.now().year - 1).strftime('%d.%m.%Y')
 
+        # The birthday channel created last.
+        self._birthday_channel = None
+
+        # How long it took after the wait started for the scheduler to do what
+        # was expected from it. The ticks of the scheduler can't be observed,
+        # so the delays include the time the wait started before the tick.
+        self.scheduler_delays = []
+
     #
     # Private methods
     #
@@ -61,27 +76,70 @@ class HappyBirthderScriptTestCase(RocketChatTestCase):  # pylint: disable=too-ma
     @staticmethod
     def _get_channel_pattern(name, date):
         d_m = date[:-5]
-        return f'{name}-birthday-channel-{d_m}-id[0-9]{{3}}'
+        return compile_pattern(
+            f'{re.escape(name)}-birthday-channel-{d_m}-id[0-9]{{3}}')
 
     @staticmethod
     def _get_congratulation_pattern(username):
         pattern = (f'https?://media.tenor.com/images/[0-9a-z]*/tenor.gif\n'
-                   f'Today is birthday of @{username}!\n'
+                   f'Today is birthday of @{re.escape(username)}!\n'
                    f'[w+]*')
 
-        return pattern
+        return compile_pattern(pattern)
 
     @staticmethod
     def _get_fwd_congratulation_pattern(usernames, years_counts):
         pattern = f'.*'
         for name, count in zip(usernames, years_counts):  # pylint: disable=unused-variable
-            pattern += (f'\n@{name} has been a part of our team for {count} '
+            pattern += (f'\n@{re.escape(name)} has been a part of our team for {count} '
                         f'{"year" if count==1 else "years"} and')
 
-        return pattern[:-4] + "!"
+        return compile_pattern(pattern[:-4] + "!")
 
-    def _wait_reminder(self):
-        time.sleep(self._reminder_interval_time)
+    def _wait_reminder(self, condition, description, poll_interval=0.5):
+        """Waits until the specified condition is met, but no longer than the
+        reminder interval. Returns the last result of the condition.
+        """
+
+        start_time = time.time()
+        with self.span('wait', description):
+            while True:
+                result = condition()
+                if result:
+                    # The delay is recorded as a span, so it ends up in the
+                    # history and the timeline.
+                    end_time = time.time()
+                    self.add_span('scheduler', description, start_time,
+                                  end_time)
+                    self.scheduler_delays.append(
+                        (description, end_time - start_time))
+                    return result
+
+                if time.time() - start_time >= self._reminder_interval_time:
+                    return result
+
+                self.sleep(poll_interval)
+
+    def _find_birthday_channels(self, pattern):
+        return [name for name in self.get_room_names('p')
+                if pattern.match(name)]
+
+    def _wait_birthday_channel_deleted(self):
+        channel = self._birthday_channel
+        is_deleted = self._wait_reminder(
+            lambda: channel not in self.get_room_names('p'),
+            'delete a birthday channel')
+        if is_deleted:
+            self._birthday_channel = None
+
+        return is_deleted
+
+    def clean_up(self):
+        for description, delay in self.scheduler_delays:
+            print('It took {:.1f}s since the wait started to {}.'
+                  .format(delay, description))
+
+        RocketChatTestCase.clean_up(self)
 
     #
     # Public methods
@@ -207,21 +265,18 @@ class HappyBirthderScriptTestCase(RocketChatTestCase):  # pylint: disable=too-ma
             "Saving {}'s birthday.".format(self.test_username)
         )
 
-        self._wait_reminder()
-        private_channels = self.find_by_css('.rooms-list__list.type-p')
-
-        assert private_channels
-
-        lst_of_channels = private_channels.text.split('\n')
-
-        assert lst_of_channels
-
         pattern = self._get_channel_pattern(self.test_username,
                                             self._get_date_with_shift(0))
+        channels = self._wait_reminder(
+            lambda: self._find_birthday_channels(pattern),
+            'create a birthday channel')
+
+        assert channels
 
-        assert bool(re.match(pattern, lst_of_channels[-1]))
+        self._birthday_channel = channels[-1]
+        self.registry.add_group(channels[-1])
 
-        self.switch_channel(lst_of_channels[-1])
+        self.switch_channel(channels[-1])
         assert self.check_latest_response_with_retries(
             '@{} is having a birthday soon, so let\'s discuss a present.'
             .format(self.test_username)
@@ -235,9 +290,10 @@ class HappyBirthderScriptTestCase(RocketChatTestCase):  # pylint: disable=too-ma
 
         assert len(channel_options) >= 3
 
-        channel_options[2].click()
+        with self.action('open members list'):
+            channel_options[2].click()
 
-        members_list = self.find_by_css('.rc-member-list__user')
+            members_list = self.find_by_css('.rc-member-list__user')
 
         assert members_list
 
@@ -274,19 +330,8 @@ class HappyBirthderScriptTestCase(RocketChatTestCase):  # pylint: disable=too-ma
                                                          self.test_username,
                                                          test_date))
 
-        self._wait_reminder()
-        private_channels = self.find_by_css('.rooms-list__list.type-p')
-
-        assert private_channels
-
-        lst_of_channels = private_channels.text.split('\n')
-
-        assert lst_of_channels
-
-        pattern = self._get_channel_pattern(self.test_username, test_date)
-
-        assert all([not bool(re.match(pattern, channel))
-                    for channel in lst_of_channels])
+        assert self._birthday_channel
+        assert self._wait_birthday_channel_deleted()
 
     def test_birthday_message(self):
         """Makes sure the bot writes a birthday message to #general devoted to
@@ -350,27 +395,14 @@ class HappyBirthderScriptTestCase(RocketChatTestCase):  # pylint: disable=too-ma
             '@{} was born on {}'.format(self.test_username, users_birthday,
                                         self.username, admins_birthday))
 
+    @deadline(600)
     def test_birthday_channel_blacklist(self):  # pylint: disable=too-many-locals,too-many-statements
         """Makes sure that the user, who is in the blacklist, is not invited
         in birthday channels.
         """
 
         #  create user for blacklist
-        options_btn = self.browser.find_by_css(
-            '.sidebar__toolbar-button.rc-tooltip.rc-tooltip--down.js-button'
-        )
-        options_btn.last.click()
-
-        administration_btn = self.browser.find_by_css('.rc-popover__item-text')
-        administration_btn.click()
-
-        users_btn = self.browser.driver.find_elements_by_css_selector(
-            'a.sidebar-item__link[aria-label="Users"]')
-
-        assert users_btn
-
-        self.browser.driver.execute_script('arguments[0].click();',
-                                           users_btn[0])
+        self.open_admin('users')
 
         add_user_btn = self.find_by_css('button[aria-label="Add User"]')
 
@@ -439,6 +471,8 @@ class HappyBirthderScriptTestCase(RocketChatTestCase):  # pylint: disable=too-ma
 
         save_btn.first.click()
 
+        self.registry.add_user(self._test_user_for_blacklist)
+
         close_btn = self.find_by_css('button[data-action="close"]')
 
         assert close_btn
@@ -451,25 +485,28 @@ class HappyBirthderScriptTestCase(RocketChatTestCase):  # pylint: disable=too-ma
                           format(self._bot_name, self.test_username,
                                  test_date))
 
-        self._wait_reminder()
-        private_channels = self.find_by_css('.rooms-list__list.type-p')
-
-        assert private_channels
+        pattern = self._get_channel_pattern(self.test_username,
+                                            self._get_date_with_shift(0))
+        channels = self._wait_reminder(
+            lambda: self._find_birthday_channels(pattern),
+            'create a birthday channel')
 
-        lst_of_channels = private_channels.text.split('\n')
+        assert channels
 
-        assert lst_of_channels
+        self._birthday_channel = channels[-1]
+        self.registry.add_group(channels[-1])
 
-        self.switch_channel(lst_of_channels[-1])
+        self.switch_channel(channels[-1])
 
         channel_options = self.find_by_css(
             '.rc-room-actions__action.tab-button.js-action')
 
         assert len(channel_options) >= 3
 
-        channel_options[2].click()
+        with self.action('open members list'):
+            channel_options[2].click()
 
-        members_list = self.find_by_css('.rc-member-list__user')
+            members_list = self.find_by_css('.rc-member-list__user')
 
         assert len(members_list) == 2
 
@@ -480,83 +517,14 @@ class HappyBirthderScriptTestCase(RocketChatTestCase):  # pylint: disable=too-ma
                           format(self._bot_name, self.test_username,
                                  test_date))
 
-        self._wait_reminder()
+        assert self._wait_birthday_channel_deleted()
 
         self.send_message('{} birthday delete {}'.
                           format(self._bot_name, self.test_username))
         self.send_message('{} birthday delete {}'.
                           format(self._bot_name, self.test_username))
 
-        options_btn = self.browser.driver.find_elements_by_css_selector(
-            '.sidebar__toolbar-button.rc-tooltip.rc-tooltip--down.js-button')
-
-        assert options_btn
-
-        self.browser.driver.execute_script('arguments[0].click();',
-                                           options_btn[-1])
-
-        administration_btn = self.browser.find_by_css('.rc-popover__item-text')
-        administration_btn.click()
-
-        users_btn = self.browser.driver.find_elements_by_css_selector(
-            'a.sidebar-item__link[aria-label="Users"]')
-
-        assert users_btn
-
-        self.browser.driver.execute_script('arguments[0].click();',
-                                           users_btn[0])
-
-        selected_user = self.browser.find_by_xpath(
-            '//td[@class="border-component-color"][text()="{0}"]'
-            .format(self._test_user_for_blacklist))
-
-        assert selected_user
-
-        selected_user.first.click()
-
-        try:
-            delete_btn = self.find_by_xpath(
-                '//button[@class="js-action rc-user-info-action__item"]'
-                '[text()="Delete"]'
-            )
-
-            assert delete_btn
-
-        except AssertionError:
-            more_btn = self.find_by_css(
-                'button.rc-tooltip.rc-room-actions__button.js-more'
-                '[aria-label="More"]'
-            )
-
-            assert more_btn
-
-            more_btn.first.click()
-
-            delete_btn = self.find_by_xpath(
-                '//li[@class="rc-popover__item js-action"]'
-                '/span[text()="Delete"]'
-            )
-
-            assert delete_btn
-
-        delete_btn.first.click()
-
-        confirm_btn = self.find_by_css('input[value="Yes, delete it!"]')
-
-        assert confirm_btn
-
-        confirm_btn.first.click()
-
-        WebDriverWait(self.browser.driver, 10).until(
-            lambda _: self._check_modal_window_visibility())
-
-        close_btn = self.browser.driver.find_elements_by_css_selector(
-            'button[data-action="close"]')
-
-        assert close_btn
-
-        self.browser.driver.execute_script('arguments[0].click();',
-                                           close_btn[0])
+        assert self.registry.delete('user', self._test_user_for_blacklist)
 
     def test_fwd_set_for_admin(self):
         """Tests if it's possible on behalf of the admin to specify a first
@@ -644,6 +612,7 @@ def main():
                         help="allows specifying time "
                              "for waiting reminder\'s work(secs)")
 
+    add_harness_arguments(parser)
     options = parser.parse_args()
 
     if not options.host:
@@ -667,7 +636,8 @@ def main():
     test_cases = HappyBirthderScriptTestCase(options.host, options.username,
                                              options.password,
                                              reminder_interval_time=options.wait,
-                                             create_test_user=False)
+                                             create_test_user=False,
+                                             **get_harness_kwargs(options))
     exit_code = test_cases.run()
     sys.exit(exit_code)
 
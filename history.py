@@ -0,0 +1,493 @@
+#!/usr/bin/env python3
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module with the store of the history of the runs and the report comparing
+a run against the baseline formed by the previous runs.
+"""
+
+import argparse
+import collections
+import re
+import sqlite3
+import statistics
+import sys
+import time
+
+from accounting import account
+
+# The attempt of a test case. The spans are the ones recorded by the thread
+# which ran the test case concurrently with others or None if the test case
+# was run by the main thread.
+Result = collections.namedtuple('Result', 'test_case outcome start end spans')
+
+# The kinds of the timings are 'test', 'step', 'action' and 'scheduler', which
+# come from the spans of the same names, 'bucket', which comes from the
+# accounting of the time of the test cases, and 'bot', which is the time
+# between a message sent to the bot and the reply to it.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id TEXT NOT NULL,
+    suite TEXT NOT NULL,
+    started_at REAL NOT NULL,
+    duration REAL NOT NULL,
+    server_version TEXT,
+    exit_code INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS outcomes (
+    run INTEGER NOT NULL REFERENCES runs (id),
+    test_case TEXT NOT NULL,
+    outcome TEXT NOT NULL,
+    duration REAL
+);
+CREATE TABLE IF NOT EXISTS timings (
+    run INTEGER NOT NULL REFERENCES runs (id),
+    test_case TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    name TEXT NOT NULL,
+    duration REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_suite ON runs (suite, started_at);
+CREATE INDEX IF NOT EXISTS outcomes_run ON outcomes (run);
+CREATE INDEX IF NOT EXISTS timings_run ON timings (run);
+"""
+
+
+def normalize_command(text):
+    """Turns the specified message sent to the bot into the name of the
+    command, replacing the mentions and the numbers, so that, for example,
+    'birthday set @john_1 01.02.1990' and 'birthday set @bob 03.04.1991' are
+    accounted together.
+    """
+
+    text = re.sub(r'@\S+', '@user', text)
+    text = re.sub(r'\d+', 'N', text)
+
+    return ' '.join(text.split()[:4])
+
+
+def collect_timings(test_case, spans, start, end):
+    """Returns the (test case, kind, name, duration) tuples of the step,
+    action, scheduler and bot timings found among the specified spans within the
+    window of the test case.
+    """
+
+    timings = []
+    sent = None
+    for kind, name, span_start, span_end in spans:
+        if span_start < start or span_end > end:
+            continue
+
+        if kind in ('step', 'action', 'scheduler'):
+            timings.append((test_case, kind, name, span_end - span_start))
+        elif kind == 'message' and name.startswith('sent: '):
+            sent = (name[len('sent: '):], span_start)
+        elif kind == 'message' and name.startswith('received: ') and sent:
+            text, sent_at = sent
+            timings.append((test_case, 'bot', normalize_command(text),
+                            span_start - sent_at))
+            sent = None
+
+    return timings
+
+
+def flake_score(outcomes):
+    """Returns the share of the consecutive attempts of a test case with
+    different outcomes. A test case which always passes or always fails
+    scores 0, while the one which alternates scores 1.
+    """
+
+    outcomes = [i == 'success' for i in outcomes if i != 'skipped']
+    if len(outcomes) < 2:
+        return 0.0
+
+    flips = sum(1 for prev, cur in zip(outcomes, outcomes[1:]) if prev != cur)
+
+    return flips / (len(outcomes) - 1)
+
+
+def read_quarantine(path):
+    """Reads the quarantine list, i.e. the test cases (either 'test_case' or
+    'Suite.test_case') one per line, the failures of which don't fail the
+    run. The empty lines and the comments starting with '#' are ignored.
+    """
+
+    with open(path) as infile:
+        lines = [line.split('#', 1)[0].strip() for line in infile]
+
+    return {line for line in lines if line}
+
+
+class HistoryStore:
+    """The SQLite store of the outcomes and the timings of the runs. """
+
+    def __init__(self, path):
+        # The suites run in parallel append to the same file.
+        self._conn = sqlite3.connect(path, timeout=60)
+        self._conn.executescript(SCHEMA)
+
+    def close(self):
+        """Closes the store. """
+
+        self._conn.close()
+
+    def record(self, run_id, suite, started_at, exit_code, results, spans,
+               server_version=None):
+        """Records the run of the specified suite. The results are the
+        Result tuples of every attempt of every test case, while the spans are
+        the ones recorded by the main thread. Returns the identifier of the
+        record.
+        """
+
+        with self._conn:
+            cursor = self._conn.execute(
+                'INSERT INTO runs (run_id, suite, started_at, duration, '
+                'server_version, exit_code) VALUES (?, ?, ?, ?, ?, ?)',
+                (run_id, suite, started_at, time.time() - started_at,
+                 server_version, exit_code))
+            run = cursor.lastrowid
+
+            timings = []
+            for test_case, outcome, start, end, test_spans in results:
+                duration = end - start if end is not None else None
+                self._conn.execute(
+                    'INSERT INTO outcomes (run, test_case, outcome, duration) '
+                    'VALUES (?, ?, ?, ?)', (run, test_case, outcome, duration))
+                if end is None:
+                    continue
+
+                test_spans = spans if test_spans is None else test_spans
+                timings.append((test_case, 'test', test_case, duration))
+                timings.extend(collect_timings(test_case, test_spans, start,
+                                               end))
+                for bucket, spent in account(test_spans, start, end).items():
+                    timings.append((test_case, 'bucket', bucket, spent))
+
+            self._conn.executemany(
+                'INSERT INTO timings (run, test_case, kind, name, duration) '
+                'VALUES (?, ?, ?, ?, ?)',
+                [(run, ) + timing for timing in timings])
+
+        return run
+
+    def get_runs(self, suite=None, limit=None, before=None):
+        """Returns the runs (newest first) as the dicts, optionally only the
+        ones of the specified suite started before the specified time.
+        """
+
+        query = 'SELECT * FROM runs WHERE 1'
+        params = []
+        if suite:
+            query += ' AND suite = ?'
+            params.append(suite)
+        if before is not None:
+            query += ' AND started_at < ?'
+            params.append(before)
+        query += ' ORDER BY started_at DESC'
+        if limit:
+            query += ' LIMIT ?'
+            params.append(limit)
+
+        self._conn.row_factory = sqlite3.Row
+        try:
+            return [dict(row) for row in self._conn.execute(query, params)]
+        finally:
+            self._conn.row_factory = None
+
+    def get_latest_run_id(self):
+        """Returns the identifier of the latest run or None if the store is
+        empty.
+        """
+
+        row = self._conn.execute(
+            'SELECT run_id FROM runs ORDER BY started_at DESC LIMIT 1',
+        ).fetchone()
+
+        return row[0] if row else None
+
+    def get_runs_by_run_id(self, run_id):
+        """Returns the runs of all the suites which shared the specified run
+        identifier.
+        """
+
+        return [run for run in self.get_runs() if run['run_id'] == run_id]
+
+    def get_outcomes(self, run):
+        """Returns the outcomes of the test cases of the specified run keyed
+        by the test cases.
+        """
+
+        return collections.OrderedDict(self._conn.execute(
+            'SELECT test_case, outcome FROM outcomes WHERE run = ? '
+            'ORDER BY rowid', (run, )))
+
+    def get_metrics(self, run):
+        """Returns the medians of the timings of the specified run keyed by
+        the (test case, kind, name) tuples.
+        """
+
+        samples = collections.defaultdict(list)
+        for test_case, kind, name, duration in self._conn.execute(
+                'SELECT test_case, kind, name, duration FROM timings '
+                'WHERE run = ?', (run, )):
+            samples[(test_case, kind, name)].append(duration)
+
+        return {key: statistics.median(values)
+                for key, values in samples.items()}
+
+    def get_test_durations(self, window=10):
+        """Returns the medians of the durations of the successful test cases
+        over the specified number of their latest runs keyed by the (suite,
+        test case) tuples.
+        """
+
+        samples = collections.defaultdict(list)
+        for suite, test_case, duration in self._conn.execute(
+                'SELECT runs.suite, outcomes.test_case, outcomes.duration '
+                'FROM outcomes JOIN runs ON runs.id = outcomes.run '
+                "WHERE outcomes.outcome = 'success' "
+                'ORDER BY runs.started_at DESC'):
+            values = samples[(suite, test_case)]
+            if len(values) < window:
+                values.append(duration)
+
+        return {key: statistics.median(values)
+                for key, values in samples.items()}
+
+    def get_flakiness(self, window=20):
+        """Returns the (attempts, pass rate, flake score) tuples of the test
+        cases over the specified number of their latest attempts keyed by the
+        (suite, test case) tuples.
+        """
+
+        attempts = collections.defaultdict(list)
+        for suite, test_case, outcome in self._conn.execute(
+                'SELECT runs.suite, outcomes.test_case, outcomes.outcome '
+                'FROM outcomes JOIN runs ON runs.id = outcomes.run '
+                "WHERE outcomes.outcome != 'skipped' "
+                'ORDER BY runs.started_at DESC, outcomes.rowid DESC'):
+            outcomes = attempts[(suite, test_case)]
+            if len(outcomes) < window:
+                outcomes.append(outcome)
+
+        flakiness = {}
+        for key, outcomes in attempts.items():
+            outcomes.reverse()
+            passed = sum(1 for i in outcomes if i == 'success')
+            flakiness[key] = (len(outcomes), passed / len(outcomes),
+                              flake_score(outcomes))
+
+        return flakiness
+
+    def get_overheads(self, window=10):
+        """Returns the medians of the time the latest runs of every suite
+        spent apart from its test cases, such as starting the browser,
+        logging in and cleaning up, keyed by the suites.
+        """
+
+        samples = collections.defaultdict(list)
+        for suite, overhead in self._conn.execute(
+                'SELECT runs.suite, runs.duration - '
+                "    TOTAL(CASE WHEN outcomes.test_case LIKE 'test\\_%' ESCAPE '\\' "
+                '              THEN outcomes.duration END) '
+                'FROM runs LEFT JOIN outcomes ON runs.id = outcomes.run '
+                'GROUP BY runs.id ORDER BY runs.started_at DESC'):
+            values = samples[suite]
+            if len(values) < window:
+                values.append(max(overhead, 0))
+
+        return {suite: statistics.median(values)
+                for suite, values in samples.items()}
+
+
+def compare(current, baseline, threshold=0.2, sigmas=3.0, min_delta=0.5):
+    """Compares the metrics of the current run against the metrics of the
+    baseline runs. A metric regresses when its value exceeds the median of
+    the baseline by both the relative threshold and the specified number of
+    standard deviations, and by at least the specified number of seconds.
+    Returns the list of the regressions sorted by the relative change.
+    """
+
+    regressions = []
+    for key, value in current.items():
+        values = [metrics[key] for metrics in baseline if key in metrics]
+        if not values:
+            continue
+
+        median = statistics.median(values)
+        stdev = statistics.pstdev(values)
+        if value - median < min_delta:
+            continue
+
+        if value <= median * (1 + threshold):
+            continue
+
+        if len(values) > 1 and value <= median + sigmas * stdev:
+            continue
+
+        regressions.append({
+            'test_case': key[0],
+            'kind': key[1],
+            'name': key[2],
+            'value': value,
+            'baseline': median,
+            'stdev': stdev,
+            'change': (value - median) / median if median else float('inf'),
+            'samples': len(values),
+        })
+
+    return sorted(regressions, key=lambda i: i['change'], reverse=True)
+
+
+def report(store, run_id=None, window=10, min_runs=3, **kwargs):
+    """Compares every suite of the specified run (the latest one by default)
+    against the baseline formed by the previous successful runs of the suite.
+    Returns the list of the (run, regressions, failures, baseline size)
+    tuples, where the failures are the (test case, outcome) tuples.
+    """
+
+    run_id = run_id or store.get_latest_run_id()
+    results = []
+    for run in store.get_runs_by_run_id(run_id):
+        baseline_runs = [
+            i for i in store.get_runs(suite=run['suite'], limit=window,
+                                      before=run['started_at'])
+            if i['exit_code'] == 0
+        ]
+        failures = [(test_case, outcome)
+                    for test_case, outcome in store.get_outcomes(run['id']).items()
+                    if outcome != 'success']
+        regressions = []
+        if len(baseline_runs) >= min_runs:
+            baseline = [store.get_metrics(i['id']) for i in baseline_runs]
+            regressions = compare(store.get_metrics(run['id']), baseline,
+                                  **kwargs)
+
+        results.append((run, regressions, failures, len(baseline_runs)))
+
+    return results
+
+
+def main():
+    """The main entry point. """
+
+    parser = argparse.ArgumentParser(
+        description='Compares a run against the previous runs or lists the '
+                    'flaky test cases')
+    parser.add_argument('-d', '--db', dest='db', type=str, required=True,
+                        help='allows specifying the SQLite file the history '
+                             'of the runs is kept in')
+    parser.add_argument('--run', dest='run_id', type=str,
+                        help='allows specifying the identifier of the run to '
+                             'check (the latest one by default)')
+    parser.add_argument('--window', dest='window', type=int, default=10,
+                        help='allows specifying the number of the previous '
+                             'successful runs forming the baseline')
+    parser.add_argument('--min-runs', dest='min_runs', type=int, default=3,
+                        help='allows specifying the minimal number of the '
+                             'baseline runs needed for the comparison')
+    parser.add_argument('--threshold', dest='threshold', type=float,
+                        default=0.2,
+                        help='allows specifying the relative slowdown which '
+                             'is considered a regression')
+    parser.add_argument('--sigmas', dest='sigmas', type=float, default=3.0,
+                        help='allows specifying the number of the standard '
+                             'deviations of the baseline a regression has to '
+                             'exceed')
+    parser.add_argument('--min-delta', dest='min_delta', type=float,
+                        default=0.5,
+                        help='allows specifying the slowdown (secs) below '
+                             'which the changes are ignored')
+    parser.add_argument('--flaky', dest='flaky', action='store_true',
+                        help='lists the flaky test cases instead of checking '
+                             'a run')
+    parser.add_argument('--attempts', dest='attempts', type=int, default=20,
+                        help='allows specifying the number of the latest '
+                             'attempts of every test case the flake score is '
+                             'computed over')
+    parser.add_argument('--min-score', dest='min_score', type=float,
+                        default=0.1,
+                        help='allows specifying the flake score from which '
+                             'on a test case is considered flaky')
+    parser.add_argument('--write-quarantine', dest='quarantine', type=str,
+                        help='allows specifying the file the flaky test '
+                             'cases are written to, so that it can be passed '
+                             'to the suites via --quarantine')
+    args = parser.parse_args()
+
+    if args.flaky:
+        _list_flaky(args)
+        sys.exit(0)
+
+    store = HistoryStore(args.db)
+    try:
+        results = report(store, args.run_id, window=args.window,
+                         min_runs=args.min_runs, threshold=args.threshold,
+                         sigmas=args.sigmas, min_delta=args.min_delta)
+    finally:
+        store.close()
+
+    if not results:
+        sys.stderr.write('There are no runs to report on\n')
+        sys.exit(1)
+
+    exit_code = 0
+    for run, regressions, failures, baseline_size in results:
+        print('{} (run {}, Rocket.Chat {}, {:.1f}s):'.format(
+            run['suite'], run['run_id'], run['server_version'] or 'unknown',
+            run['duration']))
+        if baseline_size < args.min_runs:
+            print('  not enough baseline runs ({} of {})'.format(
+                baseline_size, args.min_runs))
+
+        for test_case, outcome in failures:
+            print('  {}: {}'.format(outcome, test_case))
+
+        for regression in regressions:
+            exit_code = 1
+            print('  regression: {test_case} {kind} "{name}" '
+                  '{value:.2f}s vs {baseline:.2f}s ({change:+.0%}, '
+                  'n={samples})'.format(**regression))
+
+        if not failures and not regressions:
+            print('  ok')
+
+    sys.exit(exit_code)
+
+
+def _list_flaky(args):
+    store = HistoryStore(args.db)
+    try:
+        flakiness = store.get_flakiness(args.attempts)
+    finally:
+        store.close()
+
+    flaky = sorted(((score, pass_rate, attempts, key)
+                    for key, (attempts, pass_rate, score) in flakiness.items()
+                    if score >= args.min_score), reverse=True)
+    for score, pass_rate, attempts, (suite, test_case) in flaky:
+        print('{}.{}: flake score {:.2f}, passed {:.0%} of {} attempts'.format(
+            suite, test_case, score, pass_rate, attempts))
+
+    if not flaky:
+        print('There are no flaky test cases')
+
+    if args.quarantine:
+        with open(args.quarantine, 'w') as outfile:
+            for _, _, _, (suite, test_case) in flaky:
+                outfile.write('{}.{}\n'.format(suite, test_case))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,425 @@
+#!/usr/bin/env python3
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Generator of the leave requests to the hubot-viva-las-vegas script which
+drives the whole flow for many users at the same time and measures the
+throughput and the latencies of the bot.
+"""
+
+import random
+import re
+import sys
+import threading
+import time
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from benchmark import (add_common_arguments, check_common_arguments,
+                       get_namespace, summarize, write_report)
+from dialog import DialogEngine, Step, is_passed
+from matchers import compile_pattern
+from rest import (RestConversation, create_user, find_room,
+                  get_all_history, make_client, open_direct, parse_ts)
+from scheduler_benchmark import (CronSchedule, add_utc_offset_argument,
+                                 get_utc_offset)
+from viva_messages import (BIRTHDAY_SAVED_MSG, CONFIRMATION_RE, FROM_MSG,
+                           TO_MSG)
+
+# How long (in seconds) to wait for the report after the tick of the report
+# scheduler.
+REPORT_GRACE = 30
+
+REQUEST_SENT_MSG = ('Заявка на отпуск отправлена. '
+                    'Ответ поступит не позже чем через 7 дней.')
+
+# The command the admin sends, the reply to the admin and the notification
+# the user receives for each decision.
+DECISIONS = {
+    'approve': ('одобрить заявку @{}',
+                'Заявка @{} одобрена. '
+                'Я отправлю этому пользователю уведомление об этом.',
+                'Заявка на отпуск одобрена.'),
+    'reject': ('отклонить заявку @{}',
+               'Заявка @{} отклонена. '
+               'Я отправлю этому пользователю уведомление об этом.',
+               'Заявка на отпуск отклонена.'),
+}
+
+
+class RoomWatcher(threading.Thread):
+    """Collects the messages the bot posts to the specified rooms in the
+    background.
+    """
+
+    def __init__(self, client, rooms, sender, since, poll_interval=1):
+        threading.Thread.__init__(self, daemon=True)
+
+        self._client = client
+        self._rooms = rooms
+        self._sender = sender
+        self._oldest = {room_id: since for _, room_id, _ in rooms}
+        self._poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._messages = {}
+
+    def run(self):
+        while not self._stop_event.is_set():
+            self._poll()
+            self._stop_event.wait(self._poll_interval)
+
+        # Pick up the messages which arrived during the last interval.
+        self._poll()
+
+    def stop(self):
+        """Stops watching the rooms. """
+
+        self._stop_event.set()
+        self.join()
+
+    def get_messages(self):
+        """Returns the collected messages as the (room name, time, text) tuples
+        in chronological order.
+        """
+
+        with self._lock:
+            return sorted(self._messages.values(), key=lambda item: item[1])
+
+    #
+    # Private methods
+    #
+
+    def _poll(self):
+        for name, room_id, room_type in self._rooms:
+            for message in get_all_history(self._client, room_id, room_type,
+                                           self._oldest[room_id], count=500):
+                if message['u']['username'] != self._sender:
+                    continue
+
+                ts = parse_ts(message['ts'])
+                with self._lock:
+                    self._messages[message['_id']] = (name, ts, message['msg'])
+
+                self._oldest[room_id] = max(self._oldest[room_id], ts - 1)
+
+
+class LeaveRequestGenerator:  # pylint: disable=too-many-instance-attributes
+    """Provisions the users and makes each of them request a leave in the
+    direct messages room with the bot, while the admin approves or rejects
+    the requests one after another, the way HR does.
+    """
+
+    def __init__(self, addr, admin_client, bot_name, namespace, concurrency=10,
+                 timeout=60):
+        self._addr = addr
+        self._admin_client = admin_client
+        self._bot_name = bot_name
+        self._namespace = namespace
+        self._concurrency = concurrency
+        self._timeout = timeout
+
+        self._admin = RestConversation(admin_client,
+                                       open_direct(admin_client, bot_name))
+        self._admin_engine = DialogEngine(self._admin)
+        self._admin_lock = threading.Lock()
+
+        self._start_date = self._figure_out_date(15)
+        self._end_date = self._figure_out_date(29)
+
+        self.users = []
+        self.user_ids = {}
+        self.conversations = {}
+
+    def provision(self, count):
+        """Creates the specified number of users and opens the direct messages
+        rooms with the bot on their behalf.
+        """
+
+        names = ['{}_{}'.format(self._namespace, i) for i in range(count)]
+        with ThreadPoolExecutor(max_workers=self._concurrency) as executor:
+            conversations = list(executor.map(self._provision_user, names))
+
+        self.users.extend(names)
+        self.conversations.update(zip(names, conversations))
+
+    def play(self, decisions):
+        """Makes the users request a leave concurrently and decides on the
+        requests. Returns the results of the users.
+        """
+
+        with ThreadPoolExecutor(max_workers=self._concurrency) as executor:
+            return list(executor.map(self._play_user, self.users, decisions))
+
+    def clean_up(self, results):
+        """Rejects the pending requests and deletes the users. """
+
+        for result in results:
+            if result['requested'] and result['decided_at'] is None:
+                self._decide(result['name'], 'reject')
+
+        with ThreadPoolExecutor(max_workers=self._concurrency) as executor:
+            list(executor.map(self._admin_client.users_delete,
+                              self.user_ids.values()))
+
+        self.users = []
+        self.user_ids = {}
+        self.conversations = {}
+
+    #
+    # Private methods
+    #
+
+    @staticmethod
+    def _figure_out_date(days, date_format='%d.%m'):
+        return (datetime.now() + timedelta(days=days)).strftime(date_format)
+
+    def _to_bot(self, text):
+        return '{0} {1}'.format(self._bot_name, text)
+
+    def _provision_user(self, name):
+        self.user_ids[name] = create_user(self._admin_client, name)
+
+        client = make_client(self._addr, name, name)
+        conversation = RestConversation(client,
+                                        open_direct(client, self._bot_name))
+        # hubot-happy-birthder asks the new users for the birth date first,
+        # so the answer has to be acknowledged before the leave is requested.
+        records = DialogEngine(conversation).play(
+            [Step('01.01.1990', BIRTHDAY_SAVED_MSG, self._timeout)])
+        if not is_passed(records):
+            raise RuntimeError('The bot did not acknowledge the birth date of '
+                               '{}'.format(name))
+
+        return conversation
+
+    def _decide(self, name, decision):
+        command, reply, _ = DECISIONS[decision]
+        with self._admin_lock:
+            record = self._admin_engine.play_step(
+                Step(self._to_bot(command.format(name)), reply.format(name),
+                     self._timeout))
+            return record, self._admin.last_sent_at
+
+    def _play_user(self, name, decision):
+        conversation = self.conversations[name]
+        engine = DialogEngine(conversation)
+        steps = [
+            Step(self._to_bot('хочу в отпуск'), FROM_MSG, self._timeout),
+            Step(self._to_bot(self._start_date), TO_MSG, self._timeout),
+            Step(self._to_bot(self._end_date), CONFIRMATION_RE, self._timeout),
+            Step(self._to_bot('Да, планирую'), REQUEST_SENT_MSG, self._timeout),
+        ]
+        records = engine.play(steps)
+        result = {
+            'approval': None,
+            'decided_at': None,
+            'decision': decision,
+            'name': name,
+            'notification': None,
+            'requested': len(records) == len(steps) and is_passed(records),
+            'requested_at': conversation.last_sent_at,
+            'steps': [record.latency for record in records if record.passed],
+        }
+        if not result['requested'] or decision not in DECISIONS:
+            return result
+
+        cursor = conversation.get_message_cursor()
+        record, result['decided_at'] = self._decide(name, decision)
+        if record.passed:
+            result['approval'] = record.latency
+
+        passed, _ = engine.wait_reply(cursor, DECISIONS[decision][2],
+                                      self._timeout)
+        if passed:
+            result['notification'] = time.time() - record.sent_at
+
+        return result
+
+
+def get_decisions(count, reject_ratio, pending_ratio, seed=None):
+    """Returns the decisions on the requests of the specified number of users
+    in random order.
+    """
+
+    rejected = int(count * reject_ratio)
+    pending = int(count * pending_ratio)
+    decisions = (['reject'] * rejected + ['pending'] * pending +
+                 ['approve'] * max(count - rejected - pending, 0))
+    random.Random(seed).shuffle(decisions)
+
+    return decisions
+
+
+def get_report(results, elapsed, messages, namespace, report_schedule):
+    """Turns the results of the users and the messages the bot posted to the
+    watched rooms into the report.
+    """
+
+    mention_re = compile_pattern(r'@{}_\d+\b'.format(re.escape(namespace)))
+    notifications = {'decision': [], 'request': []}
+    missed = 0
+    reports = []
+    for result in results:
+        name = re.escape(result['name'])
+        for kind, pattern, since in (
+                ('request', 'Пользователь @{} хочет в отпуск',
+                 result['requested_at']),
+                ('decision', 'Заявка на отпуск пользователя @{} была',
+                 result['decided_at'])):
+            if not result['requested'] or since is None:
+                continue
+
+            pattern = compile_pattern(pattern.format(name) + r'\b')
+            arrived = [ts for _, ts, text in messages
+                       if ts >= since and pattern.search(text)]
+            if arrived:
+                notifications[kind].append(arrived[0] - since)
+            else:
+                missed += 1
+
+    notification_re = compile_pattern('Пользователь @|Заявка на отпуск '
+                                      'пользователя @')
+    for room, ts, text in messages:
+        mentions = len(mention_re.findall(text))
+        if not mentions or notification_re.search(text):
+            continue
+
+        pending = sum(1 for result in results
+                      if result['requested'] and
+                      result['requested_at'] < ts and
+                      (result['decided_at'] is None or
+                       result['decided_at'] > ts))
+        reports.append({
+            'chars': len(text),
+            'delay': ts - report_schedule.get_previous(ts),
+            'mentions': mentions,
+            'pending': pending,
+            'room': room,
+            'ts': ts,
+        })
+
+    requested = [result for result in results if result['requested']]
+    decided = [result for result in requested if result['decided_at']]
+    return {
+        'approval': summarize([result['approval'] for result in decided
+                               if result['approval'] is not None]),
+        'channel_notifications': {
+            'decision': summarize(notifications['decision']),
+            'missed': missed,
+            'request': summarize(notifications['request']),
+        },
+        'elapsed': elapsed,
+        'failed_requests': len(results) - len(requested),
+        'missed_notifications': sum(1 for result in decided
+                                    if result['notification'] is None),
+        'notification': summarize([result['notification']
+                                   for result in decided
+                                   if result['notification'] is not None]),
+        'reports': reports,
+        'steps': summarize([latency for result in results
+                            for latency in result['steps']]),
+        'throughput': {
+            'decisions': len(decided) / elapsed,
+            'requests': len(requested) / elapsed,
+        },
+        'users': len(results),
+    }
+
+
+def main():  # pylint: disable=too-many-locals
+    """The main entry point. """
+
+    parser = ArgumentParser(description='usage: %prog [options] arguments')
+    add_common_arguments(parser)
+    parser.add_argument('--users', dest='users', type=int, default=20,
+                        help='allows specifying the number of users '
+                             'requesting a leave')
+    parser.add_argument('--concurrency', dest='concurrency', type=int,
+                        default=10,
+                        help='allows specifying the number of users talking '
+                             'to the bot at the same time')
+    parser.add_argument('--reject-ratio', dest='reject_ratio', type=float,
+                        default=0.2,
+                        help='allows specifying the share of the requests '
+                             'to be rejected')
+    parser.add_argument('--pending-ratio', dest='pending_ratio', type=float,
+                        default=0.3,
+                        help='allows specifying the share of the requests '
+                             'left pending')
+    parser.add_argument('--rooms', dest='rooms', type=str,
+                        default='leave-coordination,hr',
+                        help='allows specifying the comma-separated rooms '
+                             'the bot posts the notifications and reports to')
+    parser.add_argument('--report-scheduler', dest='report_scheduler',
+                        type=str, default='*/1 * * * *',
+                        help='allows specifying VIVA_REPORT_SCHEDULER')
+    parser.add_argument('--report-ticks', dest='report_ticks', type=int,
+                        default=2,
+                        help='allows specifying the number of reports to wait '
+                             'for after all the requests are sent')
+    add_utc_offset_argument(parser)
+    parser.add_argument('--bot-name', dest='bot_name', type=str,
+                        default='meeseeks',
+                        help='allows specifying the bot name')
+    parser.add_argument('--seed', dest='seed', type=int,
+                        help='allows specifying the seed the decisions are '
+                             'shuffled with')
+    options = parser.parse_args()
+
+    check_common_arguments(parser, options)
+
+    try:
+        report_schedule = CronSchedule(options.report_scheduler,
+                                       get_utc_offset(options))
+    except ValueError as exc:
+        parser.error(str(exc))
+
+    namespace = get_namespace('leave')
+    client = make_client(options.host, options.username, options.password)
+    rooms = [(name, ) + find_room(client, name)
+             for name in options.rooms.split(',')]
+    generator = LeaveRequestGenerator(options.host, client, options.bot_name,
+                                      namespace,
+                                      concurrency=options.concurrency)
+    results = []
+    try:
+        sys.stderr.write('Provisioning {} users\n'.format(options.users))
+        generator.provision(options.users)
+
+        watcher = RoomWatcher(client, rooms, options.bot_name, time.time())
+        watcher.start()
+
+        start_time = time.time()
+        results = generator.play(get_decisions(
+            options.users, options.reject_ratio, options.pending_ratio,
+            seed=options.seed))
+        elapsed = time.time() - start_time
+
+        # Give the report scheduler a chance to report on the pending requests.
+        report_time = time.time()
+        for _ in range(options.report_ticks):
+            report_time = report_schedule.get_next(report_time)
+        time.sleep(max(report_time - time.time(), 0) + REPORT_GRACE)
+        watcher.stop()
+    finally:
+        generator.clean_up(results)
+
+    write_report(get_report(results, elapsed, watcher.get_messages(),
+                            namespace, report_schedule),
+                 options.output)
+
+
+if __name__ == '__main__':
+    main()
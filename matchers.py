@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module with the matchers checking messages against expectations. """
+
+import collections
+import difflib
+import functools
+import re
+
+# The outcome of matching a batch of messages: if the expectation is met, the
+# index of the (last) matched message in the batch, and the message which is
+# the closest to the expectation along with the similarity (from 0 to 1) if
+# the expectation is not met.
+MatchResult = collections.namedtuple(
+    'MatchResult', 'passed index closest similarity')
+
+
+@functools.lru_cache(maxsize=None)
+def compile_pattern(pattern):
+    """Compiles the specified regular expression once and caches it. """
+
+    return re.compile(pattern)
+
+
+class Matcher:
+    """Base class for the matchers. A matcher checks if at least one message
+    in the batch meets the expectation.
+    """
+
+    def matches(self, text):
+        """Checks if the specified text meets the expectation. """
+
+        raise NotImplementedError
+
+    def similarity(self, text):
+        """Returns how close the specified text is to the expectation. """
+
+        raise NotImplementedError
+
+    def match(self, messages):
+        """Matches the specified batch of messages in one pass. """
+
+        for i in range(len(messages) - 1, -1, -1):
+            if self.matches(messages[i]):
+                return MatchResult(True, i, None, 1.0)
+
+        return self._closest(messages)
+
+    def _closest(self, messages):
+        if not messages:
+            return MatchResult(False, None, None, 0.0)
+
+        closest = max(messages, key=self.similarity)
+        return MatchResult(False, None, closest, self.similarity(closest))
+
+
+class Exact(Matcher):
+    """Expects a message equal to the specified text. """
+
+    def __init__(self, text):
+        self.text = text
+
+    def __repr__(self):
+        return 'Exact({!r})'.format(self.text)
+
+    def matches(self, text):
+        return text == self.text
+
+    def similarity(self, text):
+        return difflib.SequenceMatcher(None, self.text, text).ratio()
+
+
+class Regex(Matcher):
+    """Expects a message matching the specified regular expression (either a
+    string or a compiled one) from its beginning.
+    """
+
+    def __init__(self, pattern):
+        if isinstance(pattern, str):
+            pattern = compile_pattern(pattern)
+
+        self.pattern = pattern
+
+    def __repr__(self):
+        return 'Regex({!r})'.format(self.pattern.pattern)
+
+    def matches(self, text):
+        return bool(self.pattern.match(text))
+
+    def similarity(self, text):
+        return difflib.SequenceMatcher(None, self.pattern.pattern,
+                                       text).ratio()
+
+
+class Latest(Matcher):
+    """Expects the specified number of the latest messages in the batch to
+    meet the expectation of the specified matcher.
+    """
+
+    def __init__(self, matcher, count=1):
+        self.matcher = matcher
+        self.count = count
+
+    def __repr__(self):
+        return 'Latest({!r}, {})'.format(self.matcher, self.count)
+
+    def matches(self, text):
+        return self.matcher.matches(text)
+
+    def similarity(self, text):
+        return self.matcher.similarity(text)
+
+    def match(self, messages):
+        latest = messages[-self.count:]
+        if len(latest) == self.count and all(map(self.matches, latest)):
+            return MatchResult(True, len(messages) - 1, None, 1.0)
+
+        mismatched = [text for text in latest if not self.matches(text)]
+        return self._closest(mismatched)
+
+
+def as_matcher(expected, match=False):
+    """Turns the specified expectation into a matcher. The expectation may be
+    a matcher, a compiled regular expression or a string which is treated
+    either as a regular expression (if match is True) or as the exact text.
+    """
+
+    if isinstance(expected, Matcher):
+        return expected
+
+    if match or hasattr(expected, 'match'):
+        return Regex(expected)
+
+    return Exact(expected)
+
+
+def describe(result):
+    """Describes the specified result of matching for the diagnostics. """
+
+    if result.passed:
+        return 'matched message #{}'.format(result.index)
+
+    if result.closest is None:
+        return 'no messages to match'
+
+    return 'closest message ({:.0%} similar): {!r}'.format(result.similarity,
+                                                          result.closest)
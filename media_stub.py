@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module with the local server standing in for the media hosts (such as the
+ones serving the pugs and the tenor GIFs), so that the tests don't depend on
+the internet.
+"""
+
+import ssl
+import sys
+import threading
+import time
+from argparse import ArgumentParser
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+DEFAULT_MEDIA_HOSTS = ('*.tumblr.com', '*.tenor.com', '*.giphy.com')
+
+# 1x1 transparent GIF.
+PIXEL_GIF = (b'GIF89a\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\xff\xff\xff!'
+             b'\xf9\x04\x01\x00\x00\x00\x00,\x00\x00\x00\x00\x01\x00\x01\x00'
+             b'\x00\x02\x02D\x01\x00;')
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class _MediaHandler(BaseHTTPRequestHandler):
+    def do_GET(self):  # pylint: disable=invalid-name
+        """Responds to any request with the GIF. """
+
+        if self.server.delay:
+            time.sleep(self.server.delay)
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/gif')
+        self.send_header('Content-Length', str(len(PIXEL_GIF)))
+        # Allow Resource Timing to expose the detailed timings.
+        self.send_header('Timing-Allow-Origin', '*')
+        self.send_header('Cache-Control', 'no-store')
+        self.end_headers()
+        self.wfile.write(PIXEL_GIF)
+
+    def do_HEAD(self):  # pylint: disable=invalid-name
+        """Responds to HEAD requests the bots and Rocket.Chat send to check the
+        media.
+        """
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/gif')
+        self.send_header('Content-Length', str(len(PIXEL_GIF)))
+        self.end_headers()
+
+    def log_message(self, *args):  # pylint: disable=arguments-differ
+        pass
+
+
+class MediaStubServer:
+    """Serves a tiny GIF in response to any request in a background thread.
+    If the PEM file with the certificate and the key is specified, the server
+    speaks HTTPS.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, certfile=None, delay=0):
+        self._httpd = _ThreadingHTTPServer((host, port), _MediaHandler)
+        self._httpd.delay = delay
+        if certfile:
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            context.load_cert_chain(certfile)
+            self._httpd.socket = context.wrap_socket(self._httpd.socket,
+                                                     server_side=True)
+
+        self._thread = threading.Thread(target=self._httpd.serve_forever,
+                                        daemon=True)
+
+    @property
+    def address(self):
+        """Returns the host and the port the server listens on. """
+
+        host, port = self._httpd.server_address[:2]
+        return host, port
+
+    def get_host_resolver_rules(self, hosts=DEFAULT_MEDIA_HOSTS):
+        """Returns the value of the --host-resolver-rules option of Chrome
+        making the specified hosts resolve to the server.
+        """
+
+        host, port = self.address
+        return ', '.join('MAP {} {}:{}'.format(pattern, host, port)
+                         for pattern in hosts)
+
+    def start(self):
+        """Starts serving. """
+
+        self._thread.start()
+
+    def stop(self):
+        """Stops serving. """
+
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+def main():
+    """The main entry point. """
+
+    parser = ArgumentParser(description='usage: %prog [options] arguments')
+    parser.add_argument('--host', dest='host', type=str, default='127.0.0.1',
+                        help='allows specifying the address to listen on')
+    parser.add_argument('--port', dest='port', type=int, default=8080,
+                        help='allows specifying the port to listen on')
+    parser.add_argument('--certfile', dest='certfile', type=str,
+                        help='allows specifying the PEM file with the '
+                             'certificate and the key to serve HTTPS')
+    parser.add_argument('--delay', dest='delay', type=float, default=0,
+                        help='allows specifying how long every response is '
+                             'delayed (secs)')
+    options = parser.parse_args()
+
+    server = MediaStubServer(options.host, options.port,
+                             certfile=options.certfile, delay=options.delay)
+    server.start()
+    sys.stderr.write('Serving on {}:{}\n'.format(*server.address))
+    sys.stderr.write('--host-resolver-rules="{}"\n'.format(
+        server.get_host_resolver_rules()))
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
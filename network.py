@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module with the recorder of the network traffic of the browser based on
+the Chrome performance log.
+"""
+
+import json
+import os
+
+# The XHR and websocket events of the Network domain the recorder is
+# interested in.
+NETWORK_EVENTS = (
+    'Network.loadingFailed',
+    'Network.loadingFinished',
+    'Network.requestWillBeSent',
+    'Network.responseReceived',
+    'Network.webSocketFrameReceived',
+    'Network.webSocketFrameSent',
+)
+
+XHR_TYPES = ('XHR', 'Fetch')
+
+OUTSIDE_ACTIONS = '(outside actions)'
+
+
+def parse_ddp_frame(payload):
+    """Returns the types of the DDP messages in the SockJS frame. The method
+    calls are reported as 'method:<name>'.
+    """
+
+    # The frames the server sends are prefixed with the frame type.
+    if payload.startswith('a'):
+        payload = payload[1:]
+
+    try:
+        messages = [json.loads(message) for message in json.loads(payload)]
+    except (TypeError, ValueError):
+        return []
+
+    types = []
+    for message in messages:
+        if not isinstance(message, dict) or 'msg' not in message:
+            continue
+
+        if message['msg'] == 'method':
+            types.append('method:{}'.format(message.get('method')))
+        else:
+            types.append(message['msg'])
+
+    return types
+
+
+def enable_performance_log(options, capabilities, network=True,
+                           trace_categories=None):
+    """Makes Chrome, which is created with the specified options and
+    capabilities, write the Network domain events and/or the trace events of
+    the specified categories to the performance log.
+    """
+
+    prefs = {'enableNetwork': network, 'enablePage': False}
+    if trace_categories:
+        prefs['traceCategories'] = trace_categories
+
+    options.add_experimental_option('perfLoggingPrefs', prefs)
+    # Older versions of ChromeDriver know only the key without the prefix.
+    for key in ('goog:loggingPrefs', 'loggingPrefs'):
+        capabilities[key] = {'performance': 'ALL'}
+
+
+class NetworkRecorder:
+    """Turns the performance log of the browser into the compact per-test
+    files, which contain every XHR and websocket frame along with the number
+    of bytes and round trips per action.
+    """
+
+    def __init__(self, directory, suite):
+        self._directory = directory
+        self._suite = suite
+
+        os.makedirs(directory, exist_ok=True)
+
+    def finish(self, test_case, actions, entries):
+        """Writes the events from the entries of the performance log
+        collected during the test case to the file and returns its name. The
+        events are attributed to the outermost of the specified (name, start,
+        end) actions they occurred in.
+        """
+
+        events = self._collect_events(entries)
+        steps = {}
+        for event in events:
+            step = self._attribute(event[0], actions)
+            event.insert(2, step)
+            self._account(steps.setdefault(step, self._new_step()), event)
+
+        path = os.path.join(self._directory, '{}.{}.json'.format(self._suite,
+                                                                 test_case))
+        with open(path, 'w') as outfile:
+            json.dump({
+                'columns': ['ts', 'kind', 'step', 'bytes', 'detail'],
+                'events': events,
+                'steps': steps,
+                'test_case': test_case,
+            }, outfile, separators=(',', ':'), sort_keys=True)
+
+        return path
+
+    #
+    # Private methods
+    #
+
+    @staticmethod
+    def _attribute(ts, actions):
+        containing = [action for action in actions
+                      if action[1] <= ts <= action[2]]
+        if not containing:
+            return OUTSIDE_ACTIONS
+
+        return min(containing, key=lambda action: action[1])[0]
+
+    @staticmethod
+    def _new_step():
+        return {
+            'ddp_methods': {},
+            'http_bytes': 0,
+            'http_requests': 0,
+            'round_trips': 0,
+            'ws_bytes_received': 0,
+            'ws_bytes_sent': 0,
+            'ws_frames_received': 0,
+            'ws_frames_sent': 0,
+        }
+
+    @staticmethod
+    def _account(step, event):
+        _, kind, _, size, detail = event
+        if kind == 'http':
+            step['http_requests'] += 1
+            step['http_bytes'] += size
+            step['round_trips'] += 1
+        elif kind == 'ws-sent':
+            step['ws_frames_sent'] += 1
+            step['ws_bytes_sent'] += size
+            for message in detail.split(','):
+                if message.startswith('method:'):
+                    method = message[len('method:'):]
+                    step['ddp_methods'][method] = \
+                        step['ddp_methods'].get(method, 0) + 1
+                    step['round_trips'] += 1
+        elif kind == 'ws-received':
+            step['ws_frames_received'] += 1
+            step['ws_bytes_received'] += size
+
+    @staticmethod
+    def _collect_events(entries):
+        """Returns the [time, kind, bytes, detail] lists of the XHRs (reported
+        when they are finished) and the websocket frames.
+        """
+
+        requests = {}
+        events = []
+        for entry in entries:
+            message = json.loads(entry['message'])['message']
+            method = message['method']
+            if method not in NETWORK_EVENTS:
+                continue
+
+            params = message['params']
+            ts = entry['timestamp'] / 1000
+            if method == 'Network.requestWillBeSent':
+                if params.get('type') in XHR_TYPES:
+                    requests[params['requestId']] = {
+                        'method': params['request']['method'],
+                        'start': ts,
+                        'status': None,
+                        'url': params['request']['url'],
+                    }
+            elif method == 'Network.responseReceived':
+                if params['requestId'] in requests:
+                    requests[params['requestId']]['status'] = \
+                        params['response']['status']
+            elif method in ('Network.loadingFinished',
+                            'Network.loadingFailed'):
+                request = requests.pop(params['requestId'], None)
+                if request:
+                    events.append([
+                        request['start'], 'http',
+                        int(params.get('encodedDataLength', 0)),
+                        '{} {} {} {:.0f}ms'.format(
+                            request['method'], request['url'],
+                            request['status'] or 'failed',
+                            (ts - request['start']) * 1000),
+                    ])
+            else:
+                payload = params['response'].get('payloadData', '')
+                kind = ('ws-sent' if method == 'Network.webSocketFrameSent'
+                        else 'ws-received')
+                events.append([ts, kind, len(payload.encode('utf8')),
+                               ','.join(parse_ddp_frame(payload))])
+
+        return sorted(events, key=lambda event: event[0])
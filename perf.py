@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module with the recorder of the client-side performance of the UI
+actions.
+"""
+
+import contextlib
+import fcntl
+import functools
+import json
+import os
+import time
+
+from selenium.common.exceptions import WebDriverException
+
+from benchmark import summarize
+
+# Installs the observer of the long tasks once per page and returns the state
+# of the page along with the long tasks observed since the previous call.
+PERF_SNAPSHOT_JS = """
+if (!window.__perfProbe) {
+    window.__perfProbe = {longTasks: []};
+    try {
+        new PerformanceObserver(function (list) {
+            list.getEntries().forEach(function (entry) {
+                window.__perfProbe.longTasks.push(entry.duration);
+            });
+        }).observe({entryTypes: ['longtask']});
+    } catch (e) {
+        // The long tasks API is not supported.
+    }
+}
+var memory = performance.memory || {};
+return {
+    heap: memory.usedJSHeapSize || null,
+    longTasks: window.__perfProbe.longTasks.splice(0),
+    nodes: document.getElementsByTagName('*').length
+};
+"""
+
+# Waits for the next frame to be produced, i.e. for the browser to finish the
+# style, layout and paint work caused by the action.
+NEXT_FRAME_JS = """
+var done = arguments[arguments.length - 1];
+var start = performance.now();
+requestAnimationFrame(function () {
+    setTimeout(function () {
+        done(performance.now() - start);
+    }, 0);
+});
+"""
+
+# The metrics reported by the Performance domain of the Chrome DevTools
+# protocol which are accumulated over the life of the page.
+CDP_METRICS = {
+    'LayoutCount': 'layout_count',
+    'LayoutDuration': 'layout_duration',
+    'RecalcStyleCount': 'recalc_style_count',
+    'RecalcStyleDuration': 'recalc_style_duration',
+    'ScriptDuration': 'script_duration',
+    'TaskDuration': 'task_duration',
+}
+
+
+class ClientPerfRecorder:
+    """Records the performance of the browser during the UI actions: the long
+    tasks, the style, layout and script work (if the Chrome DevTools protocol
+    is available), the time to the next frame, the JS heap and the number of
+    DOM nodes. Nested actions are accounted to the outermost one.
+    """
+
+    def __init__(self, driver, version, suite, enabled=True):
+        self._driver = driver
+        self._version = version
+        self._suite = suite
+        self._depth = 0
+        self._cdp = None
+
+        self.enabled = enabled
+        self.records = []
+
+        if enabled:
+            # The time to the next frame is measured by an async script.
+            self._driver.set_script_timeout(10)
+
+    @contextlib.contextmanager
+    def action(self, name):
+        """Context manager recording the performance of the action performed
+        inside it.
+        """
+
+        if not self.enabled or self._depth:
+            self._depth += 1
+            try:
+                yield
+            finally:
+                self._depth -= 1
+            return
+
+        self._depth += 1
+        try:
+            before = self._snapshot()
+            start_time = time.time()
+            yield
+            duration = time.time() - start_time
+            frame = self._driver.execute_async_script(NEXT_FRAME_JS)
+            after = self._snapshot()
+        finally:
+            self._depth -= 1
+
+        record = {
+            'action': name,
+            'dom_nodes': after['nodes'],
+            'dom_nodes_delta': after['nodes'] - before['nodes'],
+            'duration': duration,
+            'heap': after['heap'],
+            'heap_delta': (after['heap'] - before['heap']
+                           if after['heap'] and before['heap'] else None),
+            'long_task_time': sum(after['longTasks']) / 1000,
+            'long_tasks': len(after['longTasks']),
+            'next_frame': frame / 1000,
+        }
+        for metric, value in after['cdp'].items():
+            if metric in before['cdp']:
+                record[metric] = value - before['cdp'][metric]
+
+        self.records.append(record)
+
+    def get_summary(self):
+        """Returns the summary statistics of every metric per action. """
+
+        actions = {}
+        for record in self.records:
+            actions.setdefault(record['action'], []).append(record)
+
+        summary = {}
+        for action, records in actions.items():
+            metrics = {metric for record in records for metric in record}
+            metrics.discard('action')
+            summary[action] = {
+                metric: summarize([record[metric] for record in records
+                                   if isinstance(record.get(metric),
+                                                 (int, float))])
+                for metric in metrics
+            }
+
+        return summary
+
+    def export(self, path):
+        """Merges the summary into the specified JSON file, which keeps the
+        summaries per Rocket.Chat version and per suite. The suites run in
+        parallel (see sharding.py) take turns holding the lock, and the file
+        is replaced at once, so none of the summaries are lost.
+        """
+
+        with open(path + '.lock', 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+
+            report = {}
+            if os.path.isfile(path):
+                with open(path) as infile:
+                    report = json.load(infile)
+
+            report.setdefault(self._version, {})[self._suite] = \
+                self.get_summary()
+            tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+            with open(tmp_path, 'w') as outfile:
+                json.dump(report, outfile, indent=2, sort_keys=True)
+
+            os.replace(tmp_path, path)
+
+    #
+    # Private methods
+    #
+
+    def _get_cdp_metrics(self):
+        if self._cdp is None:
+            try:
+                self._driver.execute_cdp_cmd('Performance.enable', {})
+                self._cdp = True
+            except (AttributeError, WebDriverException):
+                self._cdp = False
+
+        if not self._cdp:
+            return {}
+
+        metrics = self._driver.execute_cdp_cmd('Performance.getMetrics', {})
+        return {metric['name']: metric['value']
+                for metric in metrics['metrics']
+                if metric['name'] in CDP_METRICS}
+
+    def _snapshot(self):
+        snapshot = self._driver.execute_script(PERF_SNAPSHOT_JS)
+        snapshot['cdp'] = {CDP_METRICS[name]: value for name, value
+                           in self._get_cdp_metrics().items()}
+        return snapshot
+
+
+def ui_action(name):
+    """Decorator marking the method of a test case as the UI action with the
+    specified name (see RocketChatTestCase.action).
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            with self.action(name):
+                return func(self, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
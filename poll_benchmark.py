@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Benchmark measuring how the hubot-vote-or-die polls and Rocket.Chat cope
+with many users voting at the same time.
+"""
+
+import random
+import sys
+import time
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmark import (add_common_arguments, check_common_arguments,
+                       get_namespace, summarize, write_report)
+from rest import (create_user, find_room, iter_messages, make_client,
+                  post_message)
+
+POLL_HEADER = '_Please vote using reactions_'
+
+MAX_OPTIONS = 12
+
+
+class PollBenchmark:  # pylint: disable=too-many-instance-attributes
+    """Creates a poll and makes the provisioned users vote for random options
+    via the REST API at the same time, then polls the message API until the
+    reaction counts converge.
+    """
+
+    def __init__(self, addr, admin_client, room_id, room_type, bot_name,
+                 namespace, concurrency=20, timeout=120, poll_interval=0.5,
+                 seed=None):
+        self._addr = addr
+        self._admin_client = admin_client
+        self._room_id = room_id
+        self._room_type = room_type
+        self._bot_name = bot_name
+        self._namespace = namespace
+        self._concurrency = concurrency
+        self._timeout = timeout
+        self._poll_interval = poll_interval
+        self._random = random.Random(seed)
+
+        self.clients = {}
+        self.user_ids = {}
+
+    def provision(self, count):
+        """Creates the specified number of users and logs in on their
+        behalf.
+        """
+
+        names = ['{}_{}'.format(self._namespace, i) for i in range(count)]
+        with ThreadPoolExecutor(max_workers=self._concurrency) as executor:
+            list(executor.map(self._provision_user, names))
+
+    def create_poll(self, options_number):
+        """Asks the bot to create a poll with the specified number of options
+        and waits until the bot adds the reactions for all of them. Returns the
+        ID of the poll message and the emojis of the options.
+        """
+
+        options = ', '.join('option {}'.format(i + 1)
+                            for i in range(options_number))
+        _, sent_at = post_message(self._admin_client, self._room_id,
+                                  '!poll {}?, {}'.format(self._namespace,
+                                                         options))
+
+        for message in iter_messages(self._admin_client, self._room_id,
+                                     self._room_type, sent_at,
+                                     sender=self._bot_name,
+                                     timeout=self._timeout):
+            if message['msg'].startswith(POLL_HEADER):
+                break
+        else:
+            raise RuntimeError('The bot did not create the poll')
+
+        finish = time.time() + self._timeout
+        while time.time() < finish:
+            reactions = self._get_reactions(message['_id'])
+            if len(reactions) >= options_number:
+                return message['_id'], sorted(reactions)
+
+            time.sleep(self._poll_interval)
+
+        raise RuntimeError('The bot did not add the reactions to the poll')
+
+    def vote(self, msg_id, emojis):
+        """Makes every user react to the poll with a random option at the same
+        time and waits until the counts converge. Returns the report.
+        """
+
+        baseline = self._get_reactions(msg_id)
+        votes = {name: self._random.choice(emojis) for name in self.clients}
+
+        start_time = time.time()
+        with ThreadPoolExecutor(max_workers=self._concurrency) as executor:
+            responses = list(executor.map(self._react, votes.items(),
+                                          [msg_id] * len(votes)))
+        sent_time = time.time()
+
+        expected = {emoji: set(usernames)
+                    for emoji, usernames in baseline.items()}
+        for name, emoji in votes.items():
+            expected.setdefault(emoji, set()).add(name)
+
+        converged_at = None
+        reactions = baseline
+        while time.time() - sent_time < self._timeout:
+            reactions = self._get_reactions(msg_id)
+            if reactions == expected:
+                converged_at = time.time()
+                break
+
+            time.sleep(self._poll_interval)
+
+        lost = sum(len(usernames - reactions.get(emoji, set()))
+                   for emoji, usernames in expected.items())
+        return {
+            'convergence': (converged_at - start_time
+                            if converged_at else None),
+            'convergence_after_last_vote': (converged_at - sent_time
+                                            if converged_at else None),
+            'counts': {emoji: len(usernames)
+                       for emoji, usernames in reactions.items()},
+            'failed_requests': sum(1 for _, success in responses
+                                   if not success),
+            'lost_reactions': lost,
+            'react': summarize([latency for latency, _ in responses]),
+            'votes': len(votes),
+        }
+
+    def clean_up(self, msg_id=None):
+        """Deletes the poll and the users. """
+
+        if msg_id:
+            self._admin_client.chat_delete(self._room_id, msg_id)
+
+        with ThreadPoolExecutor(max_workers=self._concurrency) as executor:
+            list(executor.map(self._admin_client.users_delete,
+                              self.user_ids.values()))
+
+        self.clients = {}
+        self.user_ids = {}
+
+    #
+    # Private methods
+    #
+
+    def _provision_user(self, name):
+        self.user_ids[name] = create_user(self._admin_client, name)
+        self.clients[name] = make_client(self._addr, name, name)
+
+    def _get_reactions(self, msg_id):
+        message = self._admin_client.chat_get_message(msg_id).json()['message']
+
+        return {emoji: set(reaction['usernames'])
+                for emoji, reaction in message.get('reactions', {}).items()}
+
+    def _react(self, vote, msg_id):
+        name, emoji = vote
+        start_time = time.time()
+        response = self.clients[name].chat_react(msg_id, emoji=emoji)
+
+        return time.time() - start_time, response.json().get('success', False)
+
+
+def main():
+    """The main entry point. """
+
+    parser = ArgumentParser(description='usage: %prog [options] arguments')
+    add_common_arguments(parser)
+    parser.add_argument('--users', dest='users', type=int, default=50,
+                        help='allows specifying the number of voting users')
+    parser.add_argument('--options', dest='options', type=int,
+                        default=MAX_OPTIONS,
+                        help='allows specifying the number of poll options '
+                             '(from 2 to {})'.format(MAX_OPTIONS))
+    parser.add_argument('--concurrency', dest='concurrency', type=int,
+                        default=20,
+                        help='allows specifying the number of users voting '
+                             'at the same time')
+    parser.add_argument('--room', dest='room', type=str, default='general',
+                        help='allows specifying the room the poll is '
+                             'created in')
+    parser.add_argument('--bot-name', dest='bot_name', type=str,
+                        default='meeseeks',
+                        help='allows specifying the bot name')
+    parser.add_argument('--seed', dest='seed', type=int,
+                        help='allows specifying the seed the votes are '
+                             'generated with')
+    options = parser.parse_args()
+
+    check_common_arguments(parser, options)
+
+    if not 2 <= options.options <= MAX_OPTIONS:
+        parser.error('The number of options must be from 2 to {}'.format(
+            MAX_OPTIONS))
+
+    client = make_client(options.host, options.username, options.password)
+    room_id, room_type = find_room(client, options.room)
+    benchmark = PollBenchmark(options.host, client, room_id, room_type,
+                              options.bot_name, get_namespace('poll'),
+                              concurrency=options.concurrency,
+                              seed=options.seed)
+    msg_id = None
+    try:
+        sys.stderr.write('Provisioning {} users\n'.format(options.users))
+        benchmark.provision(options.users)
+        msg_id, emojis = benchmark.create_poll(options.options)
+        report = benchmark.vote(msg_id, emojis)
+    finally:
+        benchmark.clean_up(msg_id)
+
+    write_report(report, options.output)
+
+    sys.exit(1 if report['lost_reactions'] else 0)
+
+
+if __name__ == '__main__':
+    main()
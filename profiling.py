@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module with the profilers of the test cases. """
+
+import collections
+import contextlib
+import cProfile
+import os
+import pstats
+import re
+import sys
+import threading
+
+PROFILERS = ('sampling', 'cprofile')
+
+
+def collapse(frame):
+    """Returns the stack of the specified frame in the collapsed format (the
+    frames from the outermost to the innermost separated by semicolons).
+    """
+
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append('{} ({}:{})'.format(code.co_name,
+                                         os.path.basename(code.co_filename),
+                                         code.co_firstlineno))
+        frame = frame.f_back
+
+    return ';'.join(reversed(names))
+
+
+class StackSampler:
+    """Samples the stack of the thread which created the sampler at the
+    specified interval (secs) in a background thread. Unlike cProfile, it
+    sees the time the thread spends blocked, e.g. on WebDriver calls.
+    """
+
+    def __init__(self, interval=0.005):
+        self._interval = interval
+        self._thread_id = threading.get_ident()
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+        self.stacks = collections.Counter()
+
+    def start(self):
+        """Starts sampling. """
+
+        self._thread.start()
+
+    def stop(self):
+        """Stops sampling. """
+
+        self._stop_event.set()
+        self._thread.join()
+
+    #
+    # Private methods
+    #
+
+    def _sample(self):
+        while not self._stop_event.wait(self._interval):
+            frame = sys._current_frames().get(self._thread_id)  # pylint: disable=protected-access
+            if frame is not None:
+                self.stacks[collapse(frame)] += 1
+
+
+class TestProfiler:
+    """Profiles the test cases the names of which match the specified regular
+    expression, writing one profile per test case and the merged one at the
+    end. The sampling profiler writes the stacks in the collapsed format
+    understood by flamegraph.pl and speedscope, while cProfile writes the
+    pstats files.
+    """
+
+    def __init__(self, directory, suite, profiler='sampling', pattern=None):
+        assert profiler in PROFILERS
+
+        self._directory = directory
+        self._suite = suite
+        self._profiler = profiler
+        self._pattern = re.compile(pattern) if pattern else None
+        # The profiles of the repeated test cases accumulate all the attempts.
+        self._stats = collections.OrderedDict()
+        self._test_stacks = collections.OrderedDict()
+
+        os.makedirs(directory, exist_ok=True)
+
+    def is_wanted(self, test_case):
+        """Checks if the specified test case has to be profiled. """
+
+        return self._pattern is None or bool(self._pattern.search(test_case))
+
+    @contextlib.contextmanager
+    def profile(self, test_case):
+        """Context manager profiling the code inside it as the specified test
+        case.
+        """
+
+        if not self.is_wanted(test_case):
+            yield
+            return
+
+        if self._profiler == 'cprofile':
+            profile = cProfile.Profile()
+            profile.enable()
+            try:
+                yield
+            finally:
+                profile.disable()
+                profile.create_stats()
+                if test_case in self._stats:
+                    self._stats[test_case].add(profile)
+                else:
+                    self._stats[test_case] = pstats.Stats(profile)
+                self._stats[test_case].dump_stats(
+                    self._get_path(test_case, 'prof'))
+        else:
+            sampler = StackSampler()
+            sampler.start()
+            try:
+                yield
+            finally:
+                sampler.stop()
+                stacks = self._test_stacks.setdefault(test_case,
+                                                      collections.Counter())
+                stacks.update(sampler.stacks)
+                self._write_stacks(self._get_path(test_case, 'collapsed'),
+                                   stacks)
+
+    def finish(self):
+        """Writes the merged profile. Returns its name or None if nothing was
+        profiled.
+        """
+
+        if not self._stats and not self._test_stacks:
+            return None
+
+        if self._profiler == 'cprofile':
+            path = self._get_path('merged', 'prof')
+            merged = pstats.Stats()
+            for stats in self._stats.values():
+                merged.add(stats)
+            merged.dump_stats(path)
+        else:
+            path = self._get_path('merged', 'collapsed')
+            merged = collections.Counter()
+            for stacks in self._test_stacks.values():
+                merged.update(stacks)
+            self._write_stacks(path, merged)
+
+        return path
+
+    #
+    # Private methods
+    #
+
+    def _get_path(self, name, extension):
+        return os.path.join(self._directory, '{}.{}.{}'.format(
+            self._suite, name, extension))
+
+    @staticmethod
+    def _write_stacks(path, stacks):
+        with open(path, 'w') as outfile:
+            for stack, count in sorted(stacks.items()):
+                outfile.write('{} {}\n'.format(stack, count))
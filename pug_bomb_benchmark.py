@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Benchmark measuring how fast the bursts of pugs sent by the hubot-pugme
+script are delivered to and rendered by the browser.
+"""
+
+import sys
+import time
+from argparse import ArgumentParser
+
+from base import (
+    RocketChatTestCase,
+    add_harness_arguments,
+    deadline,
+    get_harness_kwargs
+)
+from benchmark import write_report
+from matchers import compile_pattern
+
+CLEAR_RESOURCE_TIMINGS_JS = """
+performance.clearResourceTimings();
+performance.setResourceTimingBufferSize(10000);
+"""
+
+# Returns the time (in ms since the epoch) the resources with the specified
+# URLs finished loading.
+RESOURCE_TIMING_JS = """
+var urls = arguments[0];
+return performance.getEntriesByType('resource').filter(function (entry) {
+    return urls.indexOf(entry.name) !== -1;
+}).map(function (entry) {
+    return {name: entry.name, end: performance.timeOrigin + entry.responseEnd};
+});
+"""
+
+URL_RE = compile_pattern(r'https?://[^\s<>"]+')
+
+
+class PugBombBenchmark(RocketChatTestCase):
+    """Sends pug bombs of growing sizes and measures the time to the first
+    pug, the time until all the pugs are delivered and the time until all the
+    images are loaded. Run it with --media-stub to serve the images locally.
+    """
+
+    default_message_transport = 'rest'
+
+    def __init__(self, addr, username, password, sizes, pugs_limit, timeout=120,  # pylint: disable=too-many-arguments
+                 **kwargs):
+        RocketChatTestCase.__init__(self, addr, username, password, **kwargs)
+
+        self.schedule_pre_test_case('choose_general_channel')
+
+        self._bot_name = 'meeseeks'
+        self._sizes = sizes
+        self._pugs_limit = pugs_limit
+        self._timeout = timeout
+
+        self.results = []
+
+    #
+    # Private methods
+    #
+
+    def _get_delivered_urls(self, cursor):
+        return [url for text in self.get_messages_since(cursor)
+                for url in URL_RE.findall(text)]
+
+    def _measure_burst(self, size):
+        expected = min(size, self._pugs_limit)
+        self.browser.driver.execute_script(CLEAR_RESOURCE_TIMINGS_JS)
+        cursor = self.get_message_cursor()
+
+        start_time = time.time()
+        finish = start_time + self._timeout
+        self.send_message('{} pug bomb {}'.format(self._bot_name, size))
+
+        first_message = all_messages = None
+        urls = []
+        while time.time() < finish:
+            urls = self._get_delivered_urls(cursor)
+            if urls and first_message is None:
+                first_message = time.time() - start_time
+
+            if len(urls) >= expected:
+                all_messages = time.time() - start_time
+                break
+
+            time.sleep(0.1)
+
+        entries = []
+        loaded = set()
+        while urls and time.time() < finish:
+            entries = self.browser.driver.execute_script(RESOURCE_TIMING_JS,
+                                                         urls)
+            loaded = {entry['name'] for entry in entries}
+            if len(loaded) >= len(set(urls)):
+                break
+
+            time.sleep(0.2)
+
+        all_images = None
+        if urls and len(loaded) >= len(set(urls)):
+            all_images = (max(entry['end'] for entry in entries) / 1000 -
+                          start_time)
+
+        return {
+            'all_images': all_images,
+            'all_messages': all_messages,
+            'delivered': len(urls),
+            'expected': expected,
+            'first_message': first_message,
+            'images_loaded': len(loaded),
+            'size': size,
+        }
+
+    #
+    # Public methods
+    #
+
+    @deadline(1800)
+    def test_pug_bomb_bursts(self):
+        """Measures the pug bombs of all the specified sizes. """
+
+        for size in self._sizes:
+            result = self._measure_burst(size)
+            print('pug bomb {size}: {delivered}/{expected} pugs, first in '
+                  '{first_message}s, all in {all_messages}s, images loaded in '
+                  '{all_images}s'.format(**result))
+            self.results.append(result)
+
+        assert all(result['delivered'] >= result['expected']
+                   for result in self.results)
+
+
+def main():
+    """The main entry point. """
+
+    parser = ArgumentParser(description='usage: %prog [options] arguments')
+    parser.add_argument('-a', '--host', dest='host', type=str,
+                        default='http://127.0.0.1:8006',
+                        help='allows specifying domain or IP of the Rocket.Chat host')
+    parser.add_argument('-u', '--username', dest='username', type=str,
+                        help='allows specifying admin username')
+    parser.add_argument('-p', '--password', dest='password', type=str,
+                        help='allows specifying admin password')
+    parser.add_argument('-l', '--pugs_limit', dest='pugs_limit', type=int,
+                        default=5,
+                        help='allows specifying limit for pugs')
+    parser.add_argument('--sizes', dest='sizes', type=str, default='1,3,5',
+                        help='allows specifying the comma-separated sizes of '
+                             'the pug bombs')
+    parser.add_argument('-o', '--output', dest='output', type=str,
+                        help='allows specifying the file the JSON report is '
+                             'written to (defaults to stdout)')
+    add_harness_arguments(parser)
+    options = parser.parse_args()
+
+    if not options.username:
+        parser.error('Username is not specified')
+
+    if not options.password:
+        parser.error('Password is not specified')
+
+    try:
+        sizes = sorted(int(size) for size in options.sizes.split(','))
+    except ValueError:
+        parser.error('Sizes must be comma-separated numbers')
+
+    benchmark = PugBombBenchmark(options.host, options.username,
+                                 options.password, sizes, options.pugs_limit,
+                                 create_test_user=False,
+                                 **get_harness_kwargs(options))
+    exit_code = benchmark.run()
+    write_report(benchmark.results, options.output)
+    sys.exit(exit_code)
+
+
+if __name__ == '__main__':
+    main()
@@ -17,31 +17,45 @@
 import sys
 from argparse import ArgumentParser
 
-from base import RocketChatTestCase
+from base import (
+    RocketChatTestCase,
+    add_harness_arguments,
+    get_harness_kwargs,
+    independent
+)
 
 
 class PugmeScriptTestCase(RocketChatTestCase):
+    default_message_transport = 'rest'
+
+    # Every test case sends its own request and checks the reply to it in the
+    # channel the process has to itself.
+    shardable = True
+
     def __init__(self, addr, username, password, pugs_limit, **kwargs):
         RocketChatTestCase.__init__(self, addr, username, password, **kwargs)
 
-        self.schedule_pre_test_case('choose_general_channel')
+        self.schedule_pre_test_case('choose_own_channel')
 
         self._bot_name = 'meeseeks'
         self._expected_message = r'https?://(?:[-\w.]|(?:%[\da-fA-F]{2}))+'
         self._pugs_limit = pugs_limit
 
+    @independent
     def test_requesting_1_pug(self):
         self.send_message('{} pug me'.format(self._bot_name))
 
         assert self.check_latest_response_with_retries(self._expected_message,
                                                        match=True)
 
+    @independent
     def test_pug_bomb_3(self):
         self.send_message('{} pug bomb 3'.format(self._bot_name))
 
         assert self.check_latest_response_with_retries(self._expected_message,
                                                        match=True, messages_number=3)
 
+    @independent
     def test_pug_bomb_limit(self):
         self.send_message('{} pug bomb'.format(self._bot_name))
 
@@ -59,6 +73,7 @@ def main():
                         help='allows specifying admin password')
     parser.add_argument('-l', '--pugs_limit', dest='pugs_limit', type=int,
                         help='allows specifying limit for pugs')
+    add_harness_arguments(parser)
     options = parser.parse_args()
 
     if not options.host:
@@ -80,7 +95,8 @@ def main():
         )
 
     test_cases = PugmeScriptTestCase(options.host, options.username, options.password,
-                                     pugs_limit=options.pugs_limit, create_test_user=False)
+                                     pugs_limit=options.pugs_limit, create_test_user=False,
+                                     **get_harness_kwargs(options))
     exit_code = test_cases.run()
     sys.exit(exit_code)
 
@@ -22,14 +22,22 @@
 import datetime
 import os
 import sys
-import uuid
 from argparse import ArgumentParser
 
 import pyperclip
 from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.support.wait import WebDriverWait
 
-from base import RocketChatTestCase
+from base import RocketChatTestCase, add_harness_arguments, get_harness_kwargs
+
+# The expectations which depend on the Rocket.Chat version. The keys are the
+# minimal versions the expectations are intended for.
+EXPECTATIONS = {
+    '0.70': {
+        'message_actions_number': 8,
+        'pin_action_index': 6,
+        'star_action_index': 5,
+    },
+}
 
 
 class GeneralRocketChatTestCase(RocketChatTestCase):
@@ -41,118 +49,23 @@ class GeneralRocketChatTestCase(RocketChatTestCase):
         self._test_string = 'Test string'
         self._base_dividing_message = 'Cat from clipboard'
         self._file_url = os.path.join(os.getcwd(), 'static', 'cat.gif')
+        self._expectations = self.pick_for_version(EXPECTATIONS)
 
-        self._public_channel_name = '{}_{}'.format(
-            'public_test_channel', uuid.uuid4())
-
-        self._private_channel_name = '{}_{}'.format(
-            'private_test_channel', uuid.uuid4())
+        self._public_channel_name = self.get_unique_name(
+            'public_test_channel')
 
-        self._read_only_channel_name = '{}_{}'.format(
-            'read_only_test_channel', uuid.uuid4())
+        self._private_channel_name = self.get_unique_name(
+            'private_test_channel')
 
-        self._non_unique_channel_name = 'test_channel'
+        self._read_only_channel_name = self.get_unique_name(
+            'read_only_test_channel')
 
-        self.schedule_test_case('_delete_channels')
+        self._non_unique_channel_name = self.get_unique_name('test_channel')
 
     #
     # Private methods
     #
 
-    def _delete_channels(self):
-        options_btn = self.browser.driver.find_elements_by_css_selector(
-            '.sidebar__toolbar-button.rc-tooltip.rc-tooltip--down.js-button')
-
-        assert options_btn
-
-        self.browser.driver.execute_script('arguments[0].click();',
-                                           options_btn[-1])
-
-        administration_btn = self.browser.find_by_css('.rc-popover__item-text')
-        administration_btn.click()
-
-        rooms_btn = self.browser.driver.find_elements_by_css_selector(
-            'a.sidebar-item__link[aria-label="Rooms"]')
-
-        assert rooms_btn
-
-        self.browser.driver.execute_script("arguments[0].click();",
-                                           rooms_btn[0])
-
-        selected_room = self.browser.find_by_xpath(
-            '//td[@class="border-component-color"][text()="{0}"]'.format(
-                self._public_channel_name))
-
-        assert selected_room
-
-        selected_room.click()
-
-        delete_btn = self.browser.driver.find_element_by_class_name('button')
-
-        assert delete_btn
-
-        delete_btn.click()
-
-        confirm_btn = self.find_by_css('input[value="Yes, delete it!"]')
-
-        assert confirm_btn
-
-        confirm_btn.first.click()
-
-        WebDriverWait(self.browser.driver, 10).until(
-            lambda _: self._check_modal_window_visibility())
-
-        selected_room = self.browser.find_by_xpath(
-            '//td[@class="border-component-color"][text()="{0}"]'.format(
-                self._private_channel_name))
-
-        assert selected_room
-
-        selected_room.click()
-
-        delete_btn = self.browser.driver.find_element_by_class_name('button')
-
-        assert delete_btn
-
-        delete_btn.click()
-
-        confirm_btn = self.find_by_css('input[value="Yes, delete it!"]')
-
-        assert confirm_btn
-
-        confirm_btn.first.click()
-
-        WebDriverWait(self.browser.driver, 10).until(
-            lambda _: self._check_modal_window_visibility())
-
-        selected_room = self.browser.find_by_xpath(
-            '//td[@class="border-component-color"][text()="{0}"]'.format(
-                self._read_only_channel_name))
-
-        assert selected_room
-
-        selected_room.click()
-
-        delete_btn = self.browser.driver.find_element_by_class_name('button')
-
-        assert delete_btn
-
-        delete_btn.click()
-
-        confirm_btn = self.find_by_css('input[value="Yes, delete it!"]')
-
-        assert confirm_btn
-
-        confirm_btn.first.click()
-
-        close_btn = self.browser.driver.find_elements_by_css_selector(
-            'button[data-action="close"]')
-
-        assert close_btn
-
-        self.browser.driver.execute_script('arguments[0].click();',
-                                           close_btn[0])
-
     @staticmethod
     def _check_elem_disabled_state(elem):
         act = elem._element.get_attribute('disabled')  # pylint: disable=protected-access
@@ -171,6 +84,26 @@ class GeneralRocketChatTestCase(RocketChatTestCase):
         return '{0} {1}'.format(self._base_dividing_message,
                                 str(datetime.datetime.now()))
 
+    def _register_latest_upload(self, description, file_name=None,
+                                channel_name='general'):
+        room_id = self.rocket.channels_info(
+            channel=channel_name).json()['channel']['_id']
+        messages = self.rocket.channels_history(
+            room_id, count=10).json().get('messages', [])
+        # The server may be shared, so only the file this test case uploaded
+        # is deleted.
+        uploads = [msg for msg in messages
+                   if msg.get('file') and
+                   msg['u']['username'] == self.username and
+                   (file_name is None or msg['file']['name'] == file_name) and
+                   (description == msg.get('msg') or
+                    any(i.get('description') == description
+                        for i in msg.get('attachments', [])))]
+
+        assert uploads
+
+        self.registry.add_file(room_id, uploads[0]['_id'])
+
     def _copy_string_to_clipboard(self):
         pyperclip.copy(self._test_string)
 
@@ -185,6 +118,7 @@ class GeneralRocketChatTestCase(RocketChatTestCase):
         img.send_keys(Keys.CONTROL, 'c')
 
         self.browser.back()
+        self.wait_until_app_is_ready()
         self.choose_general_channel()
 
     #
@@ -196,7 +130,7 @@ class GeneralRocketChatTestCase(RocketChatTestCase):
         See https://rocket.chat/docs/user-guides/messaging/#starring-messages.
         """
 
-        WebDriverWait(self.browser.driver, 10).until(
+        self.wait_until(
             lambda _: self._check_hiding_toast_message())
         search_btn = self.browser.find_by_css(
             '.sidebar__toolbar-button.rc-tooltip.rc-tooltip--down.js-button'
@@ -220,8 +154,7 @@ class GeneralRocketChatTestCase(RocketChatTestCase):
 
         self.send_message(self._test_string)
 
-        test_message = self.find_by_css(
-            'div.body.color-primary-font-color ')
+        test_message = self.find_by_css(self.selectors['message_body'])
 
         assert test_message
 
@@ -233,12 +166,13 @@ class GeneralRocketChatTestCase(RocketChatTestCase):
         actions_menu.last.click()
 
         menu_items = self.find_by_css('.rc-popover__item')
+        star_index = self._expectations['star_action_index']
 
-        assert len(menu_items) == 8
+        assert len(menu_items) == self._expectations['message_actions_number']
 
-        assert menu_items[5].text == 'Star Message'
+        assert menu_items[star_index].text == 'Star Message'
 
-        menu_items[5].click()
+        menu_items[star_index].click()
 
         room_menu = self.find_by_css('.rc-room-actions__action')
 
@@ -250,10 +184,11 @@ class GeneralRocketChatTestCase(RocketChatTestCase):
 
         assert starred_messages
 
-        starred_messages.first.click()
+        with self.action('open starred messages'):
+            starred_messages.first.click()
 
-        starred_message = self.find_by_css(
-            '.message.background-transparent-dark-hover.own.starred.new-day')
+            starred_message = self.find_by_css(
+                '.message.background-transparent-dark-hover.own.starred.new-day')
 
         assert starred_message
 
@@ -269,8 +204,7 @@ class GeneralRocketChatTestCase(RocketChatTestCase):
     def test_unstarring_messages(self):
         """Tests if it's possible to unstar messages. """
 
-        test_message = self.find_by_css(
-            'div.body.color-primary-font-color ')
+        test_message = self.find_by_css(self.selectors['message_body'])
 
         assert test_message
 
@@ -282,12 +216,13 @@ class GeneralRocketChatTestCase(RocketChatTestCase):
         actions_menu.last.click()
 
         menu_items = self.find_by_css('.rc-popover__item')
+        star_index = self._expectations['star_action_index']
 
-        assert len(menu_items) == 8
+        assert len(menu_items) == self._expectations['message_actions_number']
 
-        assert menu_items[5].text == 'Remove Star'
+        assert menu_items[star_index].text == 'Remove Star'
 
-        menu_items[5].click()
+        menu_items[star_index].click()
 
         room_menu = self.find_by_css('.rc-room-actions__action')
 
@@ -324,8 +259,7 @@ class GeneralRocketChatTestCase(RocketChatTestCase):
         self.choose_general_channel()
         self.send_message(self._test_string)
 
-        test_message = self.find_by_css(
-            'div.body.color-primary-font-color ')
+        test_message = self.find_by_css(self.selectors['message_body'])
 
         assert test_message
 
@@ -336,16 +270,17 @@ class GeneralRocketChatTestCase(RocketChatTestCase):
 
         actions_menu.last.click()
         menu_items = self.find_by_css('.rc-popover__item')
+        pin_index = self._expectations['pin_action_index']
 
-        assert len(menu_items) == 8
+        assert len(menu_items) == self._expectations['message_actions_number']
 
-        assert menu_items[6].text == 'Pin Message'
+        assert menu_items[pin_index].text == 'Pin Message'
 
-        menu_items[6].click()
+        menu_items[pin_index].click()
         assert self.check_latest_response_with_retries(
             'Pinned a message:[w+]*', match=True)
 
-        WebDriverWait(self.browser.driver, 10).until(
+        self.wait_until(
             lambda _: self._check_hiding_toast_message())
 
         room_menu = self.find_by_css('.rc-room-actions__action')
@@ -357,9 +292,10 @@ class GeneralRocketChatTestCase(RocketChatTestCase):
 
         assert pinned_messages
 
-        pinned_messages[5].click()
-        pinned_message = self.find_by_css(
-            '.message.background-transparent-dark-hover.own.pinned.new-day')
+        with self.action('open pinned messages'):
+            pinned_messages[5].click()
+            pinned_message = self.find_by_css(
+                '.message.background-transparent-dark-hover.own.pinned.new-day')
 
         assert pinned_message
 
@@ -387,9 +323,10 @@ class GeneralRocketChatTestCase(RocketChatTestCase):
 
         assert pinned_messages
 
-        pinned_messages[3].click()
-        pinned_message = self.find_by_css(
-            '.message.background-transparent-dark-hover.pinned.new-day')
+        with self.action('open pinned messages'):
+            pinned_messages[3].click()
+            pinned_message = self.find_by_css(
+                '.message.background-transparent-dark-hover.pinned.new-day')
 
         assert pinned_message
 
@@ -421,9 +358,10 @@ class GeneralRocketChatTestCase(RocketChatTestCase):
 
         assert pinned_messages
 
-        pinned_messages[5].click()
-        pinned_message = self.find_by_css(
-            '.message.background-transparent-dark-hover.own.pinned.new-day')
+        with self.action('open pinned messages'):
+            pinned_messages[5].click()
+            pinned_message = self.find_by_css(
+                '.message.background-transparent-dark-hover.own.pinned.new-day')
 
         assert pinned_message
 
@@ -460,12 +398,13 @@ class GeneralRocketChatTestCase(RocketChatTestCase):
         assert channel_name
 
         channel_name.first.fill(self._public_channel_name)
+        self.registry.add_channel(self._public_channel_name)
 
         create_btn = self.find_by_css('.rc-button.rc-button--primary')
 
         assert create_btn
 
-        WebDriverWait(self.browser.driver, 10).until(
+        self.wait_until(
             lambda _: self._check_elem_disabled_state(create_btn))
 
         create_btn.first.click()
@@ -514,7 +453,7 @@ class GeneralRocketChatTestCase(RocketChatTestCase):
     def test_leaving_public_channel(self):
         """Tests if it's possible to leave a public channel. """
 
-        WebDriverWait(self.browser.driver, 10).until(
+        self.wait_until(
             lambda _: self._check_hiding_toast_message())
         room_actions = self.browser.find_by_css(
             '.rc-tooltip.rc-tooltip--down.rc-room-actions__button')
@@ -555,12 +494,13 @@ class GeneralRocketChatTestCase(RocketChatTestCase):
         assert channel_name
 
         channel_name.first.fill(self._private_channel_name)
+        self.registry.add_group(self._private_channel_name)
 
         create_btn = self.find_by_css('.rc-button.rc-button--primary')
 
         assert create_btn
 
-        WebDriverWait(self.browser.driver, 10).until(
+        self.wait_until(
             lambda _: self._check_elem_disabled_state(create_btn))
 
         create_btn.first.click()
@@ -630,12 +570,13 @@ class GeneralRocketChatTestCase(RocketChatTestCase):
         assert channel_name
 
         channel_name.first.fill(self._read_only_channel_name)
+        self.registry.add_channel(self._read_only_channel_name)
 
         create_btn = self.find_by_css('.rc-button.rc-button--primary')
 
         assert create_btn
 
-        WebDriverWait(self.browser.driver, 10).until(
+        self.wait_until(
             lambda _: self._check_elem_disabled_state(create_btn))
 
         create_btn.first.click()
@@ -692,9 +633,10 @@ class GeneralRocketChatTestCase(RocketChatTestCase):
 
         assert len(channel_options) >= 3
 
-        channel_options[2].click()
+        with self.action('open members list'):
+            channel_options[2].click()
 
-        members_list = self.find_by_css('.rc-member-list__user')
+            members_list = self.find_by_css('.rc-member-list__user')
 
         assert members_list
 
@@ -705,7 +647,7 @@ class GeneralRocketChatTestCase(RocketChatTestCase):
         where emojis are allowed.
         Change the test when https://github.com/RocketChat/Rocket.Chat/issues/11819 is closed.
         """
-        test_message = self.find_by_css('div.body.color-primary-font-color ')
+        test_message = self.find_by_css(self.selectors['message_body'])
 
         assert test_message
 
@@ -756,7 +698,7 @@ class GeneralRocketChatTestCase(RocketChatTestCase):
 
         self.switch_channel(self._read_only_channel_name)
 
-        test_message = self.find_by_css('div.body.color-primary-font-color ')
+        test_message = self.find_by_css(self.selectors['message_body'])
 
         assert test_message
 
@@ -824,35 +766,19 @@ class GeneralRocketChatTestCase(RocketChatTestCase):
         assert channel_name
 
         channel_name.first.fill(self._non_unique_channel_name)
+        self.registry.add_channel(self._non_unique_channel_name)
 
         create_btn = self.find_by_css('.rc-button.rc-button--primary')
 
         assert create_btn
 
-        WebDriverWait(self.browser.driver, 10).until(
+        self.wait_until(
             lambda _: self._check_elem_disabled_state(create_btn))
 
         create_btn.first.click()
 
         # delete
-        options_btn = self.browser.driver.find_elements_by_css_selector(
-            '.sidebar__toolbar-button.rc-tooltip.rc-tooltip--down.js-button')
-
-        assert options_btn
-
-        self.browser.driver.execute_script('arguments[0].click();',
-                                           options_btn[-1])
-
-        administration_btn = self.browser.find_by_css('.rc-popover__item-text')
-        administration_btn.click()
-
-        rooms_btn = self.browser.driver.find_elements_by_css_selector(
-            'a.sidebar-item__link[aria-label="Rooms"]')
-
-        assert rooms_btn
-
-        self.browser.driver.execute_script('arguments[0].click();',
-                                           rooms_btn[0])
+        self.open_admin('rooms')
 
         selected_room = self.browser.find_by_xpath(
             '//td[@class="border-component-color"][text()="{0}"]'.format(
@@ -874,7 +800,7 @@ class GeneralRocketChatTestCase(RocketChatTestCase):
 
         confirm_btn.first.click()
 
-        WebDriverWait(self.browser.driver, 10).until(
+        self.wait_until(
             lambda _: self._check_modal_window_visibility())
 
         close_btn = self.browser.driver.find_elements_by_css_selector(
@@ -903,12 +829,13 @@ class GeneralRocketChatTestCase(RocketChatTestCase):
         assert channel_name
 
         channel_name.first.fill(self._non_unique_channel_name)
+        self.registry.add_channel(self._non_unique_channel_name)
 
         create_btn = self.find_by_css('.rc-button.rc-button--primary')
 
         assert create_btn
 
-        WebDriverWait(self.browser.driver, 10).until(
+        self.wait_until(
             lambda _: self._check_elem_disabled_state(create_btn))
 
         create_btn.first.click()
@@ -921,24 +848,7 @@ class GeneralRocketChatTestCase(RocketChatTestCase):
                    self._non_unique_channel_name)
 
         #  delete
-        options_btn = self.browser.driver.find_elements_by_css_selector(
-            '.sidebar__toolbar-button.rc-tooltip.rc-tooltip--down.js-button')
-
-        assert options_btn
-
-        self.browser.driver.execute_script('arguments[0].click();',
-                                           options_btn[-1])
-
-        administration_btn = self.browser.find_by_css('.rc-popover__item-text')
-        administration_btn.click()
-
-        rooms_btn = self.browser.driver.find_elements_by_css_selector(
-            'a.sidebar-item__link[aria-label="Rooms"]')
-
-        assert rooms_btn
-
-        self.browser.driver.execute_script('arguments[0].click();',
-                                           rooms_btn[0])
+        self.open_admin('rooms')
 
         selected_room = self.browser.find_by_xpath(
             '//td[@class="border-component-color"][text()="{0}"]'.format(
@@ -960,7 +870,7 @@ class GeneralRocketChatTestCase(RocketChatTestCase):
 
         confirm_btn.first.click()
 
-        WebDriverWait(self.browser.driver, 10).until(
+        self.wait_until(
             lambda _: self._check_modal_window_visibility())
 
         close_btn = self.browser.driver.find_elements_by_css_selector(
@@ -1014,12 +924,16 @@ class GeneralRocketChatTestCase(RocketChatTestCase):
             'input.rc-button.rc-button--primary.js-confirm')
         assert confirm_btn
 
-        confirm_btn.click()
-
         expected_message = r'File Uploaded: Clipboard - [\w,\s,:]*\\n{}'.format(
             description)
 
-        self.check_latest_response_with_retries(expected_message, match=True)
+        with self.action('upload file'):
+            confirm_btn.click()
+
+            self.check_latest_response_with_retries(expected_message,
+                                                    match=True)
+
+        self._register_latest_upload(description)
 
     def test_attaching_file(self):
         """Tests if it's possible to send a file as an attachment.
@@ -1049,12 +963,16 @@ class GeneralRocketChatTestCase(RocketChatTestCase):
             'input.rc-button.rc-button--primary.js-confirm')
         assert confirm_btn
 
-        confirm_btn.click()
-
         expected_message = 'File Uploaded: cat.gif\\n{}'.format(
             description)
 
-        self.check_latest_response_with_retries(expected_message, match=True)
+        with self.action('upload file'):
+            confirm_btn.click()
+
+            self.check_latest_response_with_retries(expected_message,
+                                                    match=True)
+
+        self._register_latest_upload(description, 'cat.gif')
 
 
 def main():
@@ -1066,6 +984,11 @@ def main():
                         help='allows specifying admin username')
     parser.add_argument('-p', '--password', dest='password', type=str,
                         help='allows specifying admin password')
+    parser.add_argument('--check-version', dest='check_version',
+                        action='store_true',
+                        help='allows checking the version shown in '
+                             'Administration → Info')
+    add_harness_arguments(parser)
     options = parser.parse_args()
 
     if not options.host:
@@ -1081,7 +1004,9 @@ def main():
         parser.error('Password is not specified')
 
     test_cases = GeneralRocketChatTestCase(options.host, options.username,
-                                           options.password, create_test_user=True)
+                                           options.password, create_test_user=True,
+                                           check_version=options.check_version,
+                                           **get_harness_kwargs(options))
     exit_code = test_cases.run()
     sys.exit(exit_code)
 
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module with the helpers for talking to Rocket.Chat via the REST API
+without a browser.
+"""
+
+import time
+from datetime import datetime, timezone
+
+from rocketchat_API.rocketchat import RocketChat
+
+TS_FORMAT = '%Y-%m-%dT%H:%M:%S.%fZ'
+
+
+def make_client(addr, username, password):
+    """Returns the REST API client authenticated as the specified user. """
+
+    client = RocketChat(server_url=addr)
+    # RocketChat keeps the auth headers in the class attribute which is
+    # shared by all the instances, so every client needs its own one.
+    client.headers = {}
+    client.login(username, password)
+
+    return client
+
+
+def create_user(client, username):
+    """Creates the user whose password is the same as the username and returns
+    the ID of the user.
+    """
+
+    response = client.users_create('{}@nodomain.com'.format(username),
+                                   username, username, username).json()
+    if not response.get('success'):
+        raise RuntimeError('Could not create {}: {}'.format(
+            username, response.get('error')))
+
+    return response['user']['_id']
+
+
+def parse_ts(ts):
+    """Turns the timestamp of a message into the number of seconds since the
+    epoch.
+    """
+
+    return datetime.strptime(ts, TS_FORMAT).replace(
+        tzinfo=timezone.utc).timestamp()
+
+
+def format_ts(seconds):
+    """Turns the number of seconds since the epoch into the timestamp the REST
+    API accepts.
+    """
+
+    return datetime.fromtimestamp(seconds, timezone.utc).strftime(
+        TS_FORMAT)[:-4] + 'Z'
+
+
+def find_room(client, name):
+    """Returns the ID and the type ('c' or 'p') of the room with the specified
+    name.
+    """
+
+    channel = client.channels_info(channel=name).json().get('channel')
+    if channel:
+        return channel['_id'], 'c'
+
+    group = client.groups_info(room_name=name).json().get('group')
+    if group:
+        return group['_id'], 'p'
+
+    raise LookupError('There is no room named {}'.format(name))
+
+
+def open_direct(client, username):
+    """Returns the ID of the direct messages room with the specified user. """
+
+    return client.im_create(username).json()['room']['_id']
+
+
+def get_history(client, room_id, room_type, oldest=None, latest=None,  # pylint: disable=too-many-arguments
+                count=100, offset=0):
+    """Returns at most the specified number of the messages of the specified
+    room (newest first), optionally only the ones posted between the
+    specified numbers of seconds since the epoch, skipping the specified
+    number of the newest ones.
+    """
+
+    method = {
+        'c': client.channels_history,
+        'd': client.im_history,
+        'p': client.groups_history,
+    }[room_type]
+
+    kwargs = {'count': count}
+    if oldest is not None:
+        kwargs['oldest'] = format_ts(oldest)
+    if latest is not None:
+        kwargs['latest'] = format_ts(latest)
+    if offset:
+        kwargs['offset'] = offset
+
+    return method(room_id, **kwargs).json().get('messages', [])
+
+
+def get_all_history(client, room_id, room_type, oldest, count=100):
+    """Returns all the messages of the specified room posted after the
+    specified number of seconds since the epoch in chronological order. The
+    history returns the newest messages first, so it is paged through until a
+    page is shorter than the specified count. Otherwise, the older messages
+    which didn't fit in the first page would be lost.
+    """
+
+    # The upper bound keeps the pages from shifting when new messages arrive.
+    latest = time.time() + 1
+    messages = []
+    while True:
+        page = get_history(client, room_id, room_type, oldest=oldest,
+                           latest=latest, count=count, offset=len(messages))
+        messages.extend(page)
+        if len(page) < count:
+            break
+
+    return messages[::-1]
+
+
+def post_message(client, room_id, text):
+    """Posts the message to the specified room and returns its ID along with
+    the time (in seconds since the epoch) the server assigned to it.
+    """
+
+    message = client.chat_post_message(text, room_id=room_id).json()['message']
+
+    return message['_id'], parse_ts(message['ts'])
+
+
+def iter_messages(client, room_id, room_type, since, sender=None, timeout=60,
+                  poll_interval=0.5, quiet_period=None, count=100):
+    """Yields the messages posted to the specified room after the specified
+    time in chronological order as soon as they arrive. Stops when the timeout
+    expires or, if the quiet period is specified, when no new messages arrive
+    for that long after the first one.
+    """
+
+    seen = set()
+    oldest = since
+    last_arrival = None
+    finish = time.time() + timeout
+    while time.time() < finish:
+        batch = get_all_history(client, room_id, room_type, oldest,
+                                count=count)
+        arrived = False
+        for message in batch:
+            if message['_id'] in seen:
+                continue
+
+            seen.add(message['_id'])
+            # Keep an overlap in case several messages share the timestamp.
+            oldest = max(oldest, parse_ts(message['ts']) - 1)
+            if sender is None or message['u']['username'] == sender:
+                arrived = True
+                yield message
+
+        now = time.time()
+        if arrived:
+            last_arrival = now
+        elif quiet_period and last_arrival and \
+                now - last_arrival >= quiet_period:
+            return
+
+        time.sleep(poll_interval)
+
+
+class RestConversation:
+    """Conversation in a room on behalf of the user the client is
+    authenticated as. Provides the same interface as RocketChatTestCase does
+    for the DialogEngine, but doesn't need a browser.
+    """
+
+    def __init__(self, client, room_id, room_type='d'):
+        self.client = client
+        self.room_id = room_id
+        self.room_type = room_type
+        self.last_sent_at = None
+
+    def send_message(self, text):
+        """Posts the message to the room and remembers when the server got
+        it.
+        """
+
+        _, self.last_sent_at = post_message(self.client, self.room_id, text)
+
+    def get_message_cursor(self):
+        """Returns the time of the latest message in the room. """
+
+        latest = get_history(self.client, self.room_id, self.room_type, count=1)
+
+        return parse_ts(latest[0]['ts']) if latest else 0.0
+
+    def get_messages_since(self, cursor):
+        """Returns the texts of the messages posted to the room after the
+        specified time in chronological order. A negative cursor stands for
+        the number of the latest messages, like in
+        RocketChatTestCase.get_messages_since.
+        """
+
+        if cursor < 0:
+            messages = get_history(self.client, self.room_id, self.room_type,
+                                   count=-cursor)
+            return [message['msg'] for message in reversed(messages)]
+
+        messages = get_all_history(self.client, self.room_id, self.room_type,
+                                   cursor)
+
+        return [message['msg'] for message in messages
+                if parse_ts(message['ts']) > cursor]
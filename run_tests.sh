@@ -37,6 +37,12 @@ PUGS_LIMIT=${PUGS_LIMIT:=5}
 
 PYTHON=${PYTHON:="python3"}
 
+HARNESS_ARGS=${HARNESS_ARGS:=""}
+
+# All the suites of the run share the identifier, so that the users and rooms
+# they create don't collide with the ones created by concurrent runs.
+export RUN_ID=${RUN_ID:="$(date +%s)$$"}
+
 HOST="http://${ADDR}:${PORT}"
 
 set +x
@@ -84,20 +90,20 @@ for i in "${RUN[@]}"; do
     case "${i}" in
         # General tests for Rocket.Chat
         rc)
-            ${PYTHON} rc_tests.py --host="${HOST}" --username="${USERNAME}" --password="${PASSWORD}" || exit_code=$?
+            ${PYTHON} rc_tests.py --host="${HOST}" --username="${USERNAME}" --password="${PASSWORD}" ${HARNESS_ARGS} || exit_code=$?
             ;;
         # Tests for different scripts
         happy_birthder_script)
-            ${PYTHON} happy_birthder_script_tests.py --host="${HOST}" --username="${USERNAME}" --password="${PASSWORD}" --wait="${WAIT}" || exit_code=$?
+            ${PYTHON} happy_birthder_script_tests.py --host="${HOST}" --username="${USERNAME}" --password="${PASSWORD}" --wait="${WAIT}" ${HARNESS_ARGS} || exit_code=$?
             ;;
         pugme_script)
-            ${PYTHON} pugme_script_tests.py --host="${HOST}" --username="${USERNAME}" --password="${PASSWORD}" --pugs_limit="${PUGS_LIMIT}" || exit_code=$?
+            ${PYTHON} pugme_script_tests.py --host="${HOST}" --username="${USERNAME}" --password="${PASSWORD}" --pugs_limit="${PUGS_LIMIT}" ${HARNESS_ARGS} || exit_code=$?
             ;;
         viva_las_vegas_script)
-            ${PYTHON} viva_las_vegas_script_tests.py --host="${HOST}" --username="${USERNAME}" --password="${PASSWORD}"
+            ${PYTHON} viva_las_vegas_script_tests.py --host="${HOST}" --username="${USERNAME}" --password="${PASSWORD}" ${HARNESS_ARGS}
             ;;
         vote_or_die_script)
-            ${PYTHON} vote_or_die_script_tests.py --host="${HOST}" --username="${USERNAME}" --password="${PASSWORD}" || exit_code=$?
+            ${PYTHON} vote_or_die_script_tests.py --host="${HOST}" --username="${USERNAME}" --password="${PASSWORD}" ${HARNESS_ARGS} || exit_code=$?
             ;;
         *)
             ;;
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Benchmark measuring how late the messages of the cron-driven bot features
+(such as the birthday and vacation reminders) arrive relative to the cron
+boundaries.
+"""
+
+import sys
+import time
+from argparse import ArgumentParser
+
+from benchmark import (add_common_arguments, check_common_arguments,
+                       summarize, write_report)
+from matchers import compile_pattern
+from rest import (find_room, get_all_history, make_client, open_direct,
+                  parse_ts)
+
+
+def parse_scheduler(scheduler):
+    """Returns the sorted minutes of the hour the cron schedule fires at. Only
+    the schedules firing every hour at the specified minutes ('*', '*/N', 'M'
+    or 'M1,M2') are supported. Like cron does, '*/N' starts over at the top of
+    every hour, so '*/7' fires at :00, :07, ..., :56 and then at :00 again.
+    """
+
+    fields = scheduler.split()
+    if len(fields) != 5 or any(field != '*' for field in fields[1:]):
+        raise ValueError('Unsupported schedule: {}'.format(scheduler))
+
+    minute = fields[0]
+    if minute == '*':
+        return list(range(60))
+
+    if minute.startswith('*/') and minute[2:].isdigit() and int(minute[2:]):
+        return list(range(0, 60, int(minute[2:])))
+
+    values = minute.split(',')
+    if all(i.isdigit() and int(i) < 60 for i in values):
+        return sorted({int(i) for i in values})
+
+    raise ValueError('Unsupported schedule: {}'.format(scheduler))
+
+
+class CronSchedule:
+    """The times the cron schedule fires at in the time zone of the bot. The
+    offset of the time zone (in seconds) defaults to the one of the local
+    time zone at the given moment.
+    """
+
+    def __init__(self, scheduler, utc_offset=None):
+        self.minutes = set(parse_scheduler(scheduler))
+        self._utc_offset = utc_offset
+
+    def get_next(self, after):
+        """Returns the first time the schedule fires at after the specified
+        one.
+        """
+
+        fire_time = (after // 60 + 1) * 60
+        while not self._fires_at(fire_time):
+            fire_time += 60
+
+        return fire_time
+
+    def get_previous(self, before):
+        """Returns the last time the schedule fired at before or at the
+        specified one.
+        """
+
+        fire_time = before // 60 * 60
+        while not self._fires_at(fire_time):
+            fire_time -= 60
+
+        return fire_time
+
+    #
+    # Private methods
+    #
+
+    def _fires_at(self, fire_time):
+        utc_offset = self._utc_offset
+        if utc_offset is None:
+            utc_offset = time.localtime(fire_time).tm_gmtoff
+
+        return int((fire_time + utc_offset) // 60) % 60 in self.minutes
+
+
+def add_utc_offset_argument(parser):
+    """Adds the option specifying the time zone of the bot to the specified
+    argument parser.
+    """
+
+    parser.add_argument('--utc-offset', dest='utc_offset', type=float,
+                        help='allows specifying the UTC offset (in hours) of '
+                             'the time zone the bot runs its cron jobs in '
+                             '(the local one by default)')
+
+
+def get_utc_offset(options):
+    """Returns the UTC offset (in seconds) specified by the options or None if
+    the local time zone has to be used.
+    """
+
+    if options.utc_offset is None:
+        return None
+
+    return int(options.utc_offset * 3600)
+
+
+class SchedulerBenchmark:
+    """Polls the room the bot posts to over the specified number of cron ticks
+    and records, for each tick, the delay between the cron boundary and the
+    first matching message, as well as the misses and duplicates.
+
+    The boundaries are computed on the local clock while the delays are
+    measured using the timestamps assigned by the server, so the clocks of the
+    hosts are expected to be in sync.
+    """
+
+    def __init__(self, client, room_id, room_type, sender, pattern, schedule,  # pylint: disable=too-many-arguments
+                 ticks, poll_interval=5, grace=60):
+        self._client = client
+        self._room_id = room_id
+        self._room_type = room_type
+        self._sender = sender
+        self._pattern = compile_pattern(pattern)
+        self._schedule = schedule
+        self._ticks = ticks
+        self._poll_interval = poll_interval
+        self._grace = grace
+
+        self.boundaries = []
+        self.messages = {}
+
+    def run(self):
+        """Collects the messages posted during the benchmark and returns the
+        report.
+        """
+
+        # The boundary following the last tick closes the window of the tick.
+        self.boundaries = [self._schedule.get_next(time.time())]
+        for _ in range(self._ticks):
+            self.boundaries.append(
+                self._schedule.get_next(self.boundaries[-1]))
+        first = self.boundaries[0]
+        finish = self.boundaries[-1] + self._grace
+
+        sys.stderr.write('Waiting for {} tick(s) starting at {}\n'.format(
+            self._ticks, time.strftime('%H:%M:%S', time.localtime(first))))
+
+        oldest = first
+        while time.time() < finish:
+            time.sleep(min(self._poll_interval, max(finish - time.time(), 0)))
+            for message in get_all_history(self._client, self._room_id,
+                                           self._room_type, oldest):
+                if self._is_tick_message(message):
+                    ts = parse_ts(message['ts'])
+                    self.messages[message['_id']] = ts
+                    # Move the window forward, keeping a small overlap.
+                    oldest = max(oldest, ts - 1)
+
+        return self.get_report()
+
+    def get_report(self):
+        """Turns the collected messages into the report. """
+
+        timestamps = sorted(self.messages.values())
+        ticks = []
+        for boundary, next_boundary in zip(self.boundaries,
+                                           self.boundaries[1:]):
+            arrived = [ts for ts in timestamps
+                       if boundary <= ts < next_boundary]
+            ticks.append({
+                'boundary': boundary,
+                'delay': arrived[0] - boundary if arrived else None,
+                'messages': len(arrived),
+            })
+
+        delays = [tick['delay'] for tick in ticks if tick['delay'] is not None]
+        summary = summarize(delays)
+        return {
+            'delay': summary,
+            'duplicates': sum(max(tick['messages'] - 1, 0) for tick in ticks),
+            'jitter': summary['stdev'] if summary else None,
+            'minutes': sorted(self._schedule.minutes),
+            'misses': sum(1 for tick in ticks if not tick['messages']),
+            'ticks': ticks,
+        }
+
+    #
+    # Private methods
+    #
+
+    def _is_tick_message(self, message):
+        return (message.get('u', {}).get('username') == self._sender and
+                self._pattern.search(message.get('msg', '')) is not None)
+
+
+def main():
+    """The main entry point. """
+
+    parser = ArgumentParser(description='usage: %prog [options] arguments')
+    add_common_arguments(parser)
+    parser.add_argument('--room', dest='room', type=str,
+                        help='allows specifying the channel or private group '
+                             'the bot posts to')
+    parser.add_argument('--direct', dest='direct', action='store_true',
+                        help='watches the direct messages from the bot '
+                             'instead of a room')
+    parser.add_argument('--sender', dest='sender', type=str,
+                        default='meeseeks',
+                        help='allows specifying the bot name')
+    parser.add_argument('--pattern', dest='pattern', type=str, default='',
+                        help='allows specifying the regular expression the '
+                             'messages of the tick have to match')
+    parser.add_argument('--scheduler', dest='scheduler', type=str,
+                        default='*/1 * * * *',
+                        help='allows specifying the cron schedule of the '
+                             'feature')
+    parser.add_argument('--ticks', dest='ticks', type=int, default=10,
+                        help='allows specifying the number of ticks to watch')
+    parser.add_argument('--poll-interval', dest='poll_interval', type=float,
+                        default=5,
+                        help='allows specifying how often (in seconds) the '
+                             'room is polled')
+    add_utc_offset_argument(parser)
+    options = parser.parse_args()
+
+    check_common_arguments(parser, options)
+
+    if not options.room and not options.direct:
+        parser.error('Either room or direct has to be specified')
+
+    try:
+        schedule = CronSchedule(options.scheduler, get_utc_offset(options))
+    except ValueError as exc:
+        parser.error(str(exc))
+
+    client = make_client(options.host, options.username, options.password)
+    if options.direct:
+        room_id, room_type = open_direct(client, options.sender), 'd'
+    else:
+        room_id, room_type = find_room(client, options.room)
+
+    benchmark = SchedulerBenchmark(client, room_id, room_type, options.sender,
+                                   options.pattern, schedule, options.ticks,
+                                   poll_interval=options.poll_interval)
+    report = benchmark.run()
+    write_report(report, options.output)
+
+    sys.exit(1 if report['misses'] else 0)
+
+
+if __name__ == '__main__':
+    main()
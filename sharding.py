@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Runner splitting the suites into the shards of about the same duration,
+based on the history of the runs, and running the shards in parallel.
+"""
+
+import argparse
+import ast
+import collections
+import glob
+import os
+import shlex
+import subprocess
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from executor import group_by_dependencies
+from history import HistoryStore
+
+TEST_SUFFIX = '_tests.py'
+
+Suite = collections.namedtuple('Suite', 'script name shardable test_cases')
+
+# The test cases which have to be run by the same process in the specified
+# order, i.e. either a whole suite or a group of the test cases of a shardable
+# suite bound by their dependencies.
+Unit = collections.namedtuple('Unit', 'suite test_cases duration')
+
+
+def discover_suites(directory='.'):
+    """Finds the suites in the specified directory. The scripts are parsed
+    rather than imported, so neither the browser nor the dependencies of the
+    suites are needed to plan a run. Returns the list of the suites, where
+    the test cases are the dependencies of the test cases keyed by their
+    names in the order of their definition.
+    """
+
+    suites = []
+    for script in sorted(glob.glob(os.path.join(directory, '*' + TEST_SUFFIX))):
+        with open(script) as infile:
+            tree = ast.parse(infile.read(), script)
+
+        for node in tree.body:
+            if not isinstance(node, ast.ClassDef):
+                continue
+
+            shardable = False
+            test_cases = collections.OrderedDict()
+            for item in node.body:
+                if isinstance(item, ast.Assign) and \
+                        any(getattr(i, 'id', None) == 'shardable'
+                            for i in item.targets):
+                    shardable = bool(ast.literal_eval(item.value))
+                elif isinstance(item, ast.FunctionDef) and \
+                        item.name.startswith('test_'):
+                    test_cases[item.name] = _get_dependencies(item)
+
+            if test_cases:
+                suites.append(Suite(script, node.name, shardable, test_cases))
+
+    return suites
+
+
+def make_units(suite, durations, default_duration=60):
+    """Splits the specified suite into the units. The durations are the ones
+    HistoryStore.get_test_durations returns, while the test cases which have
+    never been run successfully are assumed to take the default duration.
+    """
+
+    def get_duration(test_cases):
+        return sum(durations.get((suite.name, i), default_duration)
+                   for i in test_cases)
+
+    if not suite.shardable:
+        test_cases = list(suite.test_cases)
+        return [Unit(suite, test_cases, get_duration(test_cases))]
+
+    try:
+        groups = group_by_dependencies(suite.test_cases)
+    except ValueError as exc:
+        raise ValueError('{}: {}'.format(suite.name, exc))
+
+    return [Unit(suite, test_cases, get_duration(test_cases))
+            for test_cases in groups]
+
+
+def plan(units, workers, overheads, default_overhead=30):
+    """Distributes the units among the specified number of the shards using
+    the longest-processing-time-first algorithm. Every suite a shard runs
+    costs it the overhead of the suite once, so the units of a suite are
+    split only when it pays off. Returns the list of the (planned duration,
+    units) tuples, where the units are ordered from the longest one, so that
+    the slow suites and test cases are started early and don't become the
+    tail.
+    """
+
+    shards = [[0, [], set()] for _ in range(workers)]
+    for unit in sorted(units, key=lambda i: i.duration, reverse=True):
+        overhead = overheads.get(unit.suite.name, default_overhead)
+
+        def get_load(shard, unit=unit, overhead=overhead):
+            return shard[0] + unit.duration + \
+                (0 if unit.suite.name in shard[2] else overhead)
+
+        shard = min(shards, key=get_load)
+        shard[0] = get_load(shard)
+        shard[1].append(unit)
+        shard[2].add(unit.suite.name)
+
+    return [(load, shard_units) for load, shard_units, _ in shards]
+
+
+def get_processes(units):
+    """Groups the units of a shard into the processes, one per suite, in the
+    order of the first unit of every suite. Returns the list of the (suite,
+    test cases) tuples, where the test cases are None if the process runs
+    the whole suite.
+    """
+
+    processes = collections.OrderedDict()
+    for unit in units:
+        _, test_cases = processes.setdefault(unit.suite.name, (unit.suite, []))
+        test_cases.extend(unit.test_cases)
+
+    return [(suite, None if len(test_cases) == len(suite.test_cases)
+             else test_cases)
+            for suite, test_cases in processes.values()]
+
+
+class ShardRunner:
+    """Runs the planned shards in parallel, one worker per shard, each
+    running its processes one after another.
+    """
+
+    def __init__(self, shards, hosts, username, password, harness_args=None,  # pylint: disable=too-many-arguments
+                 suite_args=None, log_dir='shards', python=sys.executable):
+        self._shards = shards
+        self._hosts = hosts
+        self._username = username
+        self._password = password
+        self._harness_args = harness_args or []
+        self._suite_args = suite_args or {}
+        self._log_dir = log_dir
+        self._python = python
+
+        os.makedirs(log_dir, exist_ok=True)
+
+    def get_command(self, shard_index, suite, test_cases):
+        """Returns the command running the specified test cases of the suite
+        within the specified shard.
+        """
+
+        command = [
+            self._python, suite.script,
+            '--host={}'.format(self._hosts[shard_index % len(self._hosts)]),
+            '--username={}'.format(self._username),
+            '--password={}'.format(self._password),
+        ]
+        if test_cases:
+            command.append('--tests={}'.format(','.join(test_cases)))
+
+        return command + self._harness_args + \
+            self._suite_args.get(_get_script_name(suite), [])
+
+    def run(self):
+        """Runs the shards. Returns the exit code, which is non-zero if any
+        of the processes failed.
+        """
+
+        with ThreadPoolExecutor(max_workers=len(self._shards)) as executor:
+            exit_codes = list(executor.map(self._run_shard,
+                                           range(len(self._shards))))
+
+        return 1 if any(exit_codes) else 0
+
+    #
+    # Private methods
+    #
+
+    def _run_shard(self, shard_index):
+        exit_code = 0
+        planned, units = self._shards[shard_index]
+        start_time = time.time()
+        for suite, test_cases in get_processes(units):
+            log = os.path.join(self._log_dir, 'shard{}.{}.log'.format(
+                shard_index, _get_script_name(suite)))
+            process_start_time = time.time()
+            with open(log, 'w') as outfile:
+                process = subprocess.run(
+                    self.get_command(shard_index, suite, test_cases),
+                    stdout=outfile, stderr=subprocess.STDOUT)
+
+            exit_code = exit_code or process.returncode
+            print('[shard {}] {} finished with {} in {:.0f}s (see {})'.format(
+                shard_index, suite.name, process.returncode,
+                time.time() - process_start_time, log), flush=True)
+
+        print('[shard {}] finished in {:.0f}s (planned {:.0f}s)'.format(
+            shard_index, time.time() - start_time, planned), flush=True)
+
+        return exit_code
+
+
+def _get_dependencies(func):
+    for decorator in func.decorator_list:
+        if isinstance(decorator, ast.Call) and \
+                getattr(decorator.func, 'id', None) == 'depends_on':
+            return [ast.literal_eval(i) for i in decorator.args]
+
+    return []
+
+
+def _get_script_name(suite):
+    return os.path.basename(suite.script)[:-len(TEST_SUFFIX)]
+
+
+def main():
+    """The main entry point. """
+
+    parser = argparse.ArgumentParser(
+        description='Runs the suites in the balanced parallel shards')
+    parser.add_argument('-a', '--host', dest='host', type=str,
+                        default='http://127.0.0.1:8006',
+                        help='allows specifying the comma-separated '
+                             'Rocket.Chat hosts the shards are spread among')
+    parser.add_argument('-u', '--username', dest='username', type=str,
+                        help='allows specifying admin username')
+    parser.add_argument('-p', '--password', dest='password', type=str,
+                        help='allows specifying admin password')
+    parser.add_argument('-w', '--workers', dest='workers', type=int,
+                        default=2,
+                        help='allows specifying the number of the shards run '
+                             'in parallel')
+    parser.add_argument('-s', '--scripts', dest='scripts', type=str,
+                        default='all',
+                        help='allows specifying the comma-separated scripts '
+                             'to run, the same as in run_tests.sh')
+    parser.add_argument('--history', dest='history', type=str,
+                        help='allows specifying the SQLite file the timings '
+                             'are taken from and appended to')
+    parser.add_argument('--window', dest='window', type=int, default=10,
+                        help='allows specifying the number of the latest '
+                             'runs the timings are taken from')
+    parser.add_argument('--default-duration', dest='default_duration',
+                        type=float, default=60,
+                        help='allows specifying the duration (secs) assumed '
+                             'for the test cases with no history')
+    parser.add_argument('--default-overhead', dest='default_overhead',
+                        type=float, default=30,
+                        help='allows specifying the overhead (secs) of '
+                             'running a suite assumed for the suites with no '
+                             'history')
+    parser.add_argument('--harness-args', dest='harness_args', type=str,
+                        default=os.environ.get('HARNESS_ARGS', ''),
+                        help='allows specifying the harness options passed '
+                             'to every suite (HARNESS_ARGS by default)')
+    parser.add_argument('--suite-args', dest='suite_args', action='append',
+                        default=[], metavar='SCRIPT=ARGS',
+                        help='allows specifying the options passed to the '
+                             'specified script only, e.g. '
+                             'happy_birthder_script="--wait=80"')
+    parser.add_argument('--log-dir', dest='log_dir', type=str,
+                        default='shards',
+                        help='allows specifying the directory the output of '
+                             'every process is written to')
+    parser.add_argument('--dry-run', dest='dry_run', action='store_true',
+                        help='prints the plan without running it')
+    args = parser.parse_args()
+
+    if not args.dry_run and (not args.username or not args.password):
+        parser.error('Username and password are required')
+
+    if args.workers < 1:
+        parser.error('The number of the workers must be positive')
+
+    suite_args = {}
+    for item in args.suite_args:
+        script, _, value = item.partition('=')
+        suite_args[script] = shlex.split(value)
+
+    suites = discover_suites()
+    if args.scripts != 'all':
+        scripts = args.scripts.split(',')
+        suites = [i for i in suites if _get_script_name(i) in scripts]
+        if not suites:
+            parser.error('None of the scripts exists')
+
+    durations, overheads = {}, {}
+    if args.history and os.path.isfile(args.history):
+        store = HistoryStore(args.history)
+        try:
+            durations = store.get_test_durations(args.window)
+            overheads = store.get_overheads(args.window)
+        finally:
+            store.close()
+
+    units = [unit for suite in suites
+             for unit in make_units(suite, durations, args.default_duration)]
+    hosts = args.host.split(',')
+    shards = plan(units, args.workers, overheads, args.default_overhead)
+
+    total = sum(unit.duration for unit in units)
+    print('Planned {} unit(s) of {:.0f}s in total into {} shard(s), the '
+          'longest one is {:.0f}s:'.format(len(units), total, len(shards),
+                                           max(load for load, _ in shards)))
+    for i, (load, shard_units) in enumerate(shards):
+        print('  shard {} ({:.0f}s):'.format(i, load))
+        for suite, test_cases in get_processes(shard_units):
+            print('    {}: {}'.format(
+                suite.name, ', '.join(test_cases) if test_cases else 'all'))
+
+    if args.dry_run:
+        sys.exit(0)
+
+    # All the processes of the run share the identifier (see base.get_run_id).
+    os.environ.setdefault('RUN_ID', uuid.uuid4().hex[:8])
+
+    harness_args = shlex.split(args.harness_args)
+    if args.history:
+        harness_args.append('--history={}'.format(args.history))
+
+    runner = ShardRunner(shards, hosts, args.username, args.password,
+                         harness_args, suite_args, args.log_dir)
+    sys.exit(runner.run())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module with the exporter of the run timeline in the Chrome trace-event
+format, which can be opened in Perfetto or chrome://tracing.
+"""
+
+import json
+import time
+
+TRACE_CATEGORIES = 'devtools.timeline,blink.user_timing,v8.execute'
+
+HARNESS_PID = 1
+
+BROWSER_PID = 2
+
+# Every kind of the harness spans gets its own track.
+HARNESS_TRACKS = ('test', 'action', 'step', 'wait', 'webdriver', 'rest',
+                  'sleep', 'message', 'scheduler')
+
+
+class Timeline:
+    """Merges the harness spans with the trace events of the browser.
+
+    The browser timestamps are taken from the monotonic clock, which is the
+    same clock time.monotonic() uses on Linux, while the harness uses the wall
+    clock, so the browser events are shifted by the difference between the
+    two clocks.
+    """
+
+    def __init__(self):
+        self._offset = time.time() - time.monotonic()
+        self.browser_events = []
+
+    def add_performance_log(self, entries):
+        """Picks the trace events from the entries of the Chrome performance
+        log.
+        """
+
+        for entry in entries:
+            message = json.loads(entry['message'])['message']
+            if message['method'] == 'Tracing.dataCollected':
+                self.browser_events.append(message['params'])
+
+    def get_trace_events(self, spans):
+        """Returns the trace events of the specified (kind, name, start, end)
+        spans and of the browser. The spans which start and end at the same
+        moment are turned into instant events.
+        """
+
+        events = [
+            self._metadata('process_name', HARNESS_PID, 0, 'harness'),
+            self._metadata('process_name', BROWSER_PID, 0, 'browser'),
+        ]
+        for tid, kind in enumerate(HARNESS_TRACKS, 1):
+            events.append(self._metadata('thread_name', HARNESS_PID, tid,
+                                         kind))
+
+        for kind, name, start, end in spans:
+            event = {
+                'cat': kind,
+                'name': name,
+                'pid': HARNESS_PID,
+                'tid': HARNESS_TRACKS.index(kind) + 1,
+                'ts': start * 1e6,
+            }
+            if end == start:
+                event.update(ph='i', s='t')
+            else:
+                event.update(ph='X', dur=(end - start) * 1e6)
+
+            events.append(event)
+
+        for event in self.browser_events:
+            event = dict(event, pid=BROWSER_PID)
+            if 'ts' in event:
+                event['ts'] = event['ts'] + self._offset * 1e6
+
+            events.append(event)
+
+        return events
+
+    def export(self, path, spans):
+        """Writes the trace to the specified file. """
+
+        with open(path, 'w') as outfile:
+            json.dump({
+                'displayTimeUnit': 'ms',
+                'traceEvents': self.get_trace_events(spans),
+            }, outfile, separators=(',', ':'))
+
+    #
+    # Private methods
+    #
+
+    @staticmethod
+    def _metadata(name, pid, tid, value):
+        return {'args': {'name': value}, 'name': name, 'ph': 'M', 'pid': pid,
+                'tid': tid}
@@ -16,23 +16,36 @@
 
 """Tests related to the hubot-viva-las-vegas script. """
 
+import re
 from argparse import ArgumentParser
 from datetime import datetime, timedelta
 
-from base import RocketChatTestCase
-
-FROM_MSG = 'Ok, с какого числа? (дд.мм)'
-
-INVALID_DATE_MSG = 'Указанная дата является невалидной. Попробуй еще раз.'
-
-PERMISSION_DENIED_MSG = 'У тебя недостаточно прав для этой команды 🙄'
-
-TO_MSG = 'Отлично, по какое? (дд.мм)'
+from base import (
+    RocketChatTestCase,
+    add_harness_arguments,
+    depends_on,
+    get_harness_kwargs,
+    independent
+)
+from dialog import DialogEngine, Step, is_passed
+from viva_messages import (
+    BIRTHDAY_SAVED_MSG,
+    CONFIRMATION_RE,
+    FROM_MSG,
+    INVALID_DATE_MSG,
+    PERMISSION_DENIED_MSG,
+    TO_MSG,
+    TOO_LONG_VACATION_RE,
+    WORK_FROM_HOME_CANCELLED_RE,
+    WORK_FROM_HOME_DATE_MSG
+)
 
 
 class VivaLasVegasScriptTestCase(RocketChatTestCase):  # pylint: disable=too-many-instance-attributes, too-many-public-methods
     """Tests for the hubot-viva-las-vegas script. """
 
+    default_message_transport = 'rest'
+
     def __init__(self, addr, username, password, **kwargs):
         RocketChatTestCase.__init__(self, addr, username, password, **kwargs)
 
@@ -58,6 +71,8 @@ class VivaLasVegasScriptTestCase(RocketChatTestCase):  # pylint: disable=too-man
 
         self._invalid_dates = ('99.99', '31.09', '30.02')
 
+        self.dialog_engine = DialogEngine(self)
+
     #
     # Private methods
     #
@@ -80,72 +95,57 @@ class VivaLasVegasScriptTestCase(RocketChatTestCase):  # pylint: disable=too-man
 
         return start_date, end_date, shift
 
-    def _send_leave_request(self):
-        self.send_message('{} хочу в отпуск'.format(self._bot_name))
+    def _talk(self, steps):
+        assert is_passed(self.dialog_engine.play(steps))
 
-        assert self.check_latest_response_with_retries(FROM_MSG)
-
-        self.send_message('{} хочу в отпуск'.format(self._bot_name))
+    def _to_bot(self, text):
+        return '{0} {1}'.format(self._bot_name, text)
 
-        assert self.check_latest_response_with_retries(
-            'Давай по порядку!\n'
-            'C какого числа ты хочешь уйти в отпуск? (дд.мм)')
+    def _send_leave_request(self):
+        self._talk([
+            Step(self._to_bot('хочу в отпуск'), FROM_MSG),
+            Step(self._to_bot('хочу в отпуск'),
+                 'Давай по порядку!\n'
+                 'C какого числа ты хочешь уйти в отпуск? (дд.мм)'),
+        ])
 
     def _input_start_date(self):
-        for date in self._invalid_dates:
-            self.send_message('{0} {1}'.format(self._bot_name, date))
-
-            assert self.check_latest_response_with_retries(INVALID_DATE_MSG)
-
-        self.send_message('{0} {1}'.format(self._bot_name,
-                                           self._too_close_start_date_1))
-
-        assert self.check_latest_response_with_retries(
-            'Нужно запрашивать отпуск минимум за 7 дней, а твой - уже завтра. '
-            'Попробуй выбрать дату позднее {}.'.format(
-                self._figure_out_date(7, '%d.%m.%Y')))
-
-        self.send_message(
-            '{0} {1}'.format(self._bot_name, self._too_close_start_date_2))
-
-        assert self.check_latest_response_with_retries(
-            'Нужно запрашивать отпуск минимум за 7 дней, '
-            'а твой - только через 2 дня. '
-            'Попробуй выбрать дату позднее {}.'.format(
-                self._figure_out_date(7, '%d.%m.%Y')))
-
-        self.send_message('{0} {1}'.format(self._bot_name,
-                                           self._vacation_start_date))
-        assert self.check_latest_response_with_retries(TO_MSG)
+        min_date = self._figure_out_date(7, '%d.%m.%Y')
+        self._talk(
+            [Step(self._to_bot(date), INVALID_DATE_MSG)
+             for date in self._invalid_dates] +
+            [
+                Step(self._to_bot(self._too_close_start_date_1),
+                     'Нужно запрашивать отпуск минимум за 7 дней, '
+                     'а твой - уже завтра. '
+                     'Попробуй выбрать дату позднее {}.'.format(min_date)),
+                Step(self._to_bot(self._too_close_start_date_2),
+                     'Нужно запрашивать отпуск минимум за 7 дней, '
+                     'а твой - только через 2 дня. '
+                     'Попробуй выбрать дату позднее {}.'.format(min_date)),
+                Step(self._to_bot(self._vacation_start_date), TO_MSG),
+            ]
+        )
 
     def _input_end_date(self):
-        for date in self._invalid_dates:
-            self.send_message('{0} {1}'.format(self._bot_name, date))
-
-            assert self.check_latest_response_with_retries(INVALID_DATE_MSG)
-
-        self.send_message('{0} {1}'.format(self._bot_name,
-                                           self._too_long_end_date))
-
-        assert self.check_latest_response_with_retries(
-            r'Отпуск продолжительностью \d* д(ня|ней|ень).*', match=True)
-
-        self.send_message('{0} {1}'.format(self._bot_name,
-                                           self._vacation_end_date))
-
-        assert self.check_latest_response_with_retries(
-            r'Значит ты планируешь находиться в отпуске \d* д(ня|ней|ень).*',
-            match=True)
+        self._talk(
+            [Step(self._to_bot(date), INVALID_DATE_MSG)
+             for date in self._invalid_dates] +
+            [
+                Step(self._to_bot(self._too_long_end_date),
+                     TOO_LONG_VACATION_RE),
+                Step(self._to_bot(self._vacation_end_date), CONFIRMATION_RE),
+            ]
+        )
 
     def _confirm_dates(self, confirm=True):
-        self.send_message('{0} {1}'.format(
-            self._bot_name, 'Да, планирую' if confirm else 'Нет, не планирую'))
-
-        assert self.check_latest_response_with_retries(
-            'Заявка на отпуск отправлена. '
-            'Ответ поступит не позже чем через 7 дней.'
-            if confirm
-            else 'Я прервал процесс формирования заявки на отпуск.')
+        self._talk([
+            Step(self._to_bot('Да, планирую' if confirm else 'Нет, не планирую'),
+                 'Заявка на отпуск отправлена. '
+                 'Ответ поступит не позже чем через 7 дней.'
+                 if confirm
+                 else 'Я прервал процесс формирования заявки на отпуск.'),
+        ])
 
     def _approve_request(self, username=None, is_admin=True):
         if not username:
@@ -251,43 +251,30 @@ class VivaLasVegasScriptTestCase(RocketChatTestCase):  # pylint: disable=too-man
             'заявку на отпуск пользователя @{0}.'.format(self.username))
 
     def _send_work_from_home_request(self, date, expect, reject=True):
-        self.send_message(
-            '{} работаю из дома'.format(self._bot_name)
-        )
-        assert self.check_latest_response_with_retries(
-            'Ok, в какой день? (сегодня/завтра/дд.мм)'
-        )
-
-        self.send_message(
-            '{} {}'.format(self._bot_name, date)
-        )
-        assert self.check_latest_response_with_retries(
-            'Согласован ли этот день с руководителем/тимлидом?\n'
-            'Да\n'
-            'Нет'
-        )
-
-        self.send_message(
-            '{} Да, согласован'.format(self._bot_name)
-        )
-        assert self.check_latest_response_with_retries(
-            r'(^Отлично.(.*) Ты работаешь из дома {}.$)'.format(expect),
-            match=True
-        )
-
+        steps = [
+            Step(self._to_bot('работаю из дома'),
+                 'Ok, в какой день? (сегодня/завтра/дд.мм)'),
+            Step(self._to_bot(date), WORK_FROM_HOME_DATE_MSG),
+            Step(self._to_bot('Да, согласован'),
+                 re.compile(r'(^Отлично.(.*) Ты работаешь из дома {}.$)'
+                            .format(re.escape(expect)))),
+        ]
         if reject:
-            self.send_message(
-                '{} Не работаю из дома'.format(self._bot_name)
-            )
-            assert self.check_latest_response_with_retries(
-                r'(^Я тебя понял.(.*)$)',
-                match=True
-            )
+            steps.append(Step(self._to_bot('Не работаю из дома'),
+                              WORK_FROM_HOME_CANCELLED_RE))
+
+        self._talk(steps)
 
     #
     # Public methods
     #
 
+    def prepare_worker(self):
+        # Like the admin (see _send_birthday_to_bot), the users of the workers
+        # tell the bot their birthdays first. Unlike the admin, they are new,
+        # so the bot is waiting for the answer and acknowledges it.
+        self._talk([Step('01.01.1990', BIRTHDAY_SAVED_MSG)])
+
     def test_sending_request_and_approving_it(self):
         """Tests if it's possible to send a leave request and approve it. """
 
@@ -496,6 +483,7 @@ class VivaLasVegasScriptTestCase(RocketChatTestCase):  # pylint: disable=too-man
         self.switch_channel('leave-coordination')
         self._reject_request(username=self.test_username)
 
+    @independent
     def test_sending_work_from_home_request_for_wrong_date(self):
         """Tests if it's not possible to send a work from home request for a wrong date. """
 
@@ -542,6 +530,7 @@ class VivaLasVegasScriptTestCase(RocketChatTestCase):  # pylint: disable=too-man
             'Тогда сначала согласуй, а потом пробуй еще раз (ты знаешь где меня найти).'
         )
 
+    @independent
     def test_sending_work_from_home_request_for_dd_mm(self):
         """Tests if it's possible to send a work from home request for a specific date. """
 
@@ -552,6 +541,7 @@ class VivaLasVegasScriptTestCase(RocketChatTestCase):  # pylint: disable=too-man
         dd_mm_yy = date.strftime('%d.%m.%Y')
         self._send_work_from_home_request(dd_mm, dd_mm_yy)
 
+    @independent
     def test_sending_work_from_home_request_for_tomorrow(self):
         """Tests if it's possible to send a work from home request for tomorrow. """
 
@@ -561,6 +551,7 @@ class VivaLasVegasScriptTestCase(RocketChatTestCase):  # pylint: disable=too-man
         expect = (today + timedelta(days=1)).strftime('%d.%m.%Y')
         self._send_work_from_home_request('завтра', expect)
 
+    @independent
     def test_sending_work_from_home_request_for_today(self):
         """Tests if it's possible to send a work from home request for today. """
 
@@ -570,6 +561,7 @@ class VivaLasVegasScriptTestCase(RocketChatTestCase):  # pylint: disable=too-man
         expect = today.strftime('%d.%m.%Y')
         self._send_work_from_home_request('сегодня', expect)
 
+    @independent
     def test_sending_work_from_home_request_when_previous_one_is_approved(self):
         """Tests if it's not possible to send a work from home request when the
         previous one has already been approved.
@@ -591,6 +583,8 @@ class VivaLasVegasScriptTestCase(RocketChatTestCase):  # pylint: disable=too-man
             .format(expect)
         )
 
+    @independent
+    @depends_on('test_sending_work_from_home_request_when_previous_one_is_approved')
     def test_cancelling_approved_work_from_home_request(self):
         """Tests if it's possible to reject a work from home request which has
         already been approved.
@@ -840,6 +834,7 @@ def main():
                         help='allows specifying admin username')
     parser.add_argument('-p', '--password', dest='password', type=str,
                         help='allows specifying admin password')
+    add_harness_arguments(parser)
     options = parser.parse_args()
 
     if not options.host:
@@ -853,7 +848,8 @@ def main():
 
     test_cases = VivaLasVegasScriptTestCase(options.host, options.username,
                                             options.password,
-                                            create_test_user=True)
+                                            create_test_user=True,
+                                            **get_harness_kwargs(options))
     test_cases.run()
 
 
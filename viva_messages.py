@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module with the messages of the hubot-viva-las-vegas script. """
+
+import re
+
+# hubot-happy-birthder, which runs along with the script, asks the new users
+# for their birth dates first and replies with the message once they answer.
+BIRTHDAY_SAVED_MSG = 'I memorized you birthday, well done! 😉'
+
+CONFIRMATION_RE = re.compile(
+    r'Значит ты планируешь находиться в отпуске \d* д(ня|ней|ень).*')
+
+FROM_MSG = 'Ok, с какого числа? (дд.мм)'
+
+INVALID_DATE_MSG = 'Указанная дата является невалидной. Попробуй еще раз.'
+
+PERMISSION_DENIED_MSG = 'У тебя недостаточно прав для этой команды 🙄'
+
+TO_MSG = 'Отлично, по какое? (дд.мм)'
+
+TOO_LONG_VACATION_RE = re.compile(
+    r'Отпуск продолжительностью \d* д(ня|ней|ень).*')
+
+WORK_FROM_HOME_CANCELLED_RE = re.compile(r'(^Я тебя понял.(.*)$)')
+
+WORK_FROM_HOME_DATE_MSG = ('Согласован ли этот день с руководителем/тимлидом?\n'
+                           'Да\n'
+                           'Нет')
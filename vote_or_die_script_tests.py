@@ -16,15 +16,21 @@
 """Tests related to the hubot-vote-or-die script. """
 
 import sys
-import time
 from argparse import ArgumentParser
 
-from base import RocketChatTestCase
+from base import (
+    RocketChatTestCase,
+    add_harness_arguments,
+    get_harness_kwargs,
+    independent
+)
 
 
 class VoteOrDieScriptTestCase(RocketChatTestCase):
     """Tests for the hubot-vote-or-die script. """
 
+    default_message_transport = 'rest'
+
     def __init__(self, addr, username, password, **kwargs):
         RocketChatTestCase.__init__(self, addr, username, password, **kwargs)
 
@@ -38,9 +44,10 @@ class VoteOrDieScriptTestCase(RocketChatTestCase):
             elem = elem_list[position]
             if elem.value == expected_value:
                 return True
-            time.sleep(1)
+            self.sleep(1)
         return False
 
+    @independent
     def test_creating_poll_with_1_option(self):
         """Tests if it's not possible to create a poll with 1 option. The polls
         require more than 1 options.
@@ -50,6 +57,7 @@ class VoteOrDieScriptTestCase(RocketChatTestCase):
 
         assert self.check_latest_response_with_retries('Provide more than one option.')
 
+    @independent
     def test_creating_poll_with_2_options(self):
         """Tests if it's possible to create a poll with 2 options. """
 
@@ -70,6 +78,7 @@ class VoteOrDieScriptTestCase(RocketChatTestCase):
 
         assert self._wait_value('.reactions ', -1, '0⃣ 1 1⃣ 1 2⃣ 1')
 
+    @independent
     def test_creating_poll_with_over_12_options(self):
         """Tests if it's not possible to create a poll with more than
         12 options.
@@ -92,6 +101,7 @@ def main():
                         help='allows specifying admin username')
     parser.add_argument('-p', '--password', dest='password', type=str,
                         help='allows specifying admin password')
+    add_harness_arguments(parser)
     options = parser.parse_args()
 
     if not options.host:
@@ -107,7 +117,8 @@ def main():
         parser.error('Password is not specified')
 
     test_cases = VoteOrDieScriptTestCase(options.host, options.username,
-                                         options.password, create_test_user=False)
+                                         options.password, create_test_user=False,
+                                         **get_harness_kwargs(options))
     exit_code = test_cases.run()
     sys.exit(exit_code)
 